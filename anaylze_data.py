@@ -1,30 +1,48 @@
 #!/usr/bin/env python3
 import os
 import sys
+import csv
 import glob
 import re
-import pandas as pd
-import numpy as np
+import argparse
 from pathlib import Path
 
-from config import RESULTS_DIR, ANALYSIS_OUTPUT_DIR, TEST_TYPES, BROWSER_COLORS
+from config import RESULTS_DIR, ANALYSIS_OUTPUT_DIR, TEST_TYPES, ALL_TEST_TYPES, BROWSER_COLORS, TRACE_ALIGNMENT
 
 def setup_output_directory():
     ANALYSIS_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     print(f"Analysis results will be saved to: {ANALYSIS_OUTPUT_DIR}")
 
-def find_aggregate_files():
-    aggregate_files = {}
-    for test_type in TEST_TYPES:
-        pattern = RESULTS_DIR / f"{test_type}_aggregate_results_*.csv"
-        files = list(glob.glob(str(pattern)))
-        if files:
-            files.sort(reverse=True)
-            aggregate_files[test_type] = files[0]
+def find_aggregate_files(results_dir=RESULTS_DIR):
+    latest = {}
+    for file in glob.glob(str(Path(results_dir) / "*_aggregate_results_*.csv")):
+        test_type = Path(file).name.split("_aggregate_results_")[0]
+        if file > latest.get(test_type, ""):
+            latest[test_type] = file
+    
+    # The standard scenarios keep their usual order; synthetic campaigns
+    # (synthesize.py) can add any number of others after them.
+    test_types = [t for t in ALL_TEST_TYPES if t in latest] + sorted(t for t in latest if t not in ALL_TEST_TYPES)
+    return {test_type: latest[test_type] for test_type in test_types}
+
+def rebuild_missing_aggregates(aggregate_files, results_dir=RESULTS_DIR):
+    missing = [test_type for test_type in TEST_TYPES if test_type not in aggregate_files]
+    if not missing:
+        return aggregate_files
+    
+    from streaming import rebuild_aggregate_results
+    
+    for test_type in missing:
+        rebuilt = rebuild_aggregate_results(test_type, results_dir)
+        if rebuilt:
+            aggregate_files[test_type] = str(rebuilt)
+            print(f"Rebuilt {test_type} aggregates from detail files")
     
     return aggregate_files
 
 def load_aggregate_data(aggregate_files):
+    import pandas as pd
+    
     data = {}
     for test_type, filepath in aggregate_files.items():
         try:
@@ -36,16 +54,26 @@ def load_aggregate_data(aggregate_files):
     
     return data
 
-def load_all_individual_browser_files():
+def find_browser_summary_files(test_type, results_dir=RESULTS_DIR):
+    files = {}
+    pattern = Path(results_dir) / f"{test_type}_*_power_summary_iter*.csv"
+    for file in glob.glob(str(pattern)):
+        name = Path(file).name
+        browser = name[len(test_type) + 1:name.index("_power_summary_iter")]
+        files.setdefault(browser, []).append(file)
+    
+    known = [b for b in BROWSER_COLORS if b in files]
+    return {browser: files[browser] for browser in known + sorted(b for b in files if b not in known)}
+
+def load_all_individual_browser_files(results_dir=RESULTS_DIR, test_types=ALL_TEST_TYPES):
+    import pandas as pd
+    
     all_data = {}
     
-    for test_type in TEST_TYPES:
+    for test_type in test_types:
         browser_data = {}
         
-        for browser in BROWSER_COLORS.keys():
-            pattern = RESULTS_DIR / f"{test_type}_{browser}_power_summary_iter*.csv"
-            files = list(glob.glob(str(pattern)))
-            
+        for browser, files in find_browser_summary_files(test_type, results_dir).items():
             if files:
                 dfs = []
                 for file in files:
@@ -74,29 +102,87 @@ def load_all_individual_browser_files():
     
     return all_data
 
-def main():
+def read_aggregate_rows(filepath):
+    with open(filepath, newline='') as f:
+        return [
+            {
+                "browser": row["Browser"],
+                "avg_power": float(row["Avg Power Mean (W)"]),
+                "total_energy": float(row["Total Energy Mean (Wh)"])
+            }
+            for row in csv.DictReader(f)
+        ]
+
+def print_summary(aggregate_files):
+    scores = {}
+    
+    for test_type in aggregate_files:
+        rows = sorted(read_aggregate_rows(aggregate_files[test_type]), key=lambda r: r["avg_power"])
+        if not rows:
+            continue
+        
+        print(f"\n{test_type.replace('_', ' ').title()}")
+        print("-" * 50)
+        for rank, row in enumerate(rows, start=1):
+            print(f"{rank:>3}. {row['browser']:<12} {row['avg_power']:>8.2f} W {row['total_energy']:>10.4f} Wh")
+        
+        # Same 0-100 scaling as the efficiency index chart.
+        min_power = rows[0]["avg_power"]
+        power_range = rows[-1]["avg_power"] - min_power
+        for row in rows:
+            score = 100 * (rows[-1]["avg_power"] - row["avg_power"]) / power_range if power_range > 0 else 100
+            scores.setdefault(row["browser"], []).append(score)
+    
+    if scores:
+        print("\nEfficiency Index (higher is better)")
+        print("-" * 50)
+        ranking = sorted(scores.items(), key=lambda item: sum(item[1]) / len(item[1]), reverse=True)
+        for rank, (browser, browser_scores) in enumerate(ranking, start=1):
+            print(f"{rank:>3}. {browser:<12} {sum(browser_scores) / len(browser_scores):>6.1f}")
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Browser power efficiency analysis')
+    parser.add_argument('--summary-only', '--no-charts', dest='summary_only', action='store_true',
+                      help='Print rankings from the aggregate results without loading the chart stack')
+    parser.add_argument('--results-dir', type=Path, default=RESULTS_DIR,
+                      help=f'Directory containing test results (default: {RESULTS_DIR})')
+    parser.add_argument('--alignment', choices=['start', 'xcorr'], default=TRACE_ALIGNMENT,
+                      help=f'How iteration traces are lined up for the profile charts (default: {TRACE_ALIGNMENT})')
+    
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    results_dir = args.results_dir
+    
     print("Browser Power Efficiency Analysis")
     print("=" * 50)
     
-    setup_output_directory()
-    
-    aggregate_files = find_aggregate_files()
+    aggregate_files = find_aggregate_files(results_dir)
+    rebuild_missing_aggregates(aggregate_files, results_dir)
     if not aggregate_files:
         print("No aggregate result files found. Please run the browser power tests first.")
         return
     
+    if args.summary_only:
+        print_summary(aggregate_files)
+        return
+    
+    setup_output_directory()
+    
     print(f"Found {len(aggregate_files)} aggregate files for analysis")
     
     aggregate_data = load_aggregate_data(aggregate_files)
     
-    detailed_data = load_all_individual_browser_files()
+    detailed_data = load_all_individual_browser_files(results_dir, list(aggregate_files))
     
     from visualization import (
         create_average_power_comparison,
         create_energy_consumption_comparison,
         create_browser_ranking_heatmap,
         create_radar_chart,
-        create_browser_efficiency_index
+        create_browser_efficiency_index,
+        create_trace_profile_charts
     )
     
     print("\nGenerating analysis charts...")
@@ -111,6 +197,18 @@ def main():
     
     create_browser_efficiency_index(aggregate_data)
     
+    print("\nSegmenting power traces into phases...")
+    
+    from segmentation import segment_campaign
+    segment_campaign(results_dir, ANALYSIS_OUTPUT_DIR / "phase_summary.csv", list(aggregate_files))
+    
+    print("\nAligning iteration traces...")
+    
+    from trace_profiles import profile_campaign
+    profiles = profile_campaign(results_dir, ANALYSIS_OUTPUT_DIR / "trace_profiles.csv",
+                                list(aggregate_files), args.alignment)
+    create_trace_profile_charts(profiles)
+    
     print("\nAnalysis complete!")
     print(f"All results saved to: {ANALYSIS_OUTPUT_DIR}")
 
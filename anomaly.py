@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from config import (
+    SAMPLE_INTERVAL, ANOMALY_SAMPLE_Z, ANOMALY_MAX_OUTLIER_FRACTION, ANOMALY_MIN_TRACE_FRACTION,
+    ANOMALY_MIN_RELATIVE_DEVIATION
+)
+
+# Two-sided Grubbs critical values at alpha = 0.05.
+GRUBBS_N = [3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 25, 30, 40, 50, 100]
+GRUBBS_G = [1.155, 1.481, 1.715, 1.887, 2.020, 2.126, 2.215, 2.290, 2.355, 2.412, 2.462, 2.507,
+            2.549, 2.585, 2.620, 2.651, 2.681, 2.709, 2.822, 2.908, 3.036, 3.128, 3.383]
+
+def robust_z_scores(values):
+    x = np.asarray(values, dtype=np.float64)
+    median = np.median(x)
+    mad = np.median(np.abs(x - median))
+    if mad == 0:
+        return np.zeros_like(x)
+    return 0.6745 * (x - median) / mad
+
+def check_run(result, duration):
+    if not result:
+        return ["no_result"]
+
+    power = np.asarray(result["power_readings"], dtype=np.float64)
+    anomalies = []
+
+    if len(power) == 0 or not power.any():
+        return ["no_power_data"]
+
+    expected = duration / SAMPLE_INTERVAL
+    if len(power) < ANOMALY_MIN_TRACE_FRACTION * expected:
+        anomalies.append("short_trace")
+
+    if len(power) > 1 and np.ptp(power) == 0:
+        anomalies.append("flat_trace")
+
+    outliers = np.abs(robust_z_scores(power)) > ANOMALY_SAMPLE_Z
+    if outliers.mean() > ANOMALY_MAX_OUTLIER_FRACTION:
+        anomalies.append("sample_outliers")
+
+    return anomalies
+
+def grubbs_outlier(values):
+    x = np.asarray(values, dtype=np.float64)
+    n = len(x)
+    if n < 3:
+        return None
+    stdev = x.std(ddof=1)
+    if stdev == 0:
+        return None
+    deviations = np.abs(x - x.mean()) / stdev
+    i = int(np.argmax(deviations))
+    if deviations[i] > np.interp(n, GRUBBS_N, GRUBBS_G):
+        return i
+    return None
+
+def iqr_outliers(values, k=1.5):
+    x = np.asarray(values, dtype=np.float64)
+    if len(x) < 4:
+        return np.zeros(len(x), dtype=bool)
+    q1, q3 = np.percentile(x, [25, 75])
+    spread = k * (q3 - q1)
+    return (x < q1 - spread) | (x > q3 + spread)
+
+def find_outlier_iterations(iterations):
+    # iterations: list of per-iteration result lists, as kept in run_all_tests.
+    # Returns (iteration index, position) pairs for results that stand out
+    # from the same browser's other iterations.
+    positions = {}
+    for i, iteration_results in enumerate(iterations):
+        for j, result in enumerate(iteration_results):
+            if result:
+                positions.setdefault(result["browser"], []).append((i, j, result["avg_power"]))
+
+    flagged = []
+    for browser, entries in positions.items():
+        avg_powers = np.array([power for _, _, power in entries])
+        suspects = set(np.flatnonzero(iqr_outliers(avg_powers)).tolist())
+        grubbs = grubbs_outlier(avg_powers)
+        if grubbs is not None:
+            suspects.add(grubbs)
+        
+        # Small campaigns make both tests twitchy; ignore deviations that are
+        # too small to matter for the reported means.
+        median = np.median(avg_powers)
+        for k in sorted(suspects):
+            if abs(avg_powers[k] - median) > ANOMALY_MIN_RELATIVE_DEVIATION * abs(median):
+                flagged.append((entries[k][0], entries[k][1]))
+
+    return flagged
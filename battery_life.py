@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+import sys
+import csv
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from config import (
+    RESULTS_DIR, ANALYSIS_OUTPUT_DIR, ALL_TEST_TYPES, BATTERY_CAPACITY_WH,
+    BATTERY_USAGE_MIXES, BATTERY_MC_DRAWS
+)
+from streaming import find_summary_files
+
+# Elements of one (browsers, mixes, draws) block; keeps memory flat however
+# many mixes are explored.
+BLOCK_ELEMENTS = 1 << 22
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Project battery runtime per browser for weighted usage mixes')
+    parser.add_argument('--results-dir', type=Path, default=RESULTS_DIR,
+                      help=f'Directory containing test results (default: {RESULTS_DIR})')
+    parser.add_argument('--capacity-wh', type=float, default=BATTERY_CAPACITY_WH,
+                      help='Battery capacity in Wh (default: energy_full from sysfs)')
+    parser.add_argument('--mix', action='append', default=[], metavar='NAME:TEST=SHARE,...',
+                      help='Usage mix, e.g. "commute:video=0.4,webpage=0.3,multiple_tabs=0.3" (repeatable)')
+    parser.add_argument('--mixes-file', type=Path,
+                      help='CSV with a "Mix" column and one share column per test type')
+    parser.add_argument('--random-mixes', type=int, default=0,
+                      help='Also evaluate this many random mixes over the measured test types')
+    parser.add_argument('--draws', type=int, default=BATTERY_MC_DRAWS,
+                      help=f'Monte Carlo draws (default: {BATTERY_MC_DRAWS})')
+    parser.add_argument('--seed', type=int, default=0,
+                      help='Random seed, so repeated projections agree (default: 0)')
+    parser.add_argument('--output', type=Path, default=ANALYSIS_OUTPUT_DIR / "battery_projection.csv",
+                      help='CSV with the projection for every mix and browser')
+
+    return parser.parse_args()
+
+def battery_capacity():
+    from power_measurement import check_battery_available, read_battery_capacity
+
+    power_file = check_battery_available()
+    return read_battery_capacity(power_file) if power_file else None
+
+def load_power_samples(results_dir, test_types=ALL_TEST_TYPES):
+    # Per-iteration average power from the latest campaign's summaries, as a
+    # (browsers, test types, iterations) array padded with NaN, plus the
+    # iteration count of each cell.
+    runs = {}
+    for test_type in test_types:
+        for file in find_summary_files(test_type, results_dir):
+            with open(file, newline='') as f:
+                for row in csv.DictReader(f):
+                    try:
+                        power = float(row["Avg Power (W)"])
+                    except (KeyError, ValueError):
+                        continue
+                    runs.setdefault(row["Browser"], {}).setdefault(test_type, []).append(power)
+
+    measured = [test_type for test_type in test_types if any(test_type in tests for tests in runs.values())]
+    browsers = list(runs)
+    counts = np.array([[len(runs[browser].get(test_type, [])) for test_type in measured] for browser in browsers],
+                      dtype=np.int64).reshape(len(browsers), len(measured))
+    samples = np.full(counts.shape + (max(counts.max(initial=0), 1),), np.nan)
+    for b, browser in enumerate(browsers):
+        for t, test_type in enumerate(measured):
+            values = runs[browser].get(test_type, [])
+            samples[b, t, :len(values)] = values
+    return browsers, measured, samples, counts
+
+def parse_mix(text):
+    name, _, shares = text.rpartition(":")
+    mix = {}
+    for part in shares.split(","):
+        test_type, _, share = part.partition("=")
+        try:
+            mix[test_type.strip()] = float(share)
+        except ValueError:
+            raise ValueError(f"Bad share in usage mix: {part!r}")
+    return name or shares, mix
+
+def load_mixes_file(path):
+    mixes = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            name = row.pop("Mix", None) or f"mix_{len(mixes) + 1}"
+            mixes[name] = {test_type: float(share) for test_type, share in row.items() if share not in ("", None)}
+    return mixes
+
+def mix_matrix(mixes, test_types):
+    # (mixes, test types) time shares, each row normalized to 1.
+    unknown = sorted({test_type for mix in mixes.values() for test_type in mix} - set(test_types))
+    if unknown:
+        raise ValueError(f"No measurements for {', '.join(unknown)} (measured: {', '.join(test_types)})")
+
+    weights = np.array([[mix.get(test_type, 0.0) for test_type in test_types] for mix in mixes.values()],
+                       dtype=np.float64).reshape(len(mixes), len(test_types))
+    totals = weights.sum(axis=1, keepdims=True)
+    if (weights < 0).any() or (totals <= 0).any():
+        raise ValueError("Usage mix shares must be non-negative and not all zero")
+    return weights / totals
+
+def draw_scenario_power(samples, counts, draws, rng):
+    # Bootstrap over iterations: each draw is the mean power of a resample of
+    # the runs actually measured, so the spread is what another campaign of
+    # the same size could plausibly have found. (draws, browsers, tests).
+    n = samples.shape[-1]
+    picks = np.floor(rng.random((draws,) + counts.shape + (n,)) * np.maximum(counts, 1)[..., None]).astype(np.int64)
+    picked = np.take_along_axis(np.broadcast_to(samples, picks.shape), picks, axis=-1)
+    valid = np.arange(n) < counts[..., None]
+    return np.where(valid, picked, 0.0).sum(axis=-1) / np.maximum(counts, 1)
+
+def project_battery_life(samples, counts, weights, capacity_wh, draws=BATTERY_MC_DRAWS, seed=0):
+    # Runtime = capacity / time-weighted mean power of the mix. Mix power is
+    # linear in the scenario powers, so its mean and variance follow exactly
+    # from the mean and covariance of the draws, with no per-mix sort; the
+    # joint draws decide which browser lasts longest and by how much. Mixes
+    # go through in blocks of (browsers, mixes, draws) so memory stays flat.
+    # Returns arrays of shape (mixes, browsers), plus the per-mix gain of the
+    # best browser over the worst one (by mean runtime) with its interval.
+    rng = np.random.default_rng(seed)
+    scenario_power = draw_scenario_power(samples, counts, draws, rng).transpose(1, 2, 0).copy()
+    mean_power = scenario_power.mean(axis=2)
+    centered = scenario_power - mean_power[..., None]
+    covariance = centered @ centered.transpose(0, 2, 1) / max(draws - 1, 1)
+    measured = counts > 0
+
+    mixes, browsers = len(weights), samples.shape[0]
+    gain = np.full((mixes, 3), np.nan)
+    best = np.full(mixes, -1)
+    worst = np.full(mixes, -1)
+
+    # A browser is projected for a mix only if it ran every test type in it.
+    usable = ((weights[None, :, :] == 0) | measured[:, None, :]).all(axis=2)
+    mix_power = np.where(usable, mean_power @ weights.T, np.nan)
+    spread = 1.96 * np.sqrt(np.maximum(np.einsum('mt,btu,mu->bm', weights, covariance, weights), 0))
+    p_best = np.full((browsers, mixes), np.nan)
+
+    block = max(1, BLOCK_ELEMENTS // (draws * max(browsers, 1)))
+    for first in range(0, mixes, block):
+        w = weights[first:first + block]
+        rows = slice(first, first + len(w))
+        columns = np.arange(len(w))
+
+        power = np.matmul(w, scenario_power)
+        power[~usable[:, rows]] = np.inf
+        lowest = power.min(axis=0)
+        p_best[:, rows] = np.where(usable[:, rows], (power == lowest).mean(axis=2), np.nan)
+
+        has_pair = usable[:, rows].sum(axis=0) >= 2
+        top = np.where(usable[:, rows], mix_power[:, rows], np.inf).argmin(axis=0)
+        bottom = np.where(usable[:, rows], mix_power[:, rows], -np.inf).argmax(axis=0)
+        ratio = (power[bottom, columns] / power[top, columns] - 1) * 100
+        ratio[~has_pair] = np.nan
+        gain[rows] = np.column_stack([ratio.mean(axis=1), *np.percentile(ratio, [2.5, 97.5], axis=1)])
+        best[rows] = np.where(has_pair, top, -1)
+        worst[rows] = np.where(has_pair, bottom, -1)
+
+    return {
+        "power": mix_power.T,
+        "runtime": (capacity_wh / mix_power).T,
+        "low": (capacity_wh / (mix_power + spread)).T,
+        "high": (capacity_wh / np.maximum(mix_power - spread, 1e-9)).T,
+        "p_best": p_best.T,
+        "gain": gain,
+        "best": best,
+        "worst": worst
+    }
+
+def save_projection(output_file, mix_names, weights, test_types, browsers, projection, capacity_wh):
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Mix"] + [f"{test_type} Share" for test_type in test_types] + [
+            "Browser", "Capacity (Wh)", "Mix Power (W)", "Runtime (h)", "Runtime Low (h)", "Runtime High (h)",
+            "P(Longest)"
+        ])
+        for m, name in enumerate(mix_names):
+            shares = [f"{share:.3f}" for share in weights[m]]
+            for b, browser in enumerate(browsers):
+                if np.isnan(projection["runtime"][m, b]):
+                    continue
+                writer.writerow([name] + shares + [
+                    browser,
+                    f"{capacity_wh:.2f}",
+                    f"{projection['power'][m, b]:.2f}",
+                    f"{projection['runtime'][m, b]:.3f}",
+                    f"{projection['low'][m, b]:.3f}",
+                    f"{projection['high'][m, b]:.3f}",
+                    f"{projection['p_best'][m, b]:.3f}"
+                ])
+    return output_file
+
+def main():
+    args = parse_arguments()
+
+    capacity_wh = args.capacity_wh or battery_capacity()
+    if not capacity_wh:
+        print("Battery capacity unknown: no energy_full in sysfs; pass --capacity-wh or set BROWSER_POWER_BATTERY_WH.")
+        sys.exit(1)
+
+    browsers, test_types, samples, counts = load_power_samples(args.results_dir)
+    if not browsers:
+        print(f"No power summaries found in {args.results_dir}")
+        sys.exit(1)
+
+    try:
+        mixes = dict(parse_mix(text) for text in args.mix)
+        if args.mixes_file:
+            mixes.update(load_mixes_file(args.mixes_file))
+        if not mixes:
+            # The configured mixes, trimmed to what this campaign measured.
+            for name, mix in BATTERY_USAGE_MIXES.items():
+                shares = {test_type: share for test_type, share in mix.items() if test_type in test_types}
+                if shares:
+                    mixes[name] = shares
+        named = len(mixes)
+        weights = mix_matrix(mixes, test_types)
+    except (OSError, ValueError) as e:
+        print(f"Invalid usage mixes: {e}")
+        sys.exit(1)
+
+    mix_names = list(mixes)
+    if args.random_mixes:
+        random_weights = np.random.default_rng(args.seed + 1).dirichlet(np.ones(len(test_types)), args.random_mixes)
+        weights = np.vstack([weights, random_weights])
+        mix_names += [f"random_{i + 1}" for i in range(args.random_mixes)]
+
+    projection = project_battery_life(samples, counts, weights, capacity_wh, args.draws, args.seed)
+    output_file = save_projection(args.output, mix_names, weights, test_types, browsers, projection, capacity_wh)
+    print(f"Projected {len(mix_names)} usage mixes x {len(browsers)} browsers on a {capacity_wh:.1f}Wh battery "
+          f"({args.draws} draws) to {output_file}")
+
+    for m in range(named):
+        shares = ", ".join(f"{test_type} {100 * share:.0f}%" for test_type, share in zip(test_types, weights[m]) if share)
+        print(f"\n{mix_names[m]} ({shares}):")
+        order = np.argsort(-np.nan_to_num(projection["runtime"][m], nan=-np.inf))
+        for b in order:
+            if np.isnan(projection["runtime"][m, b]):
+                continue
+            print(f"- {browsers[b]}: {projection['runtime'][m, b]:.2f}h "
+                  f"(95% interval {projection['low'][m, b]:.2f}-{projection['high'][m, b]:.2f}h, "
+                  f"longest in {100 * projection['p_best'][m, b]:.0f}% of draws)")
+        if projection["best"][m] >= 0:
+            mean, low, high = projection["gain"][m]
+            print(f"  {browsers[projection['best'][m]]} instead of {browsers[projection['worst'][m]]}: "
+                  f"{mean:+.1f}% battery life (95% interval {low:+.1f}% to {high:+.1f}%)")
+
+    if args.random_mixes:
+        gains = projection["gain"][named:, 0]
+        print(f"\nAcross {args.random_mixes} random mixes the longest-lasting browser gains "
+              f"{np.nanmin(gains):.1f}% to {np.nanmax(gains):.1f}% over the shortest (median {np.nanmedian(gains):.1f}%)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+import os
+import sys
+import csv
+import time
+import shutil
+import argparse
+import datetime
+import resource
+import statistics
+import subprocess
+import tempfile
+import contextlib
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent
+DEFAULT_TRACE = REPO_DIR / "browser_power_tests" / "webpage_power_details_iter1_20250306_114915.csv"
+
+# (column, higher_is_worse, smallest absolute change worth reporting)
+METRICS = [
+    ("cpu_ms_per_s", True, 0.5),
+    ("cpu_percent", True, 0.05),
+    ("wakeups_per_s", True, 2.0),
+    ("jitter_p50_ms", True, 1.0),
+    ("jitter_p95_ms", True, 1.0),
+    ("jitter_p99_ms", True, 1.0),
+    ("max_sample_rate_hz", False, 0.0),
+    ("report_s_per_1k_runs", True, 0.2)
+]
+HISTORY_BASELINE_RUNS = 5
+
+class BenchmarkError(Exception):
+    pass
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark the measurement harness itself')
+    parser.add_argument('--duration', type=int, default=20,
+                      help='Seconds of sampling for the overhead/jitter run (default: 20)')
+    parser.add_argument('--max-rate-duration', type=int, default=5,
+                      help='Seconds of unthrottled sampling for the max-rate run (default: 5)')
+    parser.add_argument('--runs', type=int, default=1000,
+                      help='Synthetic runs for the report-generation benchmark (default: 1000)')
+    parser.add_argument('--trace', type=Path, default=DEFAULT_TRACE,
+                      help='Detail CSV replayed as the power source')
+    parser.add_argument('--history', type=Path, default=Path("harness_benchmark_history.csv"),
+                      help='CSV that accumulates results across versions')
+
+    return parser.parse_args()
+
+def make_noop_browser(work_dir):
+    browser = Path(work_dir) / "noop-browser"
+    browser.write_text("#!/bin/sh\nexec sleep 86400\n")
+    browser.chmod(0o755)
+    return str(browser)
+
+def usage_snapshot():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return time.monotonic(), usage.ru_utime + usage.ru_stime, usage.ru_nvcsw + usage.ru_nivcsw
+
+def bench_sampling(browser_cmd, power_file, duration):
+    import numpy as np
+    from config import SAMPLE_INTERVAL
+    from browser_test import run_browser_test
+
+    wall_start, cpu_start, switches_start = usage_snapshot()
+    result = run_browser_test(browser_cmd, "Noop", "webpage", "about:blank", power_file, duration)
+    wall_end, cpu_end, switches_end = usage_snapshot()
+    if result is None:
+        raise BenchmarkError("the sampling run returned no result")
+
+    wall = wall_end - wall_start
+    jitter_ms = np.abs(np.diff(result.timestamps) - SAMPLE_INTERVAL) * 1000
+    p50, p95, p99 = np.percentile(jitter_ms, [50, 95, 99])
+
+    return {
+        "cpu_ms_per_s": 1000 * (cpu_end - cpu_start) / wall,
+        "cpu_percent": 100 * (cpu_end - cpu_start) / wall,
+        "wakeups_per_s": (switches_end - switches_start) / wall,
+        "jitter_p50_ms": p50,
+        "jitter_p95_ms": p95,
+        "jitter_p99_ms": p99
+    }
+
+def bench_max_sample_rate(browser_cmd, power_file, duration):
+    from browser_test import run_browser_test
+
+    result = run_browser_test(browser_cmd, "Noop", "webpage", "about:blank", power_file, duration, sample_interval=0)
+    if result is None:
+        raise BenchmarkError("the max-rate run returned no result")
+
+    return {"max_sample_rate_hz": len(result.power_readings) / duration}
+
+def bench_reporting(trace, runs):
+    import numpy as np
+    from config import BROWSERS
+    from campaign import RunResult
+    from reporting import save_results_to_csv, save_aggregate_results
+
+    browsers = list(BROWSERS.values())
+    iterations = max(1, runs // len(browsers))
+    samples = np.resize(trace, 60)
+
+    all_iterations = []
+    start = time.perf_counter()
+    for iteration in range(1, iterations + 1):
+        results = [
+            RunResult(browser, "benchmark", np.arange(len(samples), dtype=float), samples, iteration=iteration)
+            for browser in browsers
+        ]
+        for result in results:
+            save_results_to_csv([result], f"benchmark_{result.browser.lower()}", iteration)
+        save_results_to_csv(results, "benchmark", iteration)
+        all_iterations.append(results)
+    save_aggregate_results(all_iterations, "benchmark")
+    elapsed = time.perf_counter() - start
+
+    return {"report_s_per_1k_runs": elapsed * 1000 / (iterations * len(browsers))}
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare_with_history(history_file, metrics, threshold):
+    if not history_file.exists():
+        return []
+
+    with open(history_file, newline='') as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        return []
+
+    # Median of the last few runs, so one noisy run doesn't become the baseline.
+    baseline_rows = rows[-HISTORY_BASELINE_RUNS:]
+    regressions = []
+    for name, higher_is_worse, min_change in METRICS:
+        try:
+            before = statistics.median(float(row[name]) for row in baseline_rows)
+        except (KeyError, ValueError):
+            continue
+        after = metrics[name]
+        if before == 0 or abs(after - before) < min_change:
+            continue
+        change = (after - before) / before
+        if (change > threshold) if higher_is_worse else (change < -threshold):
+            regressions.append(f"{name}: {before:.3f} -> {after:.3f} ({change:+.0%}) "
+                               f"vs median of last {len(baseline_rows)} runs")
+    return regressions
+
+def append_history(history_file, metrics):
+    new_file = not history_file.exists()
+    with open(history_file, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(["date", "revision"] + [name for name, _, _ in METRICS])
+        writer.writerow(
+            [datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), git_revision()]
+            + [f"{metrics[name]:.4f}" for name, _, _ in METRICS]
+        )
+
+def main():
+    args = parse_arguments()
+    work_dir = tempfile.mkdtemp(prefix="harness_bench_")
+    os.environ["BROWSER_POWER_OUTPUT_DIR"] = work_dir
+
+    from config import BENCHMARK_REGRESSION_THRESHOLD
+    from utils import setup_logging
+    from server import start_local_test_server
+    from replay import load_trace, start_replay_power_source, stop_replay_power_source
+    from config import SAMPLE_INTERVAL
+
+    setup_logging()
+    trace = load_trace(args.trace)
+    browser_cmd = make_noop_browser(work_dir)
+    source = start_replay_power_source(trace, SAMPLE_INTERVAL)
+
+    httpd = server_dir = None
+    cwd = os.getcwd()
+    metrics = {}
+
+    print("Benchmarking harness overhead...")
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            try:
+                httpd, server_dir = start_local_test_server()
+            except OSError as e:
+                print(f"HTTP server not started: {e}", file=sys.stderr)
+
+            metrics.update(bench_sampling(browser_cmd, source["power_file"], args.duration))
+            metrics.update(bench_max_sample_rate(browser_cmd, source["power_file"], args.max_rate_duration))
+            metrics.update(bench_reporting(trace, args.runs))
+    except BenchmarkError as e:
+        # No partial results in the history: they would skew the baseline.
+        print(f"Benchmark failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        stop_replay_power_source(source)
+        if httpd:
+            httpd.shutdown()
+            httpd.server_close()
+        os.chdir(cwd)
+        if server_dir:
+            shutil.rmtree(server_dir, ignore_errors=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print("\nHarness Benchmark Results")
+    print("=" * 50)
+    for name, _, _ in METRICS:
+        print(f"{name:<24} {metrics[name]:>12.3f}")
+
+    regressions = compare_with_history(args.history, metrics, BENCHMARK_REGRESSION_THRESHOLD)
+    append_history(args.history, metrics)
+    print(f"\nAppended results to {args.history}")
+
+    if regressions:
+        print("\nRegressions against the previous run:")
+        for regression in regressions:
+            print(f"- {regression}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,47 @@
 #!/usr/bin/env python3
 import os
 import sys
-import time
 import subprocess
 import datetime
 import shutil
+import statistics
+from array import array
 from pathlib import Path
 
+import numpy as np
+
 from config import (
     WATCH_DURATION, OUTPUT_DIR, LOG_FILE, SAMPLE_INTERVAL, 
-    TEST_URL, VIDEO_SERVER_PORT, NUM_TEST_ITERATIONS
+    TEST_URL, VIDEO_SERVER_PORT, NUM_TEST_ITERATIONS, TAB_SWEEP_LEVELS, TAB_SWEEP_SETTLE, TAB_SWEEP_DWELL,
+    PROFILE_WARMUP_DURATION, STARTUP_COMPARISON_RUNS, STARTUP_COMPARISON_WINDOW, SENSOR_LATENCIES
+)
+from utils import setup_logging, log_message, get_tree_memory_mb
+from power_measurement import (
+    check_battery_available, has_powertop, read_power_file, read_battery_energy, battery_energy_used
+)
+from server import (
+    start_local_test_server, reset_work_counter, read_work_counter, reset_navigations, read_navigations
 )
-from utils import setup_logging, log_message
-from power_measurement import check_battery_available, has_powertop, read_power_file
-from server import start_local_test_server
+from rapl import start_rapl_sampling, sample_rapl, finish_rapl_sampling, rapl_stream
+from perf_counters import start_perf_counters, sample_perf_counters, stop_perf_counters
+from cpu_state import (
+    start_cpu_state_sampling, sample_cpu_state, finish_cpu_state_sampling, interval_features, cpu_state_stream
+)
+from power_model import load_power_model, estimate_power
+from cgroups import (
+    create_job_cgroup, cgroup_launch_args, start_cgroup_sampling, sample_cgroup, finish_cgroup_sampling,
+    kill_job_cgroup, cgroup_streams
+)
+from sensor_merge import SensorStream, merge_streams
+from page_corpus import attribute_navigations, summarize_navigations
 from reporting import save_results_to_csv, save_aggregate_results
+from profiles import profile_args, create_profile, discard_profile
+from scenarios import SCENARIOS
+from campaign import RunResult
+import clock
+
+# simulate.py swaps this for a fake launcher that replays recorded traces.
+launch_browser = subprocess.Popen
 
 def get_available_browsers():
     from config import BROWSERS
@@ -30,73 +57,92 @@ def get_available_browsers():
     
     return available_browsers
 
-def run_browser_test(browser_cmd, browser_name, test_type, url, power_file=None, duration=WATCH_DURATION):
+def trigger_autoplay(browser_cmd, url, profile_dir=None):
+    try:
+        subprocess.run(["which", "xdotool"], check=True, capture_output=True)
+        log_message("Using xdotool to help trigger video autoplay...")
+        subprocess.run(["xdotool", "mousemove", "50%", "50%"], capture_output=True)
+        subprocess.run(["xdotool", "click", "1"], capture_output=True)
+        clock.sleep(2)
+    except subprocess.CalledProcessError:
+        log_message("xdotool not available, relying on JavaScript for autoplay")
+
+def open_tabs(browser_cmd, url, profile_dir=None, count=10):
+    tab_cmd = [browser_cmd] + (profile_args(browser_cmd, profile_dir, new_instance=False) if profile_dir else [])
+    for _ in range(count):
+        launch_browser(tab_cmd + [url]).wait()
+        clock.sleep(1)
+
+# Readiness steps a Scenario can name in its `ready` tuple.
+READY_STEPS = {
+    "autoplay": trigger_autoplay,
+    "open_tabs": open_tabs
+}
+
+def stop_browser(browser_process):
+    browser_process.terminate()
+    try:
+        browser_process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        browser_process.kill()
+        browser_process.wait()
+
+def run_browser_test(browser_cmd, browser_name, test_type, url, power_file=None, duration=WATCH_DURATION,
+                     profile_dir=None, sample_interval=SAMPLE_INTERVAL):
     log_message(f"Starting {test_type} test for {browser_name}...")
     
-    if test_type == "video":
-        if browser_cmd == "firefox":
-            cmd = [browser_cmd, "--kiosk", "--autoplay-policy=no-user-gesture-required", 
-                  f"http://localhost:{VIDEO_SERVER_PORT}/video.html"]
-        elif browser_cmd in ["google-chrome", "chromium-browser", "brave-browser", "microsoft-edge"]:
-            cmd = [browser_cmd, "--autoplay-policy=no-user-gesture-required", "--start-maximized",
-                  f"http://localhost:{VIDEO_SERVER_PORT}/video.html"]
-        elif browser_cmd in ["opera", "vivaldi"]:
-            cmd = [browser_cmd, "--autoplay-policy=no-user-gesture-required", 
-                  f"http://localhost:{VIDEO_SERVER_PORT}/video.html"]
-        else:
-            cmd = [browser_cmd, f"http://localhost:{VIDEO_SERVER_PORT}/video.html"]
-    elif test_type == "animation":
-        if browser_cmd in ["google-chrome", "chromium-browser", "brave-browser", "microsoft-edge"]:
-            cmd = [browser_cmd, "--start-maximized",
-                  f"http://localhost:{VIDEO_SERVER_PORT}/animation.html"]
-        else:
-            cmd = [browser_cmd, f"http://localhost:{VIDEO_SERVER_PORT}/animation.html"]
-    elif test_type == "js_computation":
-        if browser_cmd in ["google-chrome", "chromium-browser", "brave-browser", "microsoft-edge"]:
-            cmd = [browser_cmd, "--start-maximized",
-                  f"http://localhost:{VIDEO_SERVER_PORT}/jscomputation.html"]
-        else:
-            cmd = [browser_cmd, f"http://localhost:{VIDEO_SERVER_PORT}/jscomputation.html"]
-    elif test_type == "webpage":
-        cmd = [browser_cmd, url]
-    elif test_type == "multiple_tabs":
-        cmd = [browser_cmd]
-    else:
+    scenario = SCENARIOS.get(test_type)
+    if not scenario:
         log_message(f"Unknown test type: {test_type}")
         return None
     
+    target = scenario.launch_target(url, VIDEO_SERVER_PORT)
+    cmd = [browser_cmd] + scenario.launch_flags(browser_cmd) + ([target] if target else [])
+    
+    if profile_dir:
+        cmd = cmd[:1] + profile_args(browser_cmd, profile_dir) + cmd[1:]
+    
+    browser_process = None
+    job_cgroup = create_job_cgroup(browser_cmd)
+    if scenario.work_unit:
+        reset_work_counter(test_type)
+    if scenario.navigations:
+        reset_navigations(test_type)
+    
     try:
-        browser_process = subprocess.Popen(cmd)
+        launch_cmd, launch_kwargs = cgroup_launch_args(job_cgroup, cmd)
+        browser_process = launch_browser(launch_cmd, **launch_kwargs)
         log_message(f"Started {browser_name} with PID {browser_process.pid}")
         
-        time.sleep(5)
+        clock.sleep(5)
         
-        if test_type == "video":
-            try:
-                subprocess.run(["which", "xdotool"], check=True, capture_output=True)
-                log_message("Using xdotool to help trigger video autoplay...")
-                subprocess.run(["xdotool", "mousemove", "50%", "50%"], capture_output=True)
-                subprocess.run(["xdotool", "click", "1"], capture_output=True)
-                time.sleep(2)
-            except subprocess.CalledProcessError:
-                log_message("xdotool not available, relying on JavaScript for autoplay")
-                pass
-        
-        if test_type == "multiple_tabs":
-            for _ in range(10):
-                subprocess.run([browser_cmd, url])
-                time.sleep(1)
-        
-        start_time = time.time()
+        for step in scenario.ready:
+            READY_STEPS[step](browser_cmd, url, profile_dir)
+        
+        perf_state = start_perf_counters(browser_process.pid, job_cgroup)
+        
+        start_time = clock.time()
         end_time = start_time + duration
         
-        power_readings = []
-        timestamps = []
+        power_readings = array('d')
+        timestamps = array('d')
+        counter_energy = None
+        rapl_energy = None
+        power_estimate_error = None
+        
+        rapl_state = start_rapl_sampling()
+        cpu_state = start_cpu_state_sampling()
+        cpu_summary = None
+        cgroup_state = start_cgroup_sampling(job_cgroup, browser_process.pid) if job_cgroup else None
+        cgroup_summary = None
+        work_start = read_work_counter(test_type) if scenario.work_unit else None
         
         if power_file:
+            start_energy = read_battery_energy(power_file)
+            
             log_message(f"Collecting power data from {power_file} for {duration} seconds...")
-            while time.time() < end_time:
-                current_time = time.time() - start_time
+            while clock.time() < end_time:
+                current_time = clock.time() - start_time
                 power = read_power_file(power_file)
                 
                 if power is not None:
@@ -104,10 +150,45 @@ def run_browser_test(browser_cmd, browser_name, test_type, url, power_file=None,
                     timestamps.append(current_time)
                     log_message(f"Time: {current_time:.1f}s, Power: {power:.2f}W")
                 
-                time.sleep(SAMPLE_INTERVAL)
+                if rapl_state:
+                    sample_rapl(rapl_state)
+                if cpu_state:
+                    sample_cpu_state(cpu_state)
+                if cgroup_state:
+                    sample_cgroup(cgroup_state)
+                if perf_state:
+                    sample_perf_counters(perf_state)
+                
+                clock.sleep(sample_interval)
+            
+            counter_energy = battery_energy_used(start_energy, read_battery_energy(power_file))
+        elif cpu_state and (power_model := load_power_model()):
+            log_message(f"No direct power readings available. Estimating power from CPU counters for {duration} seconds...")
+            while clock.time() < end_time:
+                timestamps.append(clock.time() - start_time)
+                clock.sleep(sample_interval)
+                
+                sample_cpu_state(cpu_state)
+                if rapl_state:
+                    sample_rapl(rapl_state)
+                if cgroup_state:
+                    sample_cgroup(cgroup_state)
+                if perf_state:
+                    sample_perf_counters(perf_state)
+            
+            try:
+                estimated, interval_error = estimate_power(power_model, interval_features(cpu_state))
+                power_readings = array('d', estimated)
+                del timestamps[len(power_readings):]
+                power_estimate_error = 1.96 * power_model["run_rmse"]
+                log_message(f"Estimated power is good to +/-{interval_error:.2f}W per sample, "
+                            f"+/-{power_estimate_error:.2f}W on the run's average (95%)")
+            except ValueError as e:
+                log_message(f"Power model unusable on this host: {e}")
+                power_readings = array('d')
         else:
             log_message(f"No direct power readings available. Using powertop...")
-            time.sleep(duration)
+            clock.sleep(duration)
             
             try:
                 powertop_output = subprocess.run(
@@ -118,46 +199,97 @@ def run_browser_test(browser_cmd, browser_name, test_type, url, power_file=None,
                 
                 log_message("Powertop data collected.")
                 
-                power_readings = [0]
-                timestamps = [0]
+                power_readings = array('d', [0])
+                timestamps = array('d', [0])
             except Exception as e:
                 log_message(f"Error running powertop: {e}")
         
+        # The page reports once a second, so both ends are at most a second stale.
+        work_end = read_work_counter(test_type) if scenario.work_unit else None
+        work_units = work_end - (work_start or 0) if work_end is not None else None
+        if work_units is not None:
+            log_message(f"Work done: {work_units:.0f} {scenario.work_unit} ({work_units / duration:.1f}/s)")
+        
+        navigations = None
+        if scenario.navigations and (power_file or power_estimate_error is not None):
+            navigations = attribute_navigations(timestamps, power_readings, read_navigations(test_type),
+                                                start_time, duration, sample_interval)
+            corpus = summarize_navigations(navigations, duration)
+            if corpus["pages"]:
+                log_message(f"Corpus: {corpus['pages']} pages ({corpus['pages_per_hour']:.0f}/hour), "
+                            f"{corpus['failed']} not loaded, median load {corpus['median_load_ms']:.0f}ms"
+                            + (f", {corpus['energy_per_page']:.2f}J/page" if corpus["energy_per_page"] else ""))
+        
+        perf_counters = stop_perf_counters(perf_state, start_time) if perf_state else None
+        
+        if cpu_state:
+            cpu_summary = finish_cpu_state_sampling(cpu_state, power_readings)
+        
+        if cgroup_state:
+            cgroup_summary = finish_cgroup_sampling(cgroup_state)
+        
+        if rapl_state:
+            rapl_energy = finish_rapl_sampling(rapl_state)
+            for domain, energy in rapl_energy.items():
+                log_message(f"RAPL {domain}: {energy:.4f}Wh")
+        
+        # Every sensor kept its own timestamps; put them on one grid.
+        streams = []
+        if power_readings and (power_file or power_estimate_error is not None):
+            streams.append(SensorStream("power", np.frombuffer(timestamps) + start_time, {"watts": power_readings},
+                                        latency=SENSOR_LATENCIES.get("power", 0.0)))
+        streams += [stream for stream in (
+            cpu_state_stream(cpu_state) if cpu_state else None,
+            rapl_stream(rapl_state) if rapl_state else None
+        ) if stream]
+        if cgroup_state:
+            streams += cgroup_streams(cgroup_state)
+        # Unthrottled sampling (interval 0) has no grid to merge onto; a failed
+        # merge costs the merged frame, not the run.
+        sensors = None
+        if len(streams) > 1 and sample_interval > 0:
+            try:
+                sensors = merge_streams(streams, sample_interval, start_time, start_time + duration)
+            except Exception as e:
+                log_message(f"Could not merge sensor streams: {e}")
+        
         log_message(f"Test complete. Terminating {browser_name}...")
         
-        browser_process.terminate()
-        try:
-            browser_process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            browser_process.kill()
-            browser_process.wait()
+        stop_browser(browser_process)
         
-        if test_type == "multiple_tabs":
+        # The job's cgroup holds every helper it started and nothing else;
+        # killall is the fallback and also hits unrelated instances.
+        if not (job_cgroup and kill_job_cgroup(job_cgroup, browser_process.pid)) and scenario.kill_after:
             subprocess.run(["killall", browser_cmd], stderr=subprocess.DEVNULL)
         
         log_message(f"{browser_name} terminated.")
         
         if power_readings:
-            avg_power = sum(power_readings) / len(power_readings)
-            max_power = max(power_readings)
-            min_power = min(power_readings)
-            total_energy = sum(power_readings) * SAMPLE_INTERVAL / 3600
+            result = RunResult(
+                browser_name,
+                test_type,
+                timestamps,
+                power_readings,
+                counter_energy=counter_energy,
+                rapl_energy=rapl_energy,
+                perf_counters=perf_counters,
+                cpu_state=cpu_summary,
+                cgroup=cgroup_summary,
+                power_estimate_error=power_estimate_error,
+                sensors=sensors,
+                work_units=work_units,
+                work_rate=work_units / duration if work_units is not None else None,
+                navigations=navigations
+            )
             
-            log_message(f"Average Power: {avg_power:.2f}W")
-            log_message(f"Max Power: {max_power:.2f}W")
-            log_message(f"Min Power: {min_power:.2f}W")
-            log_message(f"Total Energy: {total_energy:.4f}Wh")
+            log_message(f"Average Power: {result.avg_power:.2f}W")
+            log_message(f"Max Power: {result.max_power:.2f}W")
+            log_message(f"Min Power: {result.min_power:.2f}W")
+            log_message(f"Total Energy: {result.total_energy:.4f}Wh")
+            if counter_energy is not None:
+                log_message(f"Battery Counter Energy: {counter_energy:.4f}Wh")
             
-            return {
-                "browser": browser_name,
-                "test_type": test_type,
-                "timestamps": timestamps,
-                "power_readings": power_readings,
-                "avg_power": avg_power,
-                "max_power": max_power,
-                "min_power": min_power,
-                "total_energy": total_energy
-            }
+            return result
         else:
             log_message("No power readings collected.")
             return None
@@ -168,5 +300,167 @@ def run_browser_test(browser_cmd, browser_name, test_type, url, power_file=None,
             browser_process.kill()
         except:
             pass
+        if not (job_cgroup and kill_job_cgroup(job_cgroup, browser_process.pid if browser_process else None)):
+            subprocess.run(["killall", browser_cmd], stderr=subprocess.DEVNULL)
+        return None
+
+def sample_power_window(power_file, duration, origin):
+    timestamps = []
+    power_readings = []
+    end_time = clock.time() + duration
+    
+    while clock.time() < end_time:
+        power = read_power_file(power_file)
+        if power is not None:
+            power_readings.append(power)
+            timestamps.append(clock.time() - origin)
+        clock.sleep(SAMPLE_INTERVAL)
+    
+    return timestamps, power_readings
+
+def run_tab_sweep(browser_cmd, browser_name, url, power_file, levels=TAB_SWEEP_LEVELS):
+    log_message(f"Starting tab sweep for {browser_name} ({', '.join(str(n) for n in levels)} tabs)...")
+    
+    if not power_file:
+        log_message("Tab sweep needs direct power readings; skipping")
+        return None
+    
+    browser_process = None
+    timestamps = []
+    power_readings = []
+    sweep = []
+    
+    try:
+        browser_process = launch_browser([browser_cmd, url])
+        log_message(f"Started {browser_name} with PID {browser_process.pid}")
+        clock.sleep(5)
+        
+        origin = clock.time()
+        open_tabs = 1
+        
+        for level in levels:
+            if level > open_tabs:
+                # One launcher call per level; the running instance opens every URL as a tab.
+                launch_browser([browser_cmd] + [url] * (level - open_tabs), stderr=subprocess.DEVNULL).wait()
+                open_tabs = level
+            
+            settle_times, settle_power = sample_power_window(power_file, TAB_SWEEP_SETTLE, origin)
+            steady_times, steady_power = sample_power_window(power_file, TAB_SWEEP_DWELL, origin)
+            memory_mb = get_tree_memory_mb(browser_process.pid)
+            
+            timestamps += settle_times + steady_times
+            power_readings += settle_power + steady_power
+            
+            if steady_power:
+                level_result = {
+                    "tabs": level,
+                    "settle_power": statistics.mean(settle_power) if settle_power else None,
+                    "steady_power": statistics.median(steady_power),
+                    "memory_mb": memory_mb
+                }
+                sweep.append(level_result)
+                log_message(f"{level} tabs: {level_result['steady_power']:.2f}W steady, {memory_mb:.0f}MB")
+        
+        log_message(f"Tab sweep complete. Terminating {browser_name}...")
+    
+    except Exception as e:
+        log_message(f"Error during tab sweep: {e}")
+    
+    finally:
+        if browser_process:
+            stop_browser(browser_process)
         subprocess.run(["killall", browser_cmd], stderr=subprocess.DEVNULL)
-        return None
\ No newline at end of file
+    
+    if len(sweep) < 2:
+        log_message("Not enough tab levels measured to fit a scaling curve.")
+        return None
+    
+    tabs = [level["tabs"] for level in sweep]
+    watts_per_tab, base_power = np.polyfit(tabs, [level["steady_power"] for level in sweep], 1)
+    mb_per_tab, base_memory = np.polyfit(tabs, [level["memory_mb"] for level in sweep], 1)
+    
+    log_message(f"Marginal power: {watts_per_tab:.3f}W/tab, marginal memory: {mb_per_tab:.1f}MB/tab")
+    
+    return RunResult(
+        browser_name,
+        "tab_sweep",
+        timestamps,
+        power_readings,
+        sweep=sweep,
+        watts_per_tab=float(watts_per_tab),
+        base_power=float(base_power),
+        mb_per_tab=float(mb_per_tab),
+        base_memory_mb=float(base_memory)
+    )
+
+def prepare_profile_template(browser_cmd, browser_name, url=TEST_URL, duration=PROFILE_WARMUP_DURATION):
+    # Lets the browser do its first-run work (profile creation, component and
+    # extension downloads, cache fill) once, so warm jobs start from a copy of
+    # the result instead of paying for it in the measurement.
+    log_message(f"Warming a profile template for {browser_name} ({duration}s)...")
+    
+    template = create_profile(browser_cmd)
+    browser_process = None
+    try:
+        browser_process = launch_browser([browser_cmd] + profile_args(browser_cmd, template) + [url])
+        clock.sleep(duration)
+    except Exception as e:
+        log_message(f"Error warming profile for {browser_name}: {e}")
+        discard_profile(template)
+        return None
+    finally:
+        if browser_process:
+            stop_browser(browser_process)
+    
+    clock.sleep(5)
+    return template
+
+def measure_startup(browser_cmd, browser_name, url, power_file, template=None, window=STARTUP_COMPARISON_WINDOW):
+    profile_dir = create_profile(browser_cmd, template)
+    browser_process = None
+    try:
+        browser_process = launch_browser([browser_cmd] + profile_args(browser_cmd, profile_dir) + [url])
+        _, power_readings = sample_power_window(power_file, window, clock.time())
+    except Exception as e:
+        log_message(f"Error measuring {browser_name} startup: {e}")
+        power_readings = []
+    finally:
+        if browser_process:
+            stop_browser(browser_process)
+        discard_profile(profile_dir)
+    
+    if not power_readings:
+        return None
+    return sum(power_readings) * SAMPLE_INTERVAL / 3600
+
+def run_startup_comparison(browser_cmd, browser_name, url, power_file, template, runs=STARTUP_COMPARISON_RUNS):
+    # Cold and warm launches alternate so drift in the machine's state hits
+    # both modes alike.
+    log_message(f"Starting cold/warm startup comparison for {browser_name} ({runs} runs each)...")
+    
+    if not power_file:
+        log_message("Startup comparison needs direct power readings; skipping")
+        return None
+    
+    modes = [("cold", None)] + ([("warm", template)] if template else [])
+    energies = {mode: [] for mode, _ in modes}
+    
+    for run in range(runs):
+        for mode, mode_template in modes:
+            energy = measure_startup(browser_cmd, browser_name, url, power_file, mode_template)
+            if energy is not None:
+                energies[mode].append(energy)
+                log_message(f"{browser_name} {mode} start {run + 1}/{runs}: {energy:.5f}Wh")
+            clock.sleep(5)
+    
+    startup = {}
+    for mode, values in energies.items():
+        if values:
+            startup[mode] = {
+                "runs": len(values),
+                "mean_energy": statistics.mean(values),
+                "stdev_energy": statistics.stdev(values) if len(values) > 1 else 0.0,
+                "avg_power": statistics.mean(values) * 3600 / STARTUP_COMPARISON_WINDOW
+            }
+    
+    return {"browser": browser_name, "window": STARTUP_COMPARISON_WINDOW, "modes": startup} if startup else None
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+from config import (
+    WATCH_DURATION, TEST_URL, NUM_TEST_ITERATIONS, SAMPLE_INTERVAL, TEST_TYPES, ALL_TEST_TYPES, BROWSERS,
+    RUN_TAB_SWEEP, PROFILE_MODE, PROFILE_MODES, RUN_STARTUP_COMPARISON, SYSTEM_STATE_POLICY, SYSTEM_STATE_POLICIES,
+    BACKLIGHT_LEVEL
+)
+
+class RunConfig:
+    __slots__ = ("duration", "url", "iterations", "browsers", "test_types", "tab_sweep",
+                 "profile_mode", "startup_comparison", "time_budget", "state_policy", "backlight")
+
+    def __init__(self, duration=WATCH_DURATION, url=TEST_URL, iterations=NUM_TEST_ITERATIONS,
+                 browsers=None, test_types=None, tab_sweep=RUN_TAB_SWEEP,
+                 profile_mode=PROFILE_MODE, startup_comparison=RUN_STARTUP_COMPARISON, time_budget=None,
+                 state_policy=SYSTEM_STATE_POLICY, backlight=BACKLIGHT_LEVEL):
+        self.duration = duration
+        self.url = url
+        self.iterations = iterations
+        self.browsers = list(browsers) if browsers else None
+        # "all" stands for the default scenarios; opt-in ones are added by name.
+        self.test_types = list(dict.fromkeys(
+            name for t in (test_types or ["all"]) for name in (TEST_TYPES if t == "all" else [t])
+        ))
+        self.tab_sweep = tab_sweep
+        self.profile_mode = profile_mode
+        self.startup_comparison = startup_comparison
+        self.time_budget = time_budget
+        self.state_policy = state_policy
+        self.backlight = backlight
+
+        unknown = [t for t in self.test_types if t not in ALL_TEST_TYPES]
+        if unknown:
+            raise ValueError(f"Unknown test types: {', '.join(unknown)}")
+        if self.profile_mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {self.profile_mode}")
+        if self.state_policy not in SYSTEM_STATE_POLICIES:
+            raise ValueError(f"Unknown system state policy: {self.state_policy}")
+        if self.backlight is not None and not 0 <= self.backlight <= 100:
+            raise ValueError(f"Backlight level must be a percentage: {self.backlight}")
+
+    def select_browsers(self, available_browsers):
+        # Accepts either launcher commands ("google-chrome") or display names ("Chrome").
+        if not self.browsers:
+            return dict(available_browsers)
+        wanted = {b.lower() for b in self.browsers}
+        return {
+            cmd: name for cmd, name in available_browsers.items()
+            if cmd.lower() in wanted or name.lower() in wanted
+        }
+
+    def unknown_browsers(self):
+        known = {cmd.lower() for cmd in BROWSERS} | {name.lower() for name in BROWSERS.values()}
+        return [b for b in self.browsers or [] if b.lower() not in known]
+
+class RunResult:
+    # Traces are float64 arrays; scalar summaries are slots; everything the
+    # optional collectors attach (RAPL, perf, CPU state, anomalies...) lives in
+    # extras. Item access keeps the dict-style interface reporting relies on.
+    __slots__ = ("browser", "test_type", "iteration", "timestamps", "power_readings",
+                 "avg_power", "max_power", "min_power", "median_power", "p95_power", "total_energy", "extras")
+
+    def __init__(self, browser, test_type, timestamps, power_readings, iteration=None, **extras):
+        import numpy as np
+        
+        self.browser = browser
+        self.test_type = test_type
+        self.iteration = iteration
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.power_readings = np.asarray(power_readings, dtype=np.float64)
+        self.extras = extras
+
+        if len(self.power_readings):
+            self.avg_power = float(self.power_readings.mean())
+            self.max_power = float(self.power_readings.max())
+            self.min_power = float(self.power_readings.min())
+            self.median_power, self.p95_power = (float(p) for p in np.percentile(self.power_readings, [50, 95]))
+            self.total_energy = float(self.power_readings.sum()) * SAMPLE_INTERVAL / 3600
+        else:
+            self.avg_power = self.max_power = self.min_power = self.total_energy = 0.0
+            self.median_power = self.p95_power = 0.0
+
+    def __getitem__(self, key):
+        if key != "extras" and key in RunResult.__slots__:
+            return getattr(self, key)
+        return self.extras[key]
+
+    def __setitem__(self, key, value):
+        if key != "extras" and key in RunResult.__slots__:
+            setattr(self, key, value)
+        else:
+            self.extras[key] = value
+
+    def __contains__(self, key):
+        return (key != "extras" and key in RunResult.__slots__) or key in self.extras
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def to_dict(self):
+        return {
+            **{key: getattr(self, key) for key in RunResult.__slots__ if key != "extras"},
+            **self.extras
+        }
+
+    def __repr__(self):
+        return (f"RunResult({self.browser!r}, {self.test_type!r}, iteration={self.iteration}, "
+                f"samples={len(self.power_readings)}, avg_power={self.avg_power:.2f})")
+
+class Campaign:
+    def __init__(self, run_config=None):
+        self.config = run_config or RunConfig()
+        self.results = {}
+        self.report_file = None
+        self.log_file = None
+        self.output_dir = None
+
+    def run(self):
+        from run_tests import run_all_tests
+
+        outcome = run_all_tests(self.config)
+        if not outcome:
+            return None
+
+        self.results = outcome["results"]
+        self.report_file = outcome["report_file"]
+        self.log_file = outcome["log_file"]
+        self.output_dir = outcome["output_dir"]
+        return outcome
+
+    def iter_results(self, test_type=None, browser=None):
+        for result_type, iterations in self.results.items():
+            if test_type and result_type != test_type:
+                continue
+            for iteration_results in iterations:
+                for result in iteration_results:
+                    if result and (not browser or result.browser.lower() == browser.lower()):
+                        yield result
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+import os
+import time
+import signal
+import functools
+import subprocess
+from pathlib import Path
+
+import numpy as np
+
+from config import CGROUP_ROOT, CGROUP_PARENT, ENABLE_CGROUPS, TIMESTAMP, SENSOR_LATENCIES
+from utils import log_message
+from sensor_merge import SensorStream
+import clock
+
+_job_count = 0
+
+@functools.lru_cache(maxsize=None)
+def discover_cgroup_mode():
+    # "delegated": job cgroups are created under CGROUP_PARENT directly.
+    # "systemd": each job runs in a transient `systemd-run --user --scope`.
+    if not ENABLE_CGROUPS or not (CGROUP_ROOT / "cgroup.controllers").exists():
+        return None
+
+    if CGROUP_PARENT:
+        if os.access(CGROUP_PARENT / "cgroup.procs", os.W_OK):
+            return "delegated"
+        log_message(f"Cannot create job cgroups under {CGROUP_PARENT}")
+
+    try:
+        subprocess.run(["systemd-run", "--user", "--scope", "--quiet", "true"],
+                       check=True, capture_output=True, timeout=10)
+        return "systemd"
+    except (OSError, subprocess.CalledProcessError, subprocess.TimeoutExpired):
+        return None
+
+def create_job_cgroup(browser_cmd):
+    global _job_count
+
+    mode = discover_cgroup_mode()
+    if not mode:
+        return None
+
+    _job_count += 1
+    name = f"browser-power-{TIMESTAMP}-{_job_count}-{browser_cmd}"
+    job = {"mode": mode, "name": name, "path": None}
+
+    if mode == "delegated":
+        job["path"] = CGROUP_PARENT / name
+        try:
+            job["path"].mkdir()
+        except OSError as e:
+            log_message(f"Could not create cgroup {job['path']}: {e}")
+            return None
+    return job
+
+def cgroup_launch_args(job, cmd):
+    # Either way the browser is inside its cgroup before it execs, so no
+    # helper process can start outside it.
+    if not job:
+        return cmd, {}
+
+    if job["mode"] == "systemd":
+        return ["systemd-run", "--user", "--scope", "--quiet", "--collect", f"--unit={job['name']}", "--"] + cmd, {}
+
+    procs_file = str(job["path"] / "cgroup.procs")
+    def join_cgroup():
+        with open(procs_file, 'w') as f:
+            f.write("0")
+    return cmd, {"preexec_fn": join_cgroup}
+
+def resolve_job_cgroup(job, pid):
+    if job["path"] is None:
+        try:
+            for line in Path(f"/proc/{pid}/cgroup").read_text().splitlines():
+                if line.startswith("0::") and job["name"] in line:
+                    job["path"] = CGROUP_ROOT / line[3:].lstrip("/")
+        except OSError:
+            pass
+    return job["path"]
+
+def _read_keyed(fd):
+    return os.pread(fd, 1 << 16, 0).decode(errors="replace").split()
+
+def _read_cpu_usec(fd):
+    fields = _read_keyed(fd)
+    return int(fields[fields.index("usage_usec") + 1])
+
+def _read_io_bytes(fd):
+    # io.stat: one line per device, "MAJ:MIN rbytes=.. wbytes=.. rios=.. ..."
+    read_bytes = write_bytes = 0
+    for field in _read_keyed(fd):
+        if field.startswith("rbytes="):
+            read_bytes += int(field[7:])
+        elif field.startswith("wbytes="):
+            write_bytes += int(field[7:])
+    return read_bytes, write_bytes
+
+def start_cgroup_sampling(job, pid):
+    path = resolve_job_cgroup(job, pid)
+    if not path:
+        log_message(f"Could not find the cgroup of {job['name']}")
+        return None
+
+    # Each counter stays open for the whole run; a sample is one pread per file.
+    fds = {}
+    for key, filename in (("cpu", "cpu.stat"), ("memory", "memory.current"), ("io", "io.stat")):
+        try:
+            fds[key] = os.open(path / filename, os.O_RDONLY)
+        except OSError:
+            pass
+
+    if not fds:
+        log_message(f"No readable accounting files in {path}")
+        return None
+
+    state = {
+        "path": path,
+        "fds": fds,
+        "cpu_usec": [],
+        "memory_bytes": [],
+        "io_bytes": [],
+        "times": []
+    }
+    sample_cgroup(state)
+    return state
+
+def sample_cgroup(state):
+    fds = state["fds"]
+    try:
+        now = clock.time()
+        cpu_usec = _read_cpu_usec(fds["cpu"]) if "cpu" in fds else None
+        memory_bytes = int(os.pread(fds["memory"], 32, 0)) if "memory" in fds else None
+        io_bytes = _read_io_bytes(fds["io"]) if "io" in fds else None
+    except (OSError, ValueError, IndexError):
+        # The cgroup is gone (the browser exited early); keep what was read.
+        return
+
+    state["times"].append(now)
+    if cpu_usec is not None:
+        state["cpu_usec"].append(cpu_usec)
+    if memory_bytes is not None:
+        state["memory_bytes"].append(memory_bytes)
+    if io_bytes is not None:
+        state["io_bytes"].append(io_bytes)
+
+def finish_cgroup_sampling(state):
+    sample_cgroup(state)
+    summary = {}
+    elapsed = state["times"][-1] - state["times"][0] if len(state["times"]) > 1 else 0.0
+
+    if len(state["cpu_usec"]) > 1 and elapsed > 0:
+        busy = np.diff(np.array(state["cpu_usec"], dtype=np.float64)) / 1e6
+        intervals = np.diff(np.array(state["times"]))
+        summary["cpu_seconds"] = float(busy.sum())
+        summary["avg_cpu_cores"] = float(busy.sum() / elapsed)
+        summary["peak_cpu_cores"] = float((busy / np.maximum(intervals, 1e-6)).max())
+
+    if state["memory_bytes"]:
+        memory_mb = np.array(state["memory_bytes"], dtype=np.float64) / (1024 * 1024)
+        summary["avg_memory_mb"] = float(memory_mb.mean())
+        summary["peak_memory_mb"] = float(memory_mb.max())
+        try:
+            # memory.peak (Linux 5.19+) also catches peaks between samples.
+            summary["peak_memory_mb"] = int((state["path"] / "memory.peak").read_text()) / (1024 * 1024)
+        except (OSError, ValueError):
+            pass
+
+    if len(state["io_bytes"]) > 1:
+        (read_start, write_start), (read_end, write_end) = state["io_bytes"][0], state["io_bytes"][-1]
+        summary["io_read_mb"] = (read_end - read_start) / (1024 * 1024)
+        summary["io_write_mb"] = (write_end - write_start) / (1024 * 1024)
+
+    for fd in state["fds"].values():
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+    return summary
+
+def cgroup_streams(state):
+    # CPU and I/O are rates over each interval; memory is a reading.
+    times = np.array(state["times"])
+    latency = SENSOR_LATENCIES.get("cgroup", 0.0)
+    streams = []
+    if len(times) < 2:
+        return streams
+
+    elapsed = np.maximum(np.diff(times), 1e-6)
+    rates = {}
+    if len(state["cpu_usec"]) == len(times):
+        rates["cpu_cores"] = np.diff(np.array(state["cpu_usec"], dtype=np.float64)) / 1e6 / elapsed
+    if len(state["io_bytes"]) == len(times):
+        io_bytes = np.array(state["io_bytes"], dtype=np.float64) / (1024 * 1024)
+        rates["io_read_mb_s"] = np.diff(io_bytes[:, 0]) / elapsed
+        rates["io_write_mb_s"] = np.diff(io_bytes[:, 1]) / elapsed
+    if rates:
+        streams.append(SensorStream("cgroup", times[1:], rates, kind="interval", latency=latency, start=times[0]))
+
+    if len(state["memory_bytes"]) == len(times):
+        memory_mb = np.array(state["memory_bytes"], dtype=np.float64) / (1024 * 1024)
+        streams.append(SensorStream("cgroup_memory", times, {"memory_mb": memory_mb}, latency=latency))
+    return streams
+
+def kill_job_cgroup(job, pid=None, timeout=5):
+    # Tears down everything the job started, helpers included, without
+    # touching other instances of the same browser. Returns False when the
+    # cgroup could not be found, so the caller can fall back to killall.
+    path = resolve_job_cgroup(job, pid) if pid else job["path"]
+    if not path:
+        return False
+    if not path.exists():
+        # A transient scope is collected as soon as it empties.
+        return True
+
+    try:
+        (path / "cgroup.kill").write_text("1")
+    except OSError:
+        # cgroup.kill needs Linux 5.14; signal the members one by one instead.
+        try:
+            for member in (path / "cgroup.procs").read_text().split():
+                try:
+                    os.kill(int(member), signal.SIGKILL)
+                except (ProcessLookupError, ValueError):
+                    pass
+        except OSError:
+            return False
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if "populated 0" in (path / "cgroup.events").read_text():
+                break
+        except OSError:
+            break
+        time.sleep(0.05)
+
+    if job["mode"] == "delegated":
+        try:
+            path.rmdir()
+        except OSError as e:
+            log_message(f"Could not remove cgroup {path}: {e}")
+    return True
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+import time as _time
+
+class SystemClock:
+    def time(self):
+        return _time.time()
+
+    def sleep(self, seconds):
+        _time.sleep(seconds)
+
+class SimulatedClock:
+    # Virtual time only moves when the harness sleeps, so a run samples the
+    # same instants every time. Each sleep costs seconds / speedup of real
+    # time; speedup=None skips real waiting entirely.
+    def __init__(self, speedup=1000.0, start=None):
+        self.speedup = speedup
+        self.now = _time.time() if start is None else start
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        if self.speedup:
+            _time.sleep(seconds / self.speedup)
+        self.now += seconds
+
+_clock = SystemClock()
+
+def time():
+    return _clock.time()
+
+def sleep(seconds):
+    _clock.sleep(seconds)
+
+def use_clock(new_clock):
+    global _clock
+    previous = _clock
+    _clock = new_clock
+    return previous
@@ -1,17 +1,91 @@
 #!/usr/bin/env python3
+import os
 import datetime
+import tempfile
 from pathlib import Path
 
+from scenarios import SCENARIOS
+
 WATCH_DURATION = 60
-OUTPUT_DIR = Path.home() / "Desktop/Projects/browser_power_tests"
+OUTPUT_DIR = Path(os.environ.get("BROWSER_POWER_OUTPUT_DIR", Path.home() / "Desktop/Projects/browser_power_tests"))
 TIMESTAMP = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
 LOG_FILE = OUTPUT_DIR / f"power_test_{TIMESTAMP}.log"
-SAMPLE_INTERVAL = 1
+SAMPLE_INTERVAL = float(os.environ["BROWSER_POWER_SAMPLE_INTERVAL"]) if "BROWSER_POWER_SAMPLE_INTERVAL" in os.environ else 1
+POWER_NOW_FILE = os.environ.get("BROWSER_POWER_NOW_FILE")
+# Smallest step of the battery's energy counter in Wh (fuel gauges commonly
+# count in 10mWh or 1mAh steps); smaller changes give no energy cross-check.
+BATTERY_COUNTER_RESOLUTION = 0.01
+# RAPL, perf and CPU state read the host itself; simulate.py turns them off.
+HOST_COUNTERS = os.environ.get("BROWSER_POWER_HOST_COUNTERS", "1") != "0"
+RAPL_ROOT = Path("/sys/class/powercap")
+ENABLE_RAPL = HOST_COUNTERS
+ENABLE_PERF_COUNTERS = HOST_COUNTERS
+ENABLE_CPU_STATE = HOST_COUNTERS
+ENABLE_CGROUPS = HOST_COUNTERS
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+# A delegated cgroup v2 directory to create job cgroups under; without one,
+# jobs go into transient systemd --user scopes.
+CGROUP_PARENT = Path(os.environ["BROWSER_POWER_CGROUP_PARENT"]) if "BROWSER_POWER_CGROUP_PARENT" in os.environ else None
+PERF_EVENTS = ["cycles", "instructions", "cache-misses", "context-switches"]
+# Without a job cgroup, perf follows the process tree; checked this often for new processes.
+PERF_REATTACH_INTERVAL = 5
+CPU_SYSFS_ROOT = Path("/sys/devices/system/cpu")
+FREQ_HISTOGRAM_BIN_MHZ = 200
 TEST_URL = "https://www.lewisu.edu/"
 VIDEO_SERVER_PORT = 8000
 AUTOPLAY_RETRY_COUNT = 3
 NUM_TEST_ITERATIONS = 5
 
+# "default" uses the user's own profile; "cold" gives every job a fresh empty
+# profile; "warm" gives every job a copy of a profile pre-warmed once per campaign.
+PROFILE_MODE = "default"
+PROFILE_MODES = ["default", "cold", "warm"]
+PROFILE_ROOT = Path(tempfile.gettempdir()) / "browser_power_profiles"
+PROFILE_WARMUP_DURATION = 60
+
+RUN_STARTUP_COMPARISON = False
+STARTUP_COMPARISON_RUNS = 5
+STARTUP_COMPARISON_WINDOW = 15
+
+# Before every job the backlight is pinned (to BACKLIGHT_LEVEL percent, or
+# where it was when the campaign started) and CPU governor, EPP, platform
+# profile, AC and rfkill state are compared with the campaign's start.
+# "flag" records jobs that differ as anomalies; "refuse" waits up to
+# SYSTEM_STATE_WAIT seconds for the state to come back, then skips the job.
+ENABLE_SYSTEM_STATE = HOST_COUNTERS
+BACKLIGHT_LEVEL = float(os.environ["BROWSER_POWER_BACKLIGHT"]) if "BROWSER_POWER_BACKLIGHT" in os.environ else None
+SYSTEM_STATE_POLICY = "flag"
+SYSTEM_STATE_POLICIES = ["flag", "refuse", "ignore"]
+SYSTEM_STATE_WAIT = 120
+BACKLIGHT_ROOT = Path("/sys/class/backlight")
+POWER_SUPPLY_ROOT = Path("/sys/class/power_supply")
+RFKILL_ROOT = Path("/sys/class/rfkill")
+PLATFORM_PROFILE_FILE = Path("/sys/firmware/acpi/platform_profile")
+
+# Platform sweep (platform_sweep.py): a campaign per combination of CPU
+# governor, EPP and frequency cap (percent of cpuinfo_max_freq). Values the
+# CPU does not offer are skipped; the original settings are restored after.
+SWEEP_GOVERNORS = ["powersave", "schedutil", "performance"]
+SWEEP_EPP = ["power", "balance_power", "balance_performance", "performance"]
+SWEEP_FREQ_CAPS = [100, 80, 60]
+SWEEP_SETTLE = 30
+
+# Page-load corpus: the page_corpus scenario walks the HTML pages of a local
+# archive (listed in its CORPUS_MANIFEST, else every .html under it), or
+# CORPUS_SYNTHETIC_PAGES generated pages when no archive is set. Each page
+# stays CORPUS_DWELL seconds after its load event; one that never loads is
+# left after CORPUS_LOAD_TIMEOUT.
+CORPUS_DIR = Path(os.environ["BROWSER_POWER_CORPUS_DIR"]) if "BROWSER_POWER_CORPUS_DIR" in os.environ else None
+CORPUS_MANIFEST = "corpus.txt"
+CORPUS_SYNTHETIC_PAGES = 300
+CORPUS_DWELL = 1.0
+CORPUS_LOAD_TIMEOUT = 15.0
+
+RUN_TAB_SWEEP = False
+TAB_SWEEP_LEVELS = [1, 2, 4, 8, 16, 32, 64]
+TAB_SWEEP_SETTLE = 10
+TAB_SWEEP_DWELL = 30
+
 VIDEO_DIR = Path("/home/anthony/Desktop/Projects/Videos")
 VIDEO_FILES = {
     "webm": VIDEO_DIR / "test_VP9.webm",
@@ -27,9 +101,71 @@ BROWSERS = {
     "microsoft-edge": "Edge"
 }
 
-ANALYSIS_OUTPUT_DIR = Path.home() / "Desktop/Projects/output"
+ANALYSIS_OUTPUT_DIR = Path(os.environ.get("BROWSER_POWER_ANALYSIS_DIR", Path.home() / "Desktop/Projects/output"))
+RESULTS_DIR = OUTPUT_DIR
+DETAIL_CHUNK_ROWS = 65536
+
+# "csv" writes the text detail files; "trace" writes the delta-encoded binary
+# format of trace_format.py, far smaller and faster to read at high rates.
+DETAIL_FORMAT = os.environ.get("BROWSER_POWER_DETAIL_FORMAT", "csv")
+TRACE_SUFFIX = ".pwtrace"
+TRACE_CHUNK_SAMPLES = 4096
+
+PHASE_MIN_SEGMENT = 3
+PHASE_PENALTY = 3.0
+PHASE_SPIKE_THRESHOLD = 3.0
+PHASE_SETTLE_SEGMENTS = 2
+
+ANOMALY_SAMPLE_Z = 3.5
+ANOMALY_MAX_OUTLIER_FRACTION = 0.1
+ANOMALY_MIN_TRACE_FRACTION = 0.8
+ANOMALY_MIN_RELATIVE_DEVIATION = 0.1
+ANOMALY_MAX_RETRIES = 2
+# Re-run iterations whose power is an outlier among the campaign's iterations;
+# simulate.py turns this off so a replay keeps every recorded iteration.
+REQUEUE_OUTLIERS = os.environ.get("BROWSER_POWER_REQUEUE_OUTLIERS", "1") != "0"
+
+BENCHMARK_REGRESSION_THRESHOLD = 0.2
+
+REGRESSION_INDEX_FILE = "campaign_index.csv"
+REGRESSION_MIN_CHANGE = 0.05
+REGRESSION_MIN_EFFECT_SIZE = 0.8
+
+# Battery-life projection: usage mixes are time shares of test types
+# (normalized), capacity comes from sysfs energy_full unless set here.
+BATTERY_CAPACITY_WH = float(os.environ["BROWSER_POWER_BATTERY_WH"]) if "BROWSER_POWER_BATTERY_WH" in os.environ else None
+BATTERY_USAGE_MIXES = {
+    "streaming": {"video": 0.6, "webpage": 0.3, "multiple_tabs": 0.1},
+    "browsing": {"webpage": 0.5, "multiple_tabs": 0.3, "video": 0.2},
+    "mixed": {"video": 0.4, "webpage": 0.3, "multiple_tabs": 0.3}
+}
+BATTERY_MC_DRAWS = 2000
+
+POWER_MODEL_FILE = Path(os.environ.get("BROWSER_POWER_MODEL", OUTPUT_DIR / "power_model.json"))
+POWER_MODEL_ALPHAS = [0.0, 0.01, 0.1, 1.0, 10.0, 100.0]
+POWER_FEATURE_COLUMNS = {
+    "cpu_util": "CPU Util (%)",
+    "avg_freq_mhz": "Avg Freq (MHz)",
+    "c0_residency": "C0 Residency (%)",
+    "wakeups_per_sec": "Wakeups/s"
+}
+
+# "start" overlays iterations on their start times; "xcorr" shifts each by
+# its cross-correlation lag (at most TRACE_MAX_SHIFT seconds).
+TRACE_ALIGNMENT = "xcorr"
+TRACE_MAX_SHIFT = 10
+
+# Seconds each sensor reports after the fact, e.g. a battery fuel gauge that
+# averages over its own window. Subtracted before streams are merged.
+SENSOR_LATENCIES = {"power": 0.0, "cpu": 0.0, "rapl": 0.0, "cgroup": 0.0}
+
+SCENARIO_COST_FILE = "scenario_costs.csv"
+SCENARIO_COST_HISTORY = 20
 
-TEST_TYPES = ["video", "animation", "js_computation", "webpage", "multiple_tabs"]
+# Every known scenario; default campaigns run TEST_TYPES, which leaves out
+# the opt-in ones.
+ALL_TEST_TYPES = list(SCENARIOS)
+TEST_TYPES = [name for name, scenario in SCENARIOS.items() if not scenario.opt_in]
 
 BROWSER_COLORS = {
     "firefox": "#FF6F61",
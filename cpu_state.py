@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+import os
+from pathlib import Path
+
+import numpy as np
+
+from config import CPU_SYSFS_ROOT, FREQ_HISTOGRAM_BIN_MHZ, ENABLE_CPU_STATE, SENSOR_LATENCIES
+from utils import log_message
+from sensor_merge import SensorStream
+import clock
+
+INTERRUPTS_FILE = "/proc/interrupts"
+PROC_STAT_FILE = "/proc/stat"
+
+def _open_all(paths):
+    fds = []
+    for path in paths:
+        try:
+            fds.append(os.open(path, os.O_RDONLY))
+        except OSError:
+            pass
+    return fds
+
+def close_all(fds):
+    for fd in fds:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+def _read_ints(fds):
+    return np.array([int(os.pread(fd, 32, 0)) for fd in fds], dtype=np.int64)
+
+def read_cpu_busy(fd):
+    # The aggregate "cpu" line of /proc/stat, in clock ticks: (busy, total).
+    fields = [int(v) for v in os.pread(fd, 4096, 0).split(b"\n", 1)[0].split()[1:]]
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+    return sum(fields) - idle, sum(fields)
+
+def read_interrupt_total(fd):
+    text = os.pread(fd, 1 << 20, 0).decode(errors="replace")
+    lines = text.splitlines()
+    num_cpus = len(lines[0].split()) if lines else 0
+    total = 0
+    for line in lines[1:]:
+        fields = line.split()
+        if not fields or fields[0] in ("ERR:", "MIS:"):
+            continue
+        for value in fields[1:1 + num_cpus]:
+            if not value.isdigit():
+                break
+            total += int(value)
+    return total
+
+def start_cpu_state_sampling(root=CPU_SYSFS_ROOT):
+    if not ENABLE_CPU_STATE:
+        return None
+
+    root = Path(root)
+    cpus = sorted(root.glob("cpu[0-9]*"), key=lambda p: int(p.name[3:]))
+
+    freq_fds = _open_all([cpu / "cpufreq/scaling_cur_freq" for cpu in cpus
+                          if (cpu / "cpufreq/scaling_cur_freq").exists()])
+
+    idle_names = []
+    idle_paths = []
+    idle_cpus = 0
+    for cpu in cpus:
+        states = sorted((cpu / "cpuidle").glob("state[0-9]*"), key=lambda p: int(p.name[5:]))
+        if states:
+            idle_cpus += 1
+        for state in states:
+            try:
+                idle_names.append((state / "name").read_text().strip())
+                idle_paths.append(state / "time")
+            except OSError:
+                continue
+    idle_fds = _open_all(idle_paths)
+    if len(idle_fds) != len(idle_paths):
+        close_all(idle_fds)
+        idle_fds, idle_names = [], []
+
+    interrupt_fd = _open_all([INTERRUPTS_FILE])
+    interrupt_fd = interrupt_fd[0] if interrupt_fd else None
+    stat_fd = _open_all([PROC_STAT_FILE])
+    stat_fd = stat_fd[0] if stat_fd else None
+
+    if not freq_fds and not idle_fds and interrupt_fd is None and stat_fd is None:
+        log_message("No CPU frequency, idle, interrupt or utilization data available")
+        return None
+
+    state = {
+        "freq_fds": freq_fds,
+        "idle_fds": idle_fds,
+        "idle_names": idle_names,
+        "idle_cpus": idle_cpus,
+        "interrupt_fd": interrupt_fd,
+        "stat_fd": stat_fd,
+        "freq_samples": [],
+        "wakeups": [],
+        "c0": [],
+        "util": [],
+        "times": [],
+        "start_time": clock.time(),
+        "idle_start": _read_ints(idle_fds) if idle_fds else None,
+        "previous_idle": _read_ints(idle_fds) if idle_fds else None,
+        "previous_busy": read_cpu_busy(stat_fd) if stat_fd is not None else None,
+        "previous_interrupts": read_interrupt_total(interrupt_fd) if interrupt_fd is not None else None,
+        "previous_time": clock.time()
+    }
+    return state
+
+def sample_cpu_state(state):
+    now = clock.time()
+    if state["freq_fds"]:
+        state["freq_samples"].append(_read_ints(state["freq_fds"]))
+
+    elapsed = now - state["previous_time"]
+    if state["interrupt_fd"] is not None:
+        total = read_interrupt_total(state["interrupt_fd"])
+        state["wakeups"].append((total - state["previous_interrupts"]) / elapsed if elapsed > 0 else 0.0)
+        state["previous_interrupts"] = total
+
+    # Per-interval C0 residency and utilization feed the software power model.
+    if state["idle_fds"]:
+        idle = _read_ints(state["idle_fds"])
+        capacity_us = state["idle_cpus"] * elapsed * 1000000.0
+        idle_share = (idle - state["previous_idle"]).sum() / capacity_us if capacity_us > 0 else np.nan
+        state["c0"].append(max(0.0, 100.0 * (1.0 - idle_share)))
+        state["previous_idle"] = idle
+
+    if state["stat_fd"] is not None:
+        busy, total = read_cpu_busy(state["stat_fd"])
+        previous_busy, previous_total = state["previous_busy"]
+        state["util"].append(100.0 * (busy - previous_busy) / (total - previous_total) if total > previous_total else np.nan)
+        state["previous_busy"] = (busy, total)
+    state["previous_time"] = now
+    state["times"].append(now)
+
+def interval_features(state):
+    # One value per sample_cpu_state call, for whichever counters exist.
+    features = {}
+    if state["util"]:
+        features["cpu_util"] = np.array(state["util"])
+    if state["freq_samples"]:
+        features["avg_freq_mhz"] = np.array([freqs.mean() for freqs in state["freq_samples"]]) / 1000.0
+    if state["c0"]:
+        features["c0_residency"] = np.array(state["c0"])
+    if state["wakeups"]:
+        features["wakeups_per_sec"] = np.array(state["wakeups"])
+    return features
+
+def cpu_state_stream(state):
+    features = interval_features(state)
+    if not state["times"] or not features:
+        return None
+    return SensorStream("cpu", state["times"], features, kind="interval",
+                        latency=SENSOR_LATENCIES.get("cpu", 0.0), start=state["start_time"])
+
+def finish_cpu_state_sampling(state, power_readings):
+    elapsed = clock.time() - state["start_time"]
+    summary = {}
+
+    if state["freq_samples"]:
+        freqs_mhz = np.concatenate(state["freq_samples"]) / 1000.0
+        bins = np.arange(0, freqs_mhz.max() + 2 * FREQ_HISTOGRAM_BIN_MHZ, FREQ_HISTOGRAM_BIN_MHZ)
+        counts, edges = np.histogram(freqs_mhz, bins=bins)
+        summary["avg_freq_mhz"] = float(freqs_mhz.mean())
+        summary["freq_histogram"] = {
+            f"{int(lo)}-{int(hi)}": float(100.0 * count / counts.sum())
+            for lo, hi, count in zip(edges[:-1], edges[1:], counts) if count
+        }
+
+    if state["idle_fds"]:
+        idle_delta = _read_ints(state["idle_fds"]) - state["idle_start"]
+        capacity_us = state["idle_cpus"] * elapsed * 1000000.0
+        residency = {}
+        for name, delta in zip(state["idle_names"], idle_delta.tolist()):
+            residency[name] = residency.get(name, 0.0) + 100.0 * delta / capacity_us
+        residency["C0 (active)"] = max(0.0, 100.0 - sum(residency.values()))
+        summary["cstate_residency"] = residency
+
+    if state["wakeups"]:
+        wakeups = np.array(state["wakeups"])
+        summary["wakeups_per_sec"] = float(wakeups.mean())
+        n = min(len(wakeups), len(power_readings))
+        if n > 2 and wakeups[:n].std() > 0 and np.std(power_readings[:n]) > 0:
+            summary["wakeup_power_corr"] = float(np.corrcoef(wakeups[:n], power_readings[:n])[0, 1])
+
+    summary["intervals"] = interval_features(state)
+
+    close_all(state["freq_fds"] + state["idle_fds"])
+    close_all([fd for fd in (state["interrupt_fd"], state["stat_fd"]) if fd is not None])
+
+    return summary
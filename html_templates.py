@@ -1,4 +1,23 @@
 #!/usr/bin/env python3
+import re
+import json
+import random
+
+# Added to every local test page: the page reports its cumulative work (frames
+# shown, iterations computed) to the test server once a second, so energy can
+# be set against what the browser actually got done.
+WORK_BEACON_JS = """
+    <script>
+        function reportWork(page, units) {
+            setInterval(function() {
+                navigator.sendBeacon('/work', JSON.stringify({page: page, units: units()}));
+            }, 1000);
+        }
+    </script>
+"""
+
+def with_work_beacon(html):
+    return html.replace("</head>", WORK_BEACON_JS + "</head>", 1)
 
 ANIMATION_HTML = """
 <!DOCTYPE html>
@@ -43,6 +62,14 @@ ANIMATION_HTML = """
                 box.style.animationDelay = (i * 0.1) + 's';
                 document.getElementById('container').appendChild(box);
             }
+            
+            let frames = 0;
+            function countFrame() {
+                frames++;
+                requestAnimationFrame(countFrame);
+            }
+            requestAnimationFrame(countFrame);
+            reportWork('animation', function() { return frames; });
         </script>
     </div>
 </body>
@@ -149,6 +176,7 @@ JS_COMPUTATION_HTML = """
         }
         
         runContinuousCalculations();
+        reportWork('js_computation', function() { return iterationCount; });
     </script>
 </body>
 </html>
@@ -190,6 +218,14 @@ def get_video_html():
                     video.currentTime = 0;
                     video.play();
                 });
+                
+                reportWork('video', function() {
+                    if (video.getVideoPlaybackQuality) {
+                        var quality = video.getVideoPlaybackQuality();
+                        return quality.totalVideoFrames - quality.droppedVideoFrames;
+                    }
+                    return video.webkitDecodedFrameCount || 0;
+                });
             }
         </script>
     </head>
@@ -199,4 +235,126 @@ def get_video_html():
         </video>
     </body>
     </html>
-    """
\ No newline at end of file
+    """
+
+
+# Added to every page of the page-load corpus as it is served: once the load
+# event has finished, the page reports its navigation start and load time
+# (browser epoch seconds) to the test server, stays for the dwell and moves on
+# to the next page in the same tab.
+NAVIGATION_BEACON_JS = """
+    <script>
+        (function() {{
+            var left = false;
+            function leave() {{
+                if (!left) {{
+                    left = true;
+                    location.href = {next_url};
+                }}
+            }}
+            function report(loaded) {{
+                var entry = performance.getEntriesByType('navigation')[0];
+                navigator.sendBeacon('/navigation', JSON.stringify({{
+                    page: {page},
+                    url: location.pathname,
+                    start: performance.timeOrigin / 1000,
+                    load: loaded && entry ? (performance.timeOrigin + entry.loadEventEnd) / 1000 : null
+                }}));
+            }}
+            window.addEventListener('load', function() {{
+                setTimeout(function() {{
+                    report(true);
+                    setTimeout(leave, {dwell_ms});
+                }}, 0);
+            }});
+            setTimeout(function() {{
+                if (!left && document.readyState !== 'complete') {{
+                    report(false);
+                    leave();
+                }}
+            }}, {timeout_ms});
+        }})();
+    </script>
+"""
+
+def with_navigation_beacon(html, page, next_url, dwell, load_timeout):
+    beacon = NAVIGATION_BEACON_JS.format(
+        page=json.dumps(page),
+        next_url=json.dumps(next_url),
+        dwell_ms=int(dwell * 1000),
+        timeout_ms=int(load_timeout * 1000)
+    )
+    # Archived pages are not always well formed; without a head the script
+    # goes first, which still runs before the load event.
+    match = re.search(r"</head\s*>", html, re.IGNORECASE)
+    if match:
+        return html[:match.start()] + beacon + html[match.start():]
+    return beacon + html
+
+CORPUS_START_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Page Load Corpus</title>
+    <script>location.replace({first_url});</script>
+</head>
+<body></body>
+</html>
+"""
+
+CORPUS_WORDS = (
+    "energy browser render layout paint network cache script style frame battery power page load "
+    "document element event thread worker image font table column parse compile execute idle"
+).split()
+
+def corpus_page_html(index, count):
+    # A generated stand-in for an archived page. Size and makeup (text,
+    # tables, vector graphics, script work) vary from page to page but are
+    # the same on every run.
+    rng = random.Random(index)
+    paragraphs = "\n".join(
+        f"    <p>{' '.join(rng.choice(CORPUS_WORDS) for _ in range(rng.randint(40, 160)))}.</p>"
+        for _ in range(rng.randint(3, 30))
+    )
+    rows = "\n".join(
+        "        <tr>" + "".join(f"<td>{rng.randint(0, 99999)}</td>" for _ in range(6)) + "</tr>"
+        for _ in range(rng.randint(0, 60))
+    )
+    shapes = "\n".join(
+        f'        <circle cx="{rng.randint(0, 800)}" cy="{rng.randint(0, 300)}" r="{rng.randint(5, 60)}" '
+        f'fill="hsl({rng.randint(0, 359)}, 60%, 60%)"/>'
+        for _ in range(rng.randint(0, 80))
+    )
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+    <title>Corpus page {index + 1} of {count}</title>
+    <style>
+        body {{ font-family: sans-serif; max-width: 60em; margin: 2em auto; line-height: 1.5; }}
+        td {{ border: 1px solid #ccc; padding: 0.2em 0.5em; }}
+        .card {{ box-shadow: 0 2px {rng.randint(2, 12)}px rgba(0, 0, 0, 0.3); padding: 1em; margin: 1em 0; }}
+    </style>
+</head>
+<body>
+    <h1>Corpus page {index + 1}</h1>
+    <div class="card">
+{paragraphs}
+    </div>
+    <svg width="800" height="300">
+{shapes}
+    </svg>
+    <table>
+{rows}
+    </table>
+    <ul id="list"></ul>
+    <script>
+        var list = document.getElementById('list');
+        for (var i = 0; i < {rng.randint(0, 400)}; i++) {{
+            var item = document.createElement('li');
+            item.textContent = 'Item ' + i + ': ' + Math.sqrt(i * {rng.randint(1, 1000)}).toFixed(3);
+            list.appendChild(item);
+        }}
+    </script>
+</body>
+</html>
+"""
@@ -1,40 +1,65 @@
 #!/usr/bin/env python3
 import sys
 import argparse
-from config import WATCH_DURATION, TEST_URL, NUM_TEST_ITERATIONS
-from run_tests import run_all_tests
+from config import (
+    WATCH_DURATION, TEST_URL, NUM_TEST_ITERATIONS, ALL_TEST_TYPES, PROFILE_MODE, PROFILE_MODES,
+    SYSTEM_STATE_POLICY, SYSTEM_STATE_POLICIES, BACKLIGHT_LEVEL
+)
+from campaign import Campaign, RunConfig
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Browser power efficiency test')
     parser.add_argument('--duration', type=int, default=WATCH_DURATION,
                       help=f'Duration of each test in seconds (default: {WATCH_DURATION})')
     parser.add_argument('--browsers', type=str, nargs='+',
-                      help='List of browsers to test (default: all available)')
+                      help='List of browsers to test, by command or name (default: all available)')
     parser.add_argument('--test-types', type=str, nargs='+', 
-                      choices=['video', 'animation', 'js_computation', 'webpage', 'multiple_tabs', 'all'],
-                      default=['all'], help='Types of tests to run')
+                      choices=ALL_TEST_TYPES + ['all'],
+                      default=['all'], help='Types of tests to run (default: all but page_corpus)')
     parser.add_argument('--url', type=str, default=TEST_URL,
                       help=f'URL to test (default: {TEST_URL})')
     parser.add_argument('--iterations', type=int, default=NUM_TEST_ITERATIONS,
                       help=f'Number of test iterations to run (default: {NUM_TEST_ITERATIONS})')
+    parser.add_argument('--tab-sweep', action='store_true',
+                      help='Also run the multi-tab scaling sweep for each browser')
+    parser.add_argument('--profile-mode', type=str, choices=PROFILE_MODES, default=PROFILE_MODE,
+                      help='Browser profile per job: the user\'s own (default), a fresh one (cold) '
+                           'or a copy of a pre-warmed one (warm)')
+    parser.add_argument('--startup-comparison', action='store_true',
+                      help='Also measure cold-start and warm-start energy for each browser')
+    parser.add_argument('--time-budget', type=int,
+                      help='Run only as many whole iterations as are expected to fit in this many seconds; '
+                           'if not even one fits, drop the most expensive scenarios. Jobs run one at a time on '
+                           'one power sensor, so their order cannot shorten the campaign')
+    parser.add_argument('--backlight', type=float, default=BACKLIGHT_LEVEL,
+                      help='Pin every display backlight to this percentage for the campaign '
+                           '(default: hold it where it is at the start)')
+    parser.add_argument('--state-policy', type=str, choices=SYSTEM_STATE_POLICIES, default=SYSTEM_STATE_POLICY,
+                      help='Jobs whose governor, EPP, AC or rfkill state differs from the campaign\'s start: '
+                           'flag them as anomalies (default), refuse to run them, or ignore the difference')
     
     return parser.parse_args()
 
+def build_run_config(args):
+    return RunConfig(
+        duration=args.duration,
+        url=args.url,
+        iterations=args.iterations,
+        browsers=args.browsers,
+        test_types=args.test_types,
+        tab_sweep=args.tab_sweep,
+        profile_mode=args.profile_mode,
+        startup_comparison=args.startup_comparison,
+        time_budget=args.time_budget,
+        state_policy=args.state_policy,
+        backlight=args.backlight
+    )
+
 if __name__ == "__main__":
     args = parse_arguments()
     
-    from config import WATCH_DURATION, TEST_URL, NUM_TEST_ITERATIONS, WATCH_DURATION, TEST_URL, NUM_TEST_ITERATIONS
-    
-    if args.duration:
-        WATCH_DURATION = args.duration
-    
-    if args.url:
-        TEST_URL = args.url
-    
-    if args.iterations:
-        NUM_TEST_ITERATIONS = args.iterations
-    
-    results = run_all_tests()
+    campaign = Campaign(build_run_config(args))
+    results = campaign.run()
     
     if results:
         print(f"\nTests completed successfully!")
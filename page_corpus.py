@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+import urllib.parse
+from pathlib import Path
+
+import numpy as np
+
+from config import CORPUS_DIR, CORPUS_MANIFEST, CORPUS_SYNTHETIC_PAGES, SAMPLE_INTERVAL
+import html_templates
+from utils import log_message
+
+def corpus_entries(corpus_dir):
+    # Pages to walk, relative to the corpus root, in order: the manifest's
+    # lines if there is one, else every HTML file under the root.
+    manifest = corpus_dir / CORPUS_MANIFEST
+    if manifest.exists():
+        lines = (line.strip() for line in manifest.read_text().splitlines())
+        return [line for line in lines if line and not line.startswith("#")]
+    return sorted(
+        path.relative_to(corpus_dir).as_posix()
+        for path in corpus_dir.rglob("*")
+        if path.suffix.lower() in (".html", ".htm") and path.is_file()
+    )
+
+def write_synthetic_corpus(directory, count=CORPUS_SYNTHETIC_PAGES):
+    directory.mkdir(parents=True, exist_ok=True)
+    entries = []
+    for index in range(count):
+        name = f"page{index:04d}.html"
+        (directory / name).write_text(html_templates.corpus_page_html(index, count))
+        entries.append(name)
+    return entries
+
+def prepare_corpus(serve_dir, corpus_dir=CORPUS_DIR):
+    # Puts the corpus under serve_dir/corpus and returns the URL path of each
+    # page, in walk order.
+    target = Path(serve_dir) / "corpus"
+    if corpus_dir and corpus_dir.is_dir():
+        entries = corpus_entries(corpus_dir)
+        target.symlink_to(corpus_dir.resolve(), target_is_directory=True)
+        log_message(f"Page corpus: {len(entries)} pages from {corpus_dir}")
+    else:
+        if corpus_dir:
+            log_message(f"Warning: Corpus directory not found: {corpus_dir}; using generated pages")
+        entries = write_synthetic_corpus(target)
+    return [f"/corpus/{urllib.parse.quote(entry)}" for entry in entries]
+
+def attribute_navigations(timestamps, power_readings, navigations, start_time, duration, interval=SAMPLE_INTERVAL):
+    # Slices the power trace by navigation. A page owns the trace from its
+    # navigation start to the next page's (its load plus the dwell), and its
+    # load from the start to the end of its load event. Navigation times are
+    # the browser's epoch seconds, trace timestamps seconds from start_time.
+    power = np.asarray(power_readings, dtype=np.float64)
+    times = np.asarray(timestamps, dtype=np.float64)[:len(power)]
+    power = power[:len(times)]
+    navigations = sorted(
+        (nav for nav in navigations if 0 <= nav["start"] - start_time < duration),
+        key=lambda nav: nav["start"]
+    )
+    if not navigations or not len(power):
+        return []
+
+    # Sample i holds from its timestamp to the next; cumulative energy is
+    # then piecewise linear and np.interp gives it at any instant.
+    edges = np.append(times, times[-1] + interval)
+    cumulative = np.concatenate(([0.0], np.cumsum(power * np.diff(edges))))
+
+    def energy(start, end):
+        return np.interp(end, edges, cumulative) - np.interp(start, edges, cumulative)
+
+    starts = np.array([nav["start"] for nav in navigations]) - start_time
+    loads = np.array([np.nan if nav.get("load") is None else nav["load"] for nav in navigations]) - start_time
+    trace_end = min(duration, edges[-1])
+    ends = np.append(starts[1:], trace_end)
+    visit = ends - starts
+    visit_energy = energy(starts, ends)
+    load_energy = energy(starts, np.minimum(loads, ends))
+
+    return [{
+        "sequence": i + 1,
+        "url": nav["url"],
+        "start": float(starts[i]),
+        "load_time_ms": float(1000 * (loads[i] - starts[i])) if not np.isnan(loads[i]) else None,
+        "visit": float(visit[i]),
+        "energy": float(visit_energy[i]),
+        "avg_power": float(visit_energy[i] / visit[i]) if visit[i] > 0 else None,
+        "load_energy": float(load_energy[i]) if not np.isnan(loads[i]) else None,
+        # The last page is cut off by the end of the measurement.
+        "complete": i + 1 < len(navigations)
+    } for i, nav in enumerate(navigations)]
+
+def summarize_navigations(pages, duration):
+    loaded = [page for page in pages if page["load_time_ms"] is not None]
+    complete = [page for page in pages if page["complete"]]
+    return {
+        "pages": len(loaded),
+        "failed": len(pages) - len(loaded),
+        "pages_per_hour": 3600 * len(loaded) / duration if duration else None,
+        "median_load_ms": float(np.median([page["load_time_ms"] for page in loaded])) if loaded else None,
+        "energy_per_page": float(np.mean([page["energy"] for page in complete])) if complete else None
+    }
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+import os
+import signal
+import subprocess
+import tempfile
+from pathlib import Path
+
+from config import SAMPLE_INTERVAL, PERF_EVENTS, PERF_REATTACH_INTERVAL, ENABLE_PERF_COUNTERS, CGROUP_ROOT
+from utils import log_message, get_process_tree
+from cgroups import resolve_job_cgroup
+import clock
+
+def has_perf():
+    try:
+        subprocess.run(["perf", "--version"], check=True, capture_output=True)
+        return True
+    except (OSError, subprocess.CalledProcessError):
+        return False
+
+def perf_can_count_cgroups():
+    # Counting a cgroup is system-wide (-a), which needs root or a relaxed
+    # perf_event_paranoid.
+    try:
+        return os.geteuid() == 0 or int(Path("/proc/sys/kernel/perf_event_paranoid").read_text()) <= 0
+    except (OSError, ValueError):
+        return False
+
+def launch_perf(target_args):
+    fd, name = tempfile.mkstemp(prefix="perf_stat_", suffix=".csv")
+    os.close(fd)
+    output_file = Path(name)
+    # perf runs for the whole job; an unread pipe could fill and stall it.
+    stderr_file = tempfile.TemporaryFile()
+    cmd = [
+        "perf", "stat", "-x", ",",
+        "-I", str(int(SAMPLE_INTERVAL * 1000)),
+        "-e", ",".join(PERF_EVENTS)
+    ] + target_args + ["-o", str(output_file)]
+
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=stderr_file)
+    except OSError:
+        stderr_file.close()
+        output_file.unlink(missing_ok=True)
+        raise
+
+    return {"process": process, "output_file": output_file, "stderr": stderr_file, "start_time": clock.time()}
+
+def start_perf_counters(root_pid, job_cgroup=None):
+    if not ENABLE_PERF_COUNTERS:
+        return None
+    if not has_perf():
+        log_message("perf not available, skipping hardware counters")
+        return None
+
+    # The job's cgroup holds every process the browser starts, including
+    # renderers and GPU processes that only appear once pages load. Without
+    # one, perf follows the process tree and is re-attached when it grows.
+    cgroup_path = resolve_job_cgroup(job_cgroup, root_pid) if job_cgroup else None
+    if cgroup_path and perf_can_count_cgroups():
+        name = cgroup_path.relative_to(CGROUP_ROOT).as_posix()
+        target_args = ["-a", "-G", ",".join([name] * len(PERF_EVENTS))]
+        pids = None
+    else:
+        pids = get_process_tree(root_pid)
+        target_args = ["-p", ",".join(str(pid) for pid in pids)]
+
+    try:
+        segment = launch_perf(target_args)
+    except OSError as e:
+        log_message(f"Could not start perf: {e}")
+        return None
+
+    log_message(f"Counting {', '.join(PERF_EVENTS)} for "
+                + (f"cgroup {cgroup_path.name}" if pids is None else f"{len(pids)} processes"))
+    return {"root_pid": root_pid, "pids": pids, "segments": [segment], "last_check": clock.time()}
+
+def sample_perf_counters(state):
+    # Process-tree mode only: perf -p counts the PIDs it was given, so a new
+    # child restarts it on the whole tree.
+    if state["pids"] is None or clock.time() - state["last_check"] < PERF_REATTACH_INTERVAL:
+        return
+    state["last_check"] = clock.time()
+
+    pids = get_process_tree(state["root_pid"])
+    if set(pids) <= set(state["pids"]):
+        return
+
+    finish_perf_segment(state["segments"][-1])
+    try:
+        state["segments"].append(launch_perf(["-p", ",".join(str(pid) for pid in pids)]))
+        state["pids"] = pids
+    except OSError as e:
+        log_message(f"Could not restart perf: {e}")
+        state["pids"] = None
+
+def finish_perf_segment(segment):
+    if "text" in segment:
+        return
+    process = segment["process"]
+    try:
+        if process.poll() is None:
+            process.send_signal(signal.SIGINT)
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+    try:
+        segment["text"] = segment["output_file"].read_text()
+    except OSError:
+        segment["text"] = ""
+    finally:
+        segment["output_file"].unlink(missing_ok=True)
+
+    segment["stderr"].seek(0)
+    segment["error"] = segment["stderr"].read().decode(errors="replace").strip()
+    segment["stderr"].close()
+
+def parse_perf_intervals(text):
+    intervals = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        fields = line.split(",")
+        if len(fields) < 4:
+            continue
+        try:
+            timestamp = float(fields[0])
+        except ValueError:
+            continue
+        event = fields[3].split(":")[0]
+        try:
+            value = float(fields[1])
+        except ValueError:
+            # "<not counted>" / "<not supported>"
+            value = None
+        intervals.setdefault(timestamp, {})[event] = value
+
+    timestamps = sorted(intervals)
+    return {
+        "timestamps": timestamps,
+        **{event: [intervals[t].get(event) for t in timestamps] for event in PERF_EVENTS}
+    }
+
+def stop_perf_counters(state, measurement_start):
+    counters = {"timestamps": [], **{event: [] for event in PERF_EVENTS}}
+    errors = []
+    for segment in state["segments"]:
+        finish_perf_segment(segment)
+        if segment["error"]:
+            errors.append(segment["error"])
+
+        # perf stamps intervals from its own start; shift them onto the power timeline.
+        offset = segment["start_time"] - measurement_start
+        parsed = parse_perf_intervals(segment["text"])
+        counters["timestamps"] += [t + offset for t in parsed["timestamps"]]
+        for event in PERF_EVENTS:
+            counters[event] += parsed[event]
+
+    if not counters["timestamps"]:
+        log_message(f"perf produced no counter data ({'; '.join(errors) or 'no output'})")
+        return None
+
+    if len(state["segments"]) > 1:
+        log_message(f"perf re-attached {len(state['segments']) - 1} times as the browser started processes")
+    counters["totals"] = {
+        event: sum(v for v in counters[event] if v is not None) for event in PERF_EVENTS
+    }
+    return counters
+
+def derive_perf_metrics(result):
+    counters = result.get("perf_counters")
+    if not counters:
+        return None
+
+    totals = counters["totals"]
+    cycles = totals.get("cycles") or 0
+    instructions = totals.get("instructions") or 0
+    duration = len(counters["timestamps"]) * SAMPLE_INTERVAL
+
+    return {
+        "cycles": cycles,
+        "instructions": instructions,
+        "cache_misses": totals.get("cache-misses"),
+        "context_switches": totals.get("context-switches"),
+        "ipc": instructions / cycles if cycles else None,
+        "context_switches_per_sec": totals.get("context-switches", 0) / duration if duration else None,
+        "nj_per_instruction": result["total_energy"] * 3600 * 1e9 / instructions if instructions else None
+    }
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+import os
+import sys
+import csv
+import signal
+import argparse
+import itertools
+import subprocess
+from pathlib import Path
+
+import numpy as np
+
+from config import (
+    OUTPUT_DIR, TIMESTAMP, ALL_TEST_TYPES, CPU_SYSFS_ROOT, SWEEP_GOVERNORS, SWEEP_EPP, SWEEP_FREQ_CAPS, SWEEP_SETTLE
+)
+from scenarios import get_scenario
+from streaming import find_summary_files
+from utils import setup_logging, log_message
+import clock
+
+# Written in this order: intel_pstate only accepts an EPP under the
+# powersave governor, so the governor has to be in place first.
+SETTING_FILES = ("scaling_governor", "energy_performance_preference", "scaling_max_freq")
+MANIFEST_FILE = "sweep_settings.csv"
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='Run a campaign under every CPU governor / EPP / frequency cap combination and '
+                    'report the energy-vs-throughput Pareto front per browser and scenario. '
+                    'Arguments not listed here are passed to main.py for each campaign.',
+        allow_abbrev=False)
+    parser.add_argument('--governors', nargs='+', default=SWEEP_GOVERNORS,
+                      help=f'Governors to sweep (default: {" ".join(SWEEP_GOVERNORS)})')
+    parser.add_argument('--epp', nargs='+', default=SWEEP_EPP,
+                      help=f'Energy performance preferences to sweep (default: {" ".join(SWEEP_EPP)})')
+    parser.add_argument('--freq-caps', type=int, nargs='+', default=SWEEP_FREQ_CAPS,
+                      help=f'Maximum frequency, percent of cpuinfo_max_freq (default: {" ".join(map(str, SWEEP_FREQ_CAPS))})')
+    parser.add_argument('--settle', type=int, default=SWEEP_SETTLE,
+                      help=f'Seconds to wait after changing settings (default: {SWEEP_SETTLE})')
+    parser.add_argument('--analyze', type=Path, metavar='SWEEP_DIR',
+                      help='Only analyze an earlier sweep directory')
+
+    return parser.parse_known_args()
+
+def _read(path):
+    try:
+        return Path(path).read_text().strip()
+    except OSError:
+        return None
+
+def cpufreq_dirs():
+    return sorted(CPU_SYSFS_ROOT.glob("cpu[0-9]*/cpufreq"))
+
+def read_cpu_settings():
+    return {cpu: {name: _read(cpu / name) for name in SETTING_FILES} for cpu in cpufreq_dirs()}
+
+def write_cpu_settings(settings):
+    for cpu, values in settings.items():
+        for name in SETTING_FILES:
+            if values.get(name) is not None:
+                (cpu / name).write_text(values[name])
+
+def settings_signature(settings):
+    # What the CPUs actually ended up with; two requested combinations that
+    # land on the same state (EPP under the performance governor) run once.
+    return tuple(sorted({tuple(values.get(name) for name in SETTING_FILES) for values in settings.values()}))
+
+def sweep_matrix(governors, epps, freq_caps, cpus):
+    # Only values the first CPU offers; an EPP list is meaningless without EPP support.
+    offered_governors = (_read(cpus[0] / "scaling_available_governors") or "").split()
+    offered_epps = (_read(cpus[0] / "energy_performance_available_preferences") or "").split()
+
+    for governor in governors:
+        if governor not in offered_governors:
+            log_message(f"Governor not offered by this CPU, skipping: {governor}")
+    for epp in epps:
+        if offered_epps and epp not in offered_epps:
+            log_message(f"EPP not offered by this CPU, skipping: {epp}")
+
+    governors = [governor for governor in governors if governor in offered_governors]
+    epps = [epp for epp in epps if epp in offered_epps] or [None]
+    return [
+        {"governor": governor, "epp": epp, "freq_cap": cap}
+        for governor, epp, cap in itertools.product(governors, epps, freq_caps)
+    ]
+
+def setting_label(setting):
+    return f"{setting['governor']}-{setting['epp'] or 'default'}-{setting['freq_cap']}"
+
+def apply_setting(setting, cpus):
+    requested = {}
+    for cpu in cpus:
+        values = {"scaling_governor": setting["governor"]}
+        if setting["epp"]:
+            values["energy_performance_preference"] = setting["epp"]
+        max_freq = _read(cpu / "cpuinfo_max_freq")
+        if max_freq and max_freq.isdigit():
+            values["scaling_max_freq"] = str(int(max_freq) * setting["freq_cap"] // 100)
+        requested[cpu] = values
+    write_cpu_settings(requested)
+    return read_cpu_settings()
+
+def run_campaign(output_dir, campaign_args):
+    env = dict(os.environ, BROWSER_POWER_OUTPUT_DIR=str(output_dir))
+    main_script = Path(__file__).resolve().parent / "main.py"
+    return subprocess.run([sys.executable, str(main_script)] + campaign_args, env=env).returncode
+
+def append_manifest(sweep_dir, entry):
+    # One row per finished campaign, so a sweep cut short can still be analyzed.
+    path = sweep_dir / MANIFEST_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    new_file = not path.exists()
+
+    with open(path, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(["Directory", "Governor", "EPP", "Max Freq (%)", "Exit Code"])
+        writer.writerow([entry["label"], entry["governor"], entry["epp"] or "", entry["freq_cap"],
+                         entry["returncode"]])
+
+def run_sweep(settings, sweep_dir, campaign_args, settle=SWEEP_SETTLE):
+    cpus = cpufreq_dirs()
+    original = read_cpu_settings()
+    seen = set()
+    manifest = []
+
+    # SIGTERM too must pass through the finally below.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+    try:
+        for setting in settings:
+            label = setting_label(setting)
+            try:
+                applied = apply_setting(setting, cpus)
+            except OSError as e:
+                log_message(f"Cannot apply {label}: {e}")
+                continue
+
+            signature = settings_signature(applied)
+            if signature in seen:
+                log_message(f"{label} leaves the CPUs as an earlier combination did; skipping")
+                continue
+            seen.add(signature)
+
+            log_message(f"\n{'='*20} Platform setting {label} {'='*20}")
+            clock.sleep(settle)
+            returncode = run_campaign(sweep_dir / label, campaign_args)
+            manifest.append({**setting, "label": label, "returncode": returncode})
+            append_manifest(sweep_dir, manifest[-1])
+            if returncode:
+                log_message(f"Campaign under {label} failed (exit code {returncode})")
+    finally:
+        try:
+            write_cpu_settings(original)
+            log_message("Restored the original CPU governor, EPP and frequency limits")
+        except OSError as e:
+            log_message(f"Could not restore CPU settings: {e}")
+    return manifest
+
+def load_manifest(sweep_dir):
+    with open(sweep_dir / MANIFEST_FILE, newline='') as f:
+        return [{
+            "label": row["Directory"],
+            "governor": row["Governor"],
+            "epp": row["EPP"] or None,
+            "freq_cap": int(row["Max Freq (%)"])
+        } for row in csv.DictReader(f)]
+
+def load_setting_results(results_dir, test_types=ALL_TEST_TYPES):
+    # {(browser, test_type): {"power": [...], "energy": [...], "rate": [...]}}
+    # from the per-iteration summaries of the campaign in results_dir.
+    runs = {}
+    for test_type in test_types:
+        for file in find_summary_files(test_type, results_dir):
+            with open(file, newline='') as f:
+                for row in csv.DictReader(f):
+                    entry = runs.setdefault((row["Browser"], test_type), {"power": [], "energy": [], "rate": []})
+                    entry["power"].append(float(row["Avg Power (W)"]))
+                    entry["energy"].append(float(row["Total Energy (Wh)"]))
+                    entry["rate"].append(float(row["Work Rate (/s)"]) if row.get("Work Rate (/s)") else np.nan)
+    return runs
+
+def pareto_front(cost, benefit):
+    # Points no other point beats on both cost (lower) and benefit (higher):
+    # sorted by cost, a point is on the front if it does more work than
+    # everything cheaper. Missing costs are never on the front.
+    benefit = np.where(np.isnan(benefit), -np.inf, benefit)
+    order = np.lexsort((-benefit, cost))
+    order = order[~np.isnan(cost[order])]
+    best_before = np.maximum.accumulate(np.concatenate([[-np.inf], benefit[order]]))[:-1]
+    front = np.zeros(len(cost), dtype=bool)
+    front[order] = benefit[order] > best_before
+    if len(order):
+        front[order[0]] = True
+    return front
+
+def analyze_sweep(sweep_dir, settings):
+    results = [load_setting_results(sweep_dir / setting["label"]) for setting in settings]
+    pairs = sorted({pair for runs in results for pair in runs},
+                   key=lambda pair: (pair[0], ALL_TEST_TYPES.index(pair[1])))
+    if not pairs:
+        return None
+
+    def mean_of(key):
+        # (settings, pairs), NaN where a setting has no runs for the pair.
+        return np.array([[np.nanmean(runs[pair][key]) if pair in runs and not np.isnan(runs[pair][key]).all()
+                          else np.nan for pair in pairs] for runs in results])
+
+    power, energy, rate = mean_of("power"), mean_of("energy"), mean_of("rate")
+    counts = np.array([[len(runs.get(pair, {}).get("power", [])) for pair in pairs] for runs in results])
+    front = np.column_stack([pareto_front(power[:, k], rate[:, k]) for k in range(len(pairs))])
+
+    # Joules per unit of work where the page counts work, otherwise watts;
+    # each relative to the cheapest setting for that browser and scenario.
+    per_unit = np.where(rate > 0, power / np.where(rate > 0, rate, 1), np.nan)
+    cost = np.where(np.isnan(per_unit), power, per_unit)
+    with np.errstate(invalid='ignore'):
+        relative = cost / np.nanmin(cost, axis=0)
+
+    browsers = sorted({browser for browser, _ in pairs})
+    scores = np.full((len(settings), len(browsers)), np.nan)
+    for b, browser in enumerate(browsers):
+        columns = [k for k, pair in enumerate(pairs) if pair[0] == browser]
+        logs = np.log(relative[:, columns])
+        complete = ~np.isnan(logs).any(axis=1)
+        # Geometric mean over the browser's scenarios, for settings that ran all of them.
+        scores[complete, b] = np.exp(logs[complete].mean(axis=1))
+
+    return {
+        "pairs": pairs,
+        "power": power,
+        "energy": energy,
+        "rate": rate,
+        "per_unit": per_unit,
+        "counts": counts,
+        "front": front,
+        "browsers": browsers,
+        "scores": scores
+    }
+
+def save_sweep_results(sweep_dir, settings, analysis):
+    results_file = sweep_dir / f"platform_sweep_{TIMESTAMP}.csv"
+    with open(results_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Browser", "Test Type", "Governor", "EPP", "Max Freq (%)", "Runs", "Avg Power (W)",
+                         "Energy (Wh)", "Work Rate (/s)", "Energy per Unit (J)", "Work Unit", "Pareto"])
+        for k, (browser, test_type) in enumerate(analysis["pairs"]):
+            unit = get_scenario(test_type).work_unit or ""
+            for s, setting in enumerate(settings):
+                if not analysis["counts"][s, k]:
+                    continue
+                rate, per_unit = analysis["rate"][s, k], analysis["per_unit"][s, k]
+                writer.writerow([
+                    browser, test_type, setting["governor"], setting["epp"] or "", setting["freq_cap"],
+                    analysis["counts"][s, k],
+                    f"{analysis['power'][s, k]:.2f}",
+                    f"{analysis['energy'][s, k]:.4f}",
+                    f"{rate:.3f}" if not np.isnan(rate) else "",
+                    f"{per_unit:.4f}" if not np.isnan(per_unit) else "",
+                    unit,
+                    "yes" if analysis["front"][s, k] else "no"
+                ])
+
+    best_file = sweep_dir / f"platform_sweep_best_{TIMESTAMP}.csv"
+    with open(best_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Browser", "Governor", "EPP", "Max Freq (%)", "Relative Cost", "Median Relative Cost"])
+        for b, browser in enumerate(analysis["browsers"]):
+            scores = analysis["scores"][:, b]
+            if np.isnan(scores).all():
+                continue
+            best = settings[int(np.nanargmin(scores))]
+            writer.writerow([browser, best["governor"], best["epp"] or "", best["freq_cap"],
+                             f"{np.nanmin(scores):.3f}", f"{np.nanmedian(scores):.3f}"])
+
+    return results_file, best_file
+
+def main():
+    args, campaign_args = parse_arguments()
+    setup_logging()
+
+    if args.analyze:
+        sweep_dir = args.analyze
+        settings = load_manifest(sweep_dir)
+    else:
+        cpus = cpufreq_dirs()
+        if not cpus:
+            print(f"No cpufreq interface under {CPU_SYSFS_ROOT}; nothing to sweep.")
+            sys.exit(1)
+        if not all(os.access(cpu / "scaling_governor", os.W_OK) for cpu in cpus):
+            print("Changing CPU governors needs write access to cpufreq in sysfs (run as root).")
+            sys.exit(1)
+
+        settings = sweep_matrix(args.governors, args.epp, args.freq_caps, cpus)
+        if not settings:
+            print("None of the requested governors is offered by this CPU.")
+            sys.exit(1)
+
+        sweep_dir = OUTPUT_DIR / f"platform_sweep_{TIMESTAMP}"
+        sweep_dir.mkdir(parents=True, exist_ok=True)
+        log_message(f"Sweeping {len(settings)} platform settings into {sweep_dir}")
+        settings = run_sweep(settings, sweep_dir, campaign_args, args.settle)
+
+    analysis = analyze_sweep(sweep_dir, settings)
+    if not analysis:
+        print(f"No campaign results under {sweep_dir}")
+        sys.exit(1)
+
+    results_file, best_file = save_sweep_results(sweep_dir, settings, analysis)
+    print(f"Saved per-setting results with the Pareto front to {results_file}")
+    print(f"Saved the most efficient setting per browser to {best_file}")
+
+    for b, browser in enumerate(analysis["browsers"]):
+        scores = analysis["scores"][:, b]
+        if np.isnan(scores).all():
+            continue
+        best = settings[int(np.nanargmin(scores))]
+        print(f"- {browser}: {setting_label(best)} "
+              f"(the median setting costs {100 * (np.nanmedian(scores) / np.nanmin(scores) - 1):.1f}% more)")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 import subprocess
 from pathlib import Path
+from config import POWER_NOW_FILE
 from utils import log_message
 
 def check_battery_available():
-    if Path("/sys/class/power_supply/BAT1/power_now").exists():
+    if POWER_NOW_FILE and Path(POWER_NOW_FILE).exists():
+        return POWER_NOW_FILE
+    elif Path("/sys/class/power_supply/BAT1/power_now").exists():
         return "/sys/class/power_supply/BAT1/power_now"
     elif Path("/sys/class/power_supply/BAT0/power_now").exists():
         return "/sys/class/power_supply/BAT0/power_now"
@@ -24,4 +27,59 @@ def read_power_file(power_file):
             return power_now / 1000000.0
     except Exception as e:
         log_message(f"Error reading power: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def read_battery_energy(power_file):
+    # The battery's remaining-energy counter: {"energy": Wh}, or for batteries
+    # that only count charge, {"charge": Ah, "voltage": V}.
+    battery_dir = Path(power_file).parent
+    
+    try:
+        energy_file = battery_dir / "energy_now"
+        if energy_file.exists():
+            return {"energy": int(energy_file.read_text().strip()) / 1000000.0}
+        
+        charge_file = battery_dir / "charge_now"
+        voltage_file = battery_dir / "voltage_now"
+        if charge_file.exists() and voltage_file.exists():
+            return {
+                "charge": int(charge_file.read_text().strip()) / 1000000.0,
+                "voltage": int(voltage_file.read_text().strip()) / 1000000.0
+            }
+    except Exception as e:
+        log_message(f"Error reading battery energy counter: {e}")
+    
+    return None
+
+def battery_energy_used(start, end):
+    # Wh drawn between two read_battery_energy readings. Charge counters are
+    # converted at the mean voltage: charge x voltage at each end would add
+    # the charge times the (load-dependent) voltage change.
+    if start is None or end is None:
+        return None
+    if "energy" in start and "energy" in end:
+        return start["energy"] - end["energy"]
+    if "charge" in start and "charge" in end:
+        return (start["charge"] - end["charge"]) * (start["voltage"] + end["voltage"]) / 2
+    return None
+
+def read_battery_capacity(power_file):
+    # Full-charge capacity in Wh as the battery reports it now (energy_full
+    # follows wear; energy_full_design does not).
+    battery_dir = Path(power_file).parent
+    
+    try:
+        energy_file = battery_dir / "energy_full"
+        if energy_file.exists():
+            return int(energy_file.read_text().strip()) / 1000000.0
+        
+        charge_file = battery_dir / "charge_full"
+        voltage_file = battery_dir / "voltage_min_design"
+        if charge_file.exists() and voltage_file.exists():
+            charge_ah = int(charge_file.read_text().strip()) / 1000000.0
+            voltage_v = int(voltage_file.read_text().strip()) / 1000000.0
+            return charge_ah * voltage_v
+    except Exception as e:
+        log_message(f"Error reading battery capacity: {e}")
+    
+    return None
\ No newline at end of file
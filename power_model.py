@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+import re
+import sys
+import csv
+import json
+import argparse
+import functools
+from pathlib import Path
+
+import numpy as np
+
+from config import RESULTS_DIR, POWER_MODEL_FILE, POWER_MODEL_ALPHAS, POWER_FEATURE_COLUMNS
+
+FEATURES_PATTERN = re.compile(r'^(.+)_power_features(?:_iter(\d+))?_(\d{8}_\d{6})\.csv$')
+
+# Dynamic CPU power goes roughly with utilization x frequency x voltage^2, and
+# voltage rises with frequency, so the products carry most of the signal.
+INTERACTIONS = [
+    ("cpu_util", "avg_freq_mhz"),
+    ("cpu_util", "avg_freq_mhz", "avg_freq_mhz"),
+    ("c0_residency", "avg_freq_mhz")
+]
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Train a software power model on recorded power and CPU counters')
+    parser.add_argument('--results-dir', type=Path, nargs='+', default=[RESULTS_DIR],
+                      help='Directories holding *_power_features_*.csv files (searched recursively)')
+    parser.add_argument('--output', type=Path, default=POWER_MODEL_FILE,
+                      help=f'Where the model is written (default: {POWER_MODEL_FILE})')
+    parser.add_argument('--folds', type=int, default=5,
+                      help='Cross-validation folds, split by run (default: 5)')
+
+    return parser.parse_args()
+
+def load_training_data(results_dirs):
+    # Rows are kept per run (file + browser) so cross-validation can hold out
+    # whole runs; neighbouring samples of one run are far from independent.
+    columns = {name: [] for name in POWER_FEATURE_COLUMNS}
+    power = []
+    runs = []
+    run_ids = {}
+
+    for results_dir in results_dirs:
+        for features_file in sorted(Path(results_dir).rglob("*_power_features_*.csv")):
+            if not FEATURES_PATTERN.match(features_file.name):
+                continue
+            with open(features_file, newline='') as f:
+                for row in csv.DictReader(f):
+                    run = run_ids.setdefault((str(features_file), row["Browser"]), len(run_ids))
+                    runs.append(run)
+                    power.append(float(row["Power (W)"]))
+                    for name, header in POWER_FEATURE_COLUMNS.items():
+                        value = row.get(header, "")
+                        columns[name].append(float(value) if value not in ("", None) else np.nan)
+
+    features = {name: np.array(values) for name, values in columns.items()}
+    return features, np.array(power), np.array(runs, dtype=np.int64)
+
+def model_terms(features):
+    base = [name for name in POWER_FEATURE_COLUMNS if name in features and np.isfinite(features[name]).any()]
+    return base + ["*".join(term) for term in INTERACTIONS if all(name in base for name in term)]
+
+def design_matrix(features, terms):
+    columns = []
+    for term in terms:
+        column = np.ones(len(next(iter(features.values()))))
+        for name in term.split("*"):
+            column = column * features[name]
+        columns.append(column)
+    return np.column_stack(columns)
+
+def ridge_path(X, y, alphas):
+    # One eigendecomposition of the standardized Gram matrix gives the ridge
+    # solution for every alpha: w = V diag(1 / (s + alpha)) V^T Z^T y.
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    Z = (X - mean) / scale
+    intercept = y.mean()
+
+    s, V = np.linalg.eigh(Z.T @ Z)
+    projected = V.T @ (Z.T @ (y - intercept))
+    alphas = np.asarray(alphas, dtype=np.float64)
+    # Floor the denominator so alpha=0 on a rank-deficient design stays finite.
+    weights = V @ (projected[:, None] / np.maximum(s[:, None] + alphas[None, :], 1e-9))
+    return mean, scale, intercept, weights
+
+def cross_validate(X, y, runs, alphas, folds):
+    unique_runs = np.unique(runs)
+    folds = max(2, min(folds, len(unique_runs)))
+    fold_of_run = np.random.default_rng(0).permutation(len(unique_runs)) % folds
+    fold = fold_of_run[np.searchsorted(unique_runs, runs)]
+
+    predictions = np.empty((len(y), len(alphas)))
+    for k in range(folds):
+        held_out = fold == k
+        mean, scale, intercept, weights = ridge_path(X[~held_out], y[~held_out], alphas)
+        predictions[held_out] = intercept + ((X[held_out] - mean) / scale) @ weights
+
+    residuals = predictions - y[:, None]
+    interval_rmse = np.sqrt((residuals ** 2).mean(axis=0))
+
+    # Error of each held-out run's mean power: what an energy figure inherits.
+    counts = np.bincount(runs)
+    run_bias = np.array([np.bincount(runs, weights=residuals[:, a])[counts > 0] / counts[counts > 0]
+                         for a in range(len(alphas))])
+    run_rmse = np.sqrt((run_bias ** 2).mean(axis=1))
+    return interval_rmse, run_rmse
+
+def train_power_model(features, power, runs, alphas=POWER_MODEL_ALPHAS, folds=5):
+    terms = model_terms(features)
+    if not terms:
+        raise ValueError("No counter features in the training data")
+
+    X = design_matrix(features, terms)
+    keep = np.isfinite(X).all(axis=1) & np.isfinite(power)
+    X, y, runs = X[keep], power[keep], runs[keep]
+    if len(np.unique(runs)) < 2:
+        raise ValueError("Need at least two recorded runs to train and validate a power model")
+
+    interval_rmse, run_rmse = cross_validate(X, y, runs, alphas, folds)
+    best = int(np.argmin(interval_rmse))
+
+    mean, scale, intercept, weights = ridge_path(X, y, [alphas[best]])
+    fitted = intercept + ((X - mean) / scale) @ weights[:, 0]
+    total = ((y - y.mean()) ** 2).sum()
+
+    return {
+        "terms": terms,
+        "mean": mean.tolist(),
+        "scale": scale.tolist(),
+        "intercept": float(intercept),
+        "coef": weights[:, 0].tolist(),
+        "alpha": float(alphas[best]),
+        "interval_rmse": float(interval_rmse[best]),
+        "run_rmse": float(run_rmse[best]),
+        "r2": float(1 - ((y - fitted) ** 2).sum() / total) if total > 0 else 0.0,
+        "samples": int(len(y)),
+        "runs": int(len(np.unique(runs)))
+    }
+
+def save_power_model(model, path=POWER_MODEL_FILE):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(model, indent=2))
+    return path
+
+@functools.lru_cache(maxsize=None)
+def load_power_model(path=POWER_MODEL_FILE):
+    try:
+        return json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return None
+
+def estimate_power(model, features):
+    # Per-interval watts from counters alone, and the 95% half-width of one
+    # interval's estimate; a run's mean power is good to 1.96 * run_rmse.
+    missing = [name for term in model["terms"] for name in term.split("*") if name not in features]
+    if missing:
+        raise ValueError(f"Counters missing for the power model: {', '.join(sorted(set(missing)))}")
+
+    X = design_matrix(features, model["terms"])
+    X = np.where(np.isfinite(X), X, np.array(model["mean"]))
+    power = model["intercept"] + ((X - np.array(model["mean"])) / np.array(model["scale"])) @ np.array(model["coef"])
+    return np.clip(power, 0.0, None), 1.96 * model["interval_rmse"]
+
+def main():
+    args = parse_arguments()
+
+    features, power, runs = load_training_data(args.results_dir)
+    if not len(power):
+        print("No *_power_features_*.csv files found; record a campaign with a power sensor and CPU counters first.")
+        sys.exit(1)
+
+    try:
+        model = train_power_model(features, power, runs, folds=args.folds)
+    except ValueError as e:
+        print(f"Cannot train a power model: {e}")
+        sys.exit(1)
+
+    output = save_power_model(model, args.output)
+    print(f"Trained on {model['samples']} samples from {model['runs']} runs (ridge alpha {model['alpha']:g})")
+    print(f"Terms: {', '.join(model['terms'])}")
+    print(f"Cross-validated error: {model['interval_rmse']:.2f}W per interval, "
+          f"{model['run_rmse']:.2f}W on a run's mean power (R^2 {model['r2']:.3f})")
+    print(f"Model written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+from config import PROFILE_ROOT, TIMESTAMP
+from utils import log_message
+from scenarios import browser_family
+
+def campaign_profile_root():
+    return PROFILE_ROOT / TIMESTAMP
+
+def profile_args(browser_cmd, profile_dir, new_instance=True):
+    # new_instance=False is for later calls that should reach the instance
+    # already running on this profile (opening extra tabs).
+    if browser_family(browser_cmd) == "firefox":
+        return ["--profile", str(profile_dir)] + (["--new-instance"] if new_instance else [])
+    args = [f"--user-data-dir={profile_dir}"]
+    if new_instance:
+        args += ["--no-first-run", "--no-default-browser-check"]
+    return args
+
+def copy_profile(template, target):
+    # Reflink where the filesystem supports it (btrfs, XFS, APFS), so a large
+    # warmed profile costs almost nothing to clone; a plain copy otherwise.
+    # Hardlinks are not an option: browsers rewrite their SQLite/LevelDB
+    # files in place, which would leak one job's state into the snapshot.
+    try:
+        subprocess.run(["cp", "-a", "--reflink=auto", str(template), str(target)],
+                       check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        shutil.rmtree(target, ignore_errors=True)
+        shutil.copytree(template, target, symlinks=True)
+
+def create_profile(browser_cmd, template=None):
+    root = campaign_profile_root()
+    root.mkdir(parents=True, exist_ok=True)
+    job_dir = Path(tempfile.mkdtemp(prefix=f"{browser_cmd}-", dir=root))
+    profile_dir = job_dir / "profile"
+
+    if template:
+        copy_profile(template, profile_dir)
+    else:
+        profile_dir.mkdir()
+    return profile_dir
+
+def discard_profile(profile_dir):
+    shutil.rmtree(Path(profile_dir).parent, ignore_errors=True)
+
+def cleanup_profiles():
+    root = campaign_profile_root()
+    if root.exists():
+        log_message(f"Removing managed profiles in {root}")
+        shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import os
+from pathlib import Path
+
+import numpy as np
+
+from config import RAPL_ROOT, ENABLE_RAPL, SENSOR_LATENCIES
+from utils import log_message
+from sensor_merge import SensorStream
+import clock
+
+def discover_rapl_domains(root=RAPL_ROOT):
+    domains = []
+    for zone in sorted(Path(root).glob("intel-rapl:*")):
+        energy_file = zone / "energy_uj"
+        if not energy_file.exists():
+            continue
+
+        try:
+            name = (zone / "name").read_text().strip()
+            max_range = int((zone / "max_energy_range_uj").read_text().strip())
+        except (OSError, ValueError):
+            continue
+
+        # Sub-zones (intel-rapl:0:0) are named "core", "uncore", "dram"...;
+        # qualify them with their parent package so multi-socket boxes stay unique.
+        parts = zone.name.split(":")
+        if len(parts) > 2:
+            parent = Path(root) / ":".join(parts[:2])
+            try:
+                name = f"{(parent / 'name').read_text().strip()}/{name}"
+            except OSError:
+                pass
+
+        domains.append({
+            "name": name,
+            "energy_file": energy_file,
+            "max_range": max_range
+        })
+
+    return domains
+
+def open_rapl_domains(root=RAPL_ROOT):
+    domains = []
+    for domain in discover_rapl_domains(root):
+        try:
+            domain["fd"] = os.open(domain["energy_file"], os.O_RDONLY)
+            domains.append(domain)
+        except OSError as e:
+            log_message(f"Cannot read RAPL domain {domain['name']}: {e}")
+    return domains
+
+def close_rapl_domains(domains):
+    for domain in domains:
+        try:
+            os.close(domain["fd"])
+        except OSError:
+            pass
+
+def read_rapl_counters(domains):
+    # One pread per already-open descriptor: no open/close or path lookup per tick.
+    return np.array([int(os.pread(d["fd"], 32, 0)) for d in domains], dtype=np.int64)
+
+def rapl_energy_delta(previous, current, max_ranges):
+    # energy_uj counts 0..max_energy_range_uj inclusive before wrapping.
+    delta = current - previous
+    return np.where(delta < 0, delta + max_ranges + 1, delta)
+
+def start_rapl_sampling(root=RAPL_ROOT):
+    if not ENABLE_RAPL:
+        return None
+
+    domains = open_rapl_domains(root)
+    if not domains:
+        return None
+
+    return {
+        "domains": domains,
+        "names": [d["name"] for d in domains],
+        "max_ranges": np.array([d["max_range"] for d in domains], dtype=np.int64),
+        "previous": read_rapl_counters(domains),
+        "energy_uj": np.zeros(len(domains), dtype=np.int64),
+        "start_time": clock.time(),
+        "times": [],
+        "interval_uj": []
+    }
+
+def sample_rapl(state):
+    current = read_rapl_counters(state["domains"])
+    delta = rapl_energy_delta(state["previous"], current, state["max_ranges"])
+    state["energy_uj"] += delta
+    state["previous"] = current
+    state["times"].append(clock.time())
+    state["interval_uj"].append(delta)
+
+def rapl_stream(state):
+    # Per-domain watts over each sampling interval.
+    times = np.array(state["times"])
+    if not len(times):
+        return None
+    elapsed = np.diff(np.concatenate([[state["start_time"]], times]))
+    watts = np.array(state["interval_uj"], dtype=np.float64) / 1e6 / np.maximum(elapsed, 1e-6)[:, None]
+    columns = {name: watts[:, k] for k, name in enumerate(state["names"])}
+    return SensorStream("rapl", times, columns, kind="interval",
+                        latency=SENSOR_LATENCIES.get("rapl", 0.0), start=state["start_time"])
+
+def finish_rapl_sampling(state):
+    sample_rapl(state)
+    close_rapl_domains(state["domains"])
+    return {name: energy / 3600000000.0 for name, energy in zip(state["names"], state["energy_uj"].tolist())}
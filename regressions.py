@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+import os
+import sys
+import csv
+import re
+import math
+import argparse
+from pathlib import Path
+
+from config import (
+    RESULTS_DIR, ANALYSIS_OUTPUT_DIR, ALL_TEST_TYPES, REGRESSION_INDEX_FILE,
+    REGRESSION_MIN_CHANGE, REGRESSION_MIN_EFFECT_SIZE
+)
+
+# One-sided Student t critical values at alpha = 0.05.
+T_DF = list(range(1, 31)) + [40, 60, 120, 1000]
+T_CRIT = [6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812,
+          1.796, 1.782, 1.771, 1.761, 1.753, 1.746, 1.740, 1.734, 1.729, 1.725,
+          1.721, 1.717, 1.714, 1.711, 1.708, 1.706, 1.703, 1.701, 1.699, 1.697,
+          1.684, 1.671, 1.658, 1.645]
+
+SUMMARY_PATTERN = re.compile(r'^(.+)_power_summary_iter(\d+)_(\d{8}_\d{6})\.csv$')
+AGGREGATE_PATTERN = re.compile(r'^(.+)_aggregate_results_(\d{8}_\d{6})\.csv$')
+INFO_PATTERN = re.compile(r'^campaign_info_(\d{8}_\d{6})\.csv$')
+
+INDEX_FIELDS = [
+    "Campaign", "Directory", "Files", "Test Type", "Browser", "Browser Version",
+    "Kernel", "CPU Model", "Power Sensor", "Runs",
+    "Avg Power Mean (W)", "Avg Power StdDev (W)", "Total Energy Mean (Wh)", "Total Energy StdDev (Wh)"
+]
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Flag energy regressions across browser versions')
+    parser.add_argument('--history-dir', type=Path, default=RESULTS_DIR,
+                      help=f'Directory (searched recursively) holding past campaigns (default: {RESULTS_DIR})')
+    parser.add_argument('--output', type=Path, default=ANALYSIS_OUTPUT_DIR / "energy_regressions.csv",
+                      help='CSV with every version-to-version comparison')
+    parser.add_argument('--min-change', type=float, default=REGRESSION_MIN_CHANGE,
+                      help=f'Smallest relative power increase to flag (default: {REGRESSION_MIN_CHANGE})')
+    parser.add_argument('--min-effect-size', type=float, default=REGRESSION_MIN_EFFECT_SIZE,
+                      help=f'Smallest Hedges g to flag (default: {REGRESSION_MIN_EFFECT_SIZE})')
+    parser.add_argument('--rebuild-index', action='store_true',
+                      help='Re-read every campaign instead of only new or changed ones')
+
+    return parser.parse_args()
+
+def scan_campaigns(history_dir):
+    # Only directory listings here; files are opened for campaigns the index
+    # doesn't already cover.
+    campaigns = {}
+    for directory, _, filenames in os.walk(history_dir):
+        for filename in filenames:
+            for pattern, kind in ((SUMMARY_PATTERN, "summary"), (AGGREGATE_PATTERN, "aggregate"), (INFO_PATTERN, "info")):
+                match = pattern.match(filename)
+                if match:
+                    break
+            else:
+                continue
+
+            key = (os.path.relpath(directory, history_dir), match.groups()[-1])
+            campaign = campaigns.setdefault(
+                key, {"summaries": [], "test_types": set(ALL_TEST_TYPES), "info": None}
+            )
+            path = Path(directory) / filename
+            if kind == "summary":
+                campaign["summaries"].append((match.group(1), path))
+            elif kind == "aggregate":
+                campaign["test_types"].add(match.group(1))
+            else:
+                campaign["info"] = path
+
+    for campaign in campaigns.values():
+        campaign["files"] = len(campaign["summaries"]) + (campaign["info"] is not None)
+    return campaigns
+
+def read_campaign_info(info_file):
+    if not info_file:
+        return {}
+    with open(info_file, newline='') as f:
+        return {row["Browser"]: row for row in csv.DictReader(f)}
+
+def mean_and_stdev(values):
+    mean = sum(values) / len(values)
+    if len(values) < 2:
+        return mean, 0.0
+    return mean, math.sqrt(sum((v - mean) ** 2 for v in values) / (len(values) - 1))
+
+def index_campaign(directory, timestamp, campaign):
+    info = read_campaign_info(campaign["info"])
+    runs = {}
+
+    # Per-browser summaries ("video_firefox_...") repeat the combined ones;
+    # only files named after a test type are read.
+    for prefix, path in campaign["summaries"]:
+        if prefix not in campaign["test_types"]:
+            continue
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                entry = runs.setdefault((prefix, row["Browser"]), {"avg_power": [], "total_energy": [], "version": ""})
+                entry["avg_power"].append(float(row["Avg Power (W)"]))
+                entry["total_energy"].append(float(row["Total Energy (Wh)"]))
+                entry["version"] = entry["version"] or row.get("Browser Version") or ""
+
+    rows = []
+    for (test_type, browser), entry in sorted(runs.items()):
+        host = info.get(browser, {})
+        power_mean, power_stdev = mean_and_stdev(entry["avg_power"])
+        energy_mean, energy_stdev = mean_and_stdev(entry["total_energy"])
+        rows.append({
+            "Campaign": timestamp,
+            "Directory": directory,
+            "Files": campaign["files"],
+            "Test Type": test_type,
+            "Browser": browser,
+            "Browser Version": entry["version"] or host.get("Browser Version", ""),
+            "Kernel": host.get("Kernel", ""),
+            "CPU Model": host.get("CPU Model", ""),
+            # Campaigns before the column was renamed call it "Power Source".
+            "Power Sensor": host.get("Power Sensor", host.get("Power Source", "")),
+            "Runs": len(entry["avg_power"]),
+            "Avg Power Mean (W)": f"{power_mean:.4f}",
+            "Avg Power StdDev (W)": f"{power_stdev:.4f}",
+            "Total Energy Mean (Wh)": f"{energy_mean:.6f}",
+            "Total Energy StdDev (Wh)": f"{energy_stdev:.6f}"
+        })
+    return rows
+
+def update_index(history_dir, rebuild=False):
+    index_file = Path(history_dir) / REGRESSION_INDEX_FILE
+    indexed = {}
+    if index_file.exists() and not rebuild:
+        with open(index_file, newline='') as f:
+            reader = csv.DictReader(f)
+            # An index written with other columns is rebuilt from the campaigns.
+            for row in (reader if reader.fieldnames == INDEX_FIELDS else []):
+                indexed.setdefault((row["Directory"], row["Campaign"]), []).append(row)
+
+    campaigns = scan_campaigns(history_dir)
+    rows = []
+    new_campaigns = 0
+    for key in sorted(campaigns, key=lambda k: (k[1], k[0])):
+        existing = indexed.get(key)
+        # A campaign still being written gains files; re-read it until it stops.
+        if existing and int(existing[0]["Files"]) == campaigns[key]["files"]:
+            rows += existing
+        else:
+            rows += index_campaign(key[0], key[1], campaigns[key])
+            new_campaigns += 1
+
+    with open(index_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=INDEX_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(f"Indexed {len(campaigns)} campaigns ({new_campaigns} read) in {index_file}")
+    return rows
+
+def pool(entries):
+    # Combine per-campaign (n, mean, stdev) into one sample for a version.
+    n = sum(e["n"] for e in entries)
+    mean = sum(e["n"] * e["mean"] for e in entries) / n
+    if n < 2:
+        return {"n": n, "mean": mean, "stdev": 0.0}
+    ss = sum((e["n"] - 1) * e["stdev"] ** 2 + e["n"] * (e["mean"] - mean) ** 2 for e in entries)
+    return {"n": n, "mean": mean, "stdev": math.sqrt(ss / (n - 1))}
+
+def t_critical(df):
+    if df >= T_DF[-1]:
+        return T_CRIT[-1]
+    for i in range(1, len(T_DF)):
+        if df <= T_DF[i]:
+            lo, hi = T_DF[i - 1], T_DF[i]
+            return T_CRIT[i - 1] + (T_CRIT[i] - T_CRIT[i - 1]) * (max(df, lo) - lo) / (hi - lo)
+    return T_CRIT[-1]
+
+def compare_versions(base, new, min_change, min_effect_size):
+    change = (new["mean"] - base["mean"]) / base["mean"] if base["mean"] else 0.0
+    comparison = {"change": change, "effect_size": None, "t": None, "df": None}
+    if base["n"] < 2 or new["n"] < 2:
+        comparison["status"] = "insufficient runs"
+        return comparison
+
+    diff = new["mean"] - base["mean"]
+    pooled_sd = math.sqrt(((base["n"] - 1) * base["stdev"] ** 2 + (new["n"] - 1) * new["stdev"] ** 2)
+                          / (base["n"] + new["n"] - 2))
+    hedges = 1 - 3 / (4 * (base["n"] + new["n"]) - 9)
+    effect_size = hedges * diff / pooled_sd if pooled_sd else math.copysign(math.inf, diff) if diff else 0.0
+
+    # Welch's t-test: the versions' run-to-run spreads need not match.
+    base_var = base["stdev"] ** 2 / base["n"]
+    new_var = new["stdev"] ** 2 / new["n"]
+    se = math.sqrt(base_var + new_var)
+    if se:
+        t = diff / se
+        df = (base_var + new_var) ** 2 / (base_var ** 2 / (base["n"] - 1) + new_var ** 2 / (new["n"] - 1))
+    else:
+        t = math.copysign(math.inf, diff) if diff else 0.0
+        df = base["n"] + new["n"] - 2
+    critical = t_critical(df)
+
+    comparison.update({"effect_size": effect_size, "t": t, "df": df})
+    if change >= min_change and effect_size >= min_effect_size and t > critical:
+        comparison["status"] = "regression"
+    elif change <= -min_change and effect_size <= -min_effect_size and t < -critical:
+        comparison["status"] = "improvement"
+    else:
+        comparison["status"] = "no significant change"
+    return comparison
+
+def find_regressions(index_rows, min_change=REGRESSION_MIN_CHANGE, min_effect_size=REGRESSION_MIN_EFFECT_SIZE):
+    # Only campaigns on the same CPU and power sensor are comparable; within
+    # that, each version is compared with the version tested before it.
+    # Unversioned campaigns stand as their own "version".
+    groups = {}
+    for row in sorted(index_rows, key=lambda r: r["Campaign"]):
+        key = (row["Test Type"], row["Browser"], row["CPU Model"], row["Power Sensor"])
+        version = row["Browser Version"] or f"campaign {row['Campaign']}"
+        groups.setdefault(key, {}).setdefault(version, []).append({
+            "n": int(row["Runs"]),
+            "mean": float(row["Avg Power Mean (W)"]),
+            "stdev": float(row["Avg Power StdDev (W)"]),
+            "energy": float(row["Total Energy Mean (Wh)"]),
+            "campaign": row["Campaign"]
+        })
+
+    comparisons = []
+    for (test_type, browser, cpu_model, power_sensor), versions in groups.items():
+        ordered = list(versions.items())
+        for (base_version, base_entries), (new_version, new_entries) in zip(ordered, ordered[1:]):
+            base = pool(base_entries)
+            new = pool(new_entries)
+            comparison = compare_versions(base, new, min_change, min_effect_size)
+            comparisons.append({
+                "test_type": test_type,
+                "browser": browser,
+                "cpu_model": cpu_model,
+                "power_sensor": power_sensor,
+                "base_version": base_version,
+                "new_version": new_version,
+                "base_campaigns": len(base_entries),
+                "new_campaigns": len(new_entries),
+                "base_power": base["mean"],
+                "new_power": new["mean"],
+                "base_energy": sum(e["energy"] for e in base_entries) / len(base_entries),
+                "new_energy": sum(e["energy"] for e in new_entries) / len(new_entries),
+                "new_first_campaign": new_entries[0]["campaign"],
+                **comparison
+            })
+    return comparisons
+
+def save_comparisons(comparisons, output_file):
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([
+            "Test Type", "Browser", "CPU Model", "Power Sensor", "Base Version", "New Version",
+            "First Campaign", "Base Avg Power (W)", "New Avg Power (W)", "Change (%)",
+            "Base Energy (Wh)", "New Energy (Wh)", "Hedges g", "Welch t", "Welch df", "Status"
+        ])
+        for c in comparisons:
+            writer.writerow([
+                c["test_type"], c["browser"], c["cpu_model"], c["power_sensor"],
+                c["base_version"], c["new_version"], c["new_first_campaign"],
+                f"{c['base_power']:.2f}", f"{c['new_power']:.2f}", f"{100 * c['change']:.1f}",
+                f"{c['base_energy']:.4f}", f"{c['new_energy']:.4f}",
+                f"{c['effect_size']:.2f}" if c["effect_size"] is not None else "",
+                f"{c['t']:.2f}" if c["t"] is not None else "",
+                f"{c['df']:.1f}" if c["df"] is not None else "",
+                c["status"]
+            ])
+    return output_file
+
+def main():
+    args = parse_arguments()
+
+    if not args.history_dir.is_dir():
+        print(f"History directory not found: {args.history_dir}")
+        sys.exit(1)
+
+    index_rows = update_index(args.history_dir, args.rebuild_index)
+    comparisons = find_regressions(index_rows, args.min_change, args.min_effect_size)
+    if not comparisons:
+        print("Fewer than two versions (or campaigns) per browser and scenario; nothing to compare.")
+        return
+
+    output_file = save_comparisons(comparisons, args.output)
+    print(f"Saved {len(comparisons)} version comparisons to {output_file}")
+
+    regressions = [c for c in comparisons if c["status"] == "regression"]
+    improvements = sum(c["status"] == "improvement" for c in comparisons)
+    print(f"{len(regressions)} regressions, {improvements} improvements")
+
+    if regressions:
+        print("\nEnergy regressions:")
+        for c in regressions:
+            print(f"- {c['browser']} {c['test_type']}: {c['base_version']} -> {c['new_version']} "
+                  f"{c['base_power']:.2f}W -> {c['new_power']:.2f}W ({100 * c['change']:+.1f}%, g={c['effect_size']:.2f})")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+import os
+import time
+import tempfile
+import subprocess
+import multiprocessing
+from pathlib import Path
+
+import numpy as np
+
+from config import BROWSERS
+from scenarios import SCENARIOS
+from streaming import iter_detail_chunks, find_detail_files
+from power_measurement import read_power_file
+
+PAGE_TEST_TYPES = {scenario.page: name for name, scenario in SCENARIOS.items() if scenario.page}
+
+def load_trace(detail_file, browser=None):
+    parts = []
+    for chunk in iter_detail_chunks(detail_file):
+        if browser is None:
+            browser = chunk["browser"]
+        if chunk["browser"] == browser:
+            parts.append(chunk["power_readings"])
+    if not parts:
+        raise ValueError(f"No trace for {browser} in {detail_file}")
+    return np.concatenate(parts)
+
+def load_campaign_traces(results_dir, test_types):
+    # {(browser name, test type): [trace per recorded iteration]}
+    traces = {}
+    for test_type in test_types:
+        for detail_file in find_detail_files(test_type, results_dir):
+            parts = {}
+            for chunk in iter_detail_chunks(detail_file):
+                parts.setdefault(chunk["browser"], []).append(chunk["power_readings"])
+            for browser, browser_parts in parts.items():
+                traces.setdefault((browser, test_type), []).append(np.concatenate(browser_parts))
+    return traces
+
+def write_power_now(power_file, watts):
+    # sysfs-style integer microwatts, swapped in atomically so a reader never
+    # sees a half-written value.
+    tmp_file = f"{power_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        f.write(f"{int(round(watts * 1000000))}\n")
+    os.replace(tmp_file, power_file)
+
+def _replay_loop(power_file, trace, interval, stop_event):
+    i = 0
+    next_tick = time.monotonic()
+    while not stop_event.is_set():
+        write_power_now(power_file, trace[i % len(trace)])
+        i += 1
+        next_tick += interval
+        stop_event.wait(max(0.0, next_tick - time.monotonic()))
+
+def start_replay_power_source(trace, interval):
+    # Runs in its own process so the writer's cost is not charged to the harness.
+    power_dir = Path(tempfile.mkdtemp(prefix="replay_power_"))
+    power_file = power_dir / "power_now"
+    write_power_now(power_file, trace[0])
+
+    stop_event = multiprocessing.Event()
+    process = multiprocessing.Process(
+        target=_replay_loop,
+        args=(str(power_file), list(map(float, trace)), interval, stop_event),
+        daemon=True
+    )
+    process.start()
+    return {"power_file": str(power_file), "process": process, "stop_event": stop_event}
+
+def stop_replay_power_source(source):
+    source["stop_event"].set()
+    source["process"].join(timeout=5)
+    power_dir = Path(source["power_file"]).parent
+    for leftover in power_dir.iterdir():
+        leftover.unlink(missing_ok=True)
+    power_dir.rmdir()
+
+class SteppedPowerSource:
+    # Every read hands out the next sample of the cued trace, so the harness
+    # sees the recording sample for sample however its sleeps are timed.
+    def __init__(self, power_file):
+        self.power_file = str(power_file)
+        self.trace = None
+        self.position = 0
+        write_power_now(self.power_file, 0.0)
+
+    def play(self, trace):
+        self.trace = trace
+        self.position = 0
+
+    def read_power(self, power_file):
+        if self.trace is not None and len(self.trace):
+            write_power_now(power_file, self.trace[self.position % len(self.trace)])
+            self.position += 1
+        return read_power_file(power_file)
+
+class ReplayLauncher:
+    # Drop-in for subprocess.Popen in browser_test: works out which recorded
+    # scenario a browser command stands for, cues its next iteration on the
+    # power source and starts a placeholder process for the harness to manage.
+    def __init__(self, traces, power_source):
+        self.traces = traces
+        self.power_source = power_source
+        self.launches = {}
+        self.running = {}
+
+    @staticmethod
+    def test_type(cmd):
+        args = [arg for arg in cmd[1:] if not arg.startswith("--")]
+        if "--profile" in cmd:
+            args.remove(cmd[cmd.index("--profile") + 1])
+        if not args:
+            return "multiple_tabs"
+        return PAGE_TEST_TYPES.get(args[0].rsplit("/", 1)[-1], "webpage")
+
+    def __call__(self, cmd, **kwargs):
+        browser_cmd = cmd[0]
+        instance = self.running.get(browser_cmd)
+        if instance and instance.poll() is None:
+            # The running instance just opens the URLs as tabs.
+            return subprocess.Popen(["true"], **kwargs)
+
+        key = (BROWSERS[browser_cmd], self.test_type(cmd))
+        if key not in self.traces:
+            raise ValueError(f"No recorded {key[1]} trace for {key[0]}")
+
+        runs = self.traces[key]
+        launch = self.launches.get(key, 0)
+        self.launches[key] = launch + 1
+        self.power_source.play(runs[launch % len(runs)])
+
+        process = subprocess.Popen(["sleep", "86400"], **kwargs)
+        self.running[browser_cmd] = process
+        return process
+
+    def close(self):
+        for process in self.running.values():
+            if process.poll() is None:
+                process.kill()
+                process.wait()
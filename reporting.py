@@ -1,56 +1,393 @@
 #!/usr/bin/env python3
 import csv
+import math
 import statistics
-from config import OUTPUT_DIR, SAMPLE_INTERVAL, TIMESTAMP
+from config import (
+    OUTPUT_DIR, SAMPLE_INTERVAL, TIMESTAMP, POWER_FEATURE_COLUMNS, DETAIL_FORMAT, TRACE_SUFFIX,
+    BATTERY_COUNTER_RESOLUTION
+)
 from utils import log_message
+from perf_counters import derive_perf_metrics
+
+# Per-run statistics save_aggregate_results reports as mean and stdev across iterations.
+AGGREGATE_FIELDS = ["avg_power", "max_power", "min_power", "median_power", "p95_power", "total_energy"]
+
+def energy_discrepancy(result):
+    counter_energy = result.get("counter_energy")
+    if counter_energy is None:
+        return None
+    if counter_energy <= 0:
+        log_message(f"No energy discrepancy for {result['browser']}: the battery counter did not go down "
+                    f"({counter_energy:.4f}Wh); charging, or the counter did not update")
+        return None
+    if counter_energy < BATTERY_COUNTER_RESOLUTION:
+        log_message(f"No energy discrepancy for {result['browser']}: the battery counter moved "
+                    f"{counter_energy:.4f}Wh, below its {BATTERY_COUNTER_RESOLUTION}Wh resolution")
+        return None
+    return 100 * (result["total_energy"] - counter_energy) / counter_energy
 
 def save_results_to_csv(results, test_type, iteration=None):
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     
     iter_suffix = f"_iter{iteration}" if iteration is not None else ""
     
-    detail_file = OUTPUT_DIR / f"{test_type}_power_details{iter_suffix}_{TIMESTAMP}.csv"
-    log_message(f"Saving detailed results to {detail_file}")
-    
-    with open(detail_file, 'w', newline='') as f:
-        writer = csv.writer(f)
+    if DETAIL_FORMAT == "trace":
+        from trace_format import write_trace
         
-        browsers = [result["browser"] for result in results if result]
-        header = ["Time (s)"] + browsers
-        writer.writerow(header)
-        
-        max_length = max([len(result["timestamps"]) for result in results if result], default=0)
+        detail_file = OUTPUT_DIR / f"{test_type}_power_details{iter_suffix}_{TIMESTAMP}{TRACE_SUFFIX}"
+        log_message(f"Saving detailed results to {detail_file}")
+        write_trace(detail_file, {
+            result["browser"]: list(result["power_readings"])[:len(result["timestamps"])]
+            for result in results if result
+        })
+    else:
+        detail_file = OUTPUT_DIR / f"{test_type}_power_details{iter_suffix}_{TIMESTAMP}.csv"
+        log_message(f"Saving detailed results to {detail_file}")
         
-        for i in range(max_length):
-            row = [i * SAMPLE_INTERVAL]
+        with open(detail_file, 'w', newline='') as f:
+            writer = csv.writer(f)
             
-            for result in results:
-                if result and i < len(result["timestamps"]):
-                    row.append(result["power_readings"][i])
-                else:
-                    row.append("")
+            browsers = [result["browser"] for result in results if result]
+            header = ["Time (s)"] + browsers
+            writer.writerow(header)
             
-            writer.writerow(row)
+            columns = [
+                (len(result["timestamps"]), list(result["power_readings"])) if result else (0, [])
+                for result in results
+            ]
+            max_length = max([length for length, _ in columns], default=0)
+            
+            for i in range(max_length):
+                row = [round(i * SAMPLE_INTERVAL, 6)]
+                row += [power[i] if i < length else "" for length, power in columns]
+                writer.writerow(row)
     
     summary_file = OUTPUT_DIR / f"{test_type}_power_summary{iter_suffix}_{TIMESTAMP}.csv"
     log_message(f"Saving summary results to {summary_file}")
     
     with open(summary_file, 'w', newline='') as f:
         writer = csv.writer(f)
-        writer.writerow(["Browser", "Avg Power (W)", "Max Power (W)", "Min Power (W)", "Total Energy (Wh)"])
+        writer.writerow(["Browser", "Avg Power (W)", "Max Power (W)", "Min Power (W)", "Total Energy (Wh)",
+                         "Counter Energy (Wh)", "Energy Discrepancy (%)", "Browser Version",
+                         "Estimate Error (W)", "Work Units", "Work Rate (/s)"])
         
         for result in results:
             if result:
+                discrepancy = energy_discrepancy(result)
                 writer.writerow([
                     result["browser"],
                     result["avg_power"],
                     result["max_power"],
                     result["min_power"],
-                    result["total_energy"]
+                    result["total_energy"],
+                    result.get("counter_energy") if result.get("counter_energy") is not None else "",
+                    f"{discrepancy:.2f}" if discrepancy is not None else "",
+                    result.get("browser_version") or "",
+                    f"{result['power_estimate_error']:.2f}" if result.get("power_estimate_error") else "",
+                    f"{result['work_units']:.0f}" if result.get("work_units") is not None else "",
+                    f"{result['work_rate']:.3f}" if result.get("work_rate") is not None else ""
                 ])
     
+    if any(result and result.get("rapl_energy") for result in results):
+        save_rapl_breakdown(results, test_type, iter_suffix)
+    
+    if any(result and result.get("perf_counters") for result in results):
+        save_perf_counters(results, test_type, iter_suffix)
+    
+    if any(result and result.get("cpu_state") for result in results):
+        save_cpu_state(results, test_type, iter_suffix)
+    
+    if any(result and result.get("cgroup") for result in results):
+        save_cgroup_accounting(results, test_type, iter_suffix)
+    
+    if any(has_training_features(result) for result in results):
+        save_power_features(results, test_type, iter_suffix)
+    
+    if any(result and result.get("navigations") for result in results):
+        save_navigations(results, test_type, iter_suffix)
+    
     return detail_file, summary_file
 
+def save_rapl_breakdown(results, test_type, iter_suffix=""):
+    rapl_file = OUTPUT_DIR / f"{test_type}_rapl_breakdown{iter_suffix}_{TIMESTAMP}.csv"
+    log_message(f"Saving RAPL domain breakdown to {rapl_file}")
+    
+    with open(rapl_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Browser", "Domain", "Energy (Wh)", "Avg Power (W)", "Share of Total (%)"])
+        
+        for result in results:
+            if not result or not result.get("rapl_energy"):
+                continue
+            
+            duration_h = len(result["power_readings"]) * SAMPLE_INTERVAL / 3600
+            for domain, energy in result["rapl_energy"].items():
+                writer.writerow([
+                    result["browser"],
+                    domain,
+                    f"{energy:.6f}",
+                    f"{energy / duration_h:.2f}" if duration_h else "",
+                    f"{100 * energy / result['total_energy']:.1f}" if result["total_energy"] else ""
+                ])
+    
+    return rapl_file
+
+def save_perf_counters(results, test_type, iter_suffix=""):
+    perf_file = OUTPUT_DIR / f"{test_type}_perf_counters{iter_suffix}_{TIMESTAMP}.csv"
+    log_message(f"Saving hardware counter results to {perf_file}")
+    
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else ""
+    
+    with open(perf_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Browser", "Cycles", "Instructions", "IPC", "Cache Misses",
+                         "Context Switches", "Context Switches/s", "Energy per Instruction (nJ)"])
+        
+        for result in results:
+            metrics = derive_perf_metrics(result) if result else None
+            if not metrics:
+                continue
+            
+            writer.writerow([
+                result["browser"],
+                fmt(metrics["cycles"], ".0f"),
+                fmt(metrics["instructions"], ".0f"),
+                fmt(metrics["ipc"], ".3f"),
+                fmt(metrics["cache_misses"], ".0f"),
+                fmt(metrics["context_switches"], ".0f"),
+                fmt(metrics["context_switches_per_sec"], ".1f"),
+                fmt(metrics["nj_per_instruction"], ".3f")
+            ])
+    
+    return perf_file
+
+def save_cpu_state(results, test_type, iter_suffix=""):
+    cpu_file = OUTPUT_DIR / f"{test_type}_cpu_state{iter_suffix}_{TIMESTAMP}.csv"
+    log_message(f"Saving CPU frequency and idle-state results to {cpu_file}")
+    
+    states = {}
+    freq_bins = {}
+    for result in results:
+        if result and result.get("cpu_state"):
+            states.update(dict.fromkeys(result["cpu_state"].get("cstate_residency", {})))
+            freq_bins.update(dict.fromkeys(result["cpu_state"].get("freq_histogram", {})))
+    freq_bins = sorted(freq_bins, key=lambda b: int(b.split("-")[0]))
+    
+    with open(cpu_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["Browser", "Avg Freq (MHz)", "Wakeups/s", "Wakeup-Power Correlation"]
+            + [f"{state} Residency (%)" for state in states]
+            + [f"{freq_bin} MHz (%)" for freq_bin in freq_bins]
+        )
+        
+        for result in results:
+            if not result or not result.get("cpu_state"):
+                continue
+            
+            cpu_state = result["cpu_state"]
+            residency = cpu_state.get("cstate_residency", {})
+            histogram = cpu_state.get("freq_histogram", {})
+            writer.writerow(
+                [
+                    result["browser"],
+                    f"{cpu_state['avg_freq_mhz']:.0f}" if "avg_freq_mhz" in cpu_state else "",
+                    f"{cpu_state['wakeups_per_sec']:.1f}" if "wakeups_per_sec" in cpu_state else "",
+                    f"{cpu_state['wakeup_power_corr']:.3f}" if "wakeup_power_corr" in cpu_state else ""
+                ]
+                + [f"{residency[state]:.2f}" if state in residency else "" for state in states]
+                + [f"{histogram.get(freq_bin, 0):.1f}" for freq_bin in freq_bins]
+            )
+    
+    return cpu_file
+
+def has_training_features(result):
+    return bool(result and not result.get("power_estimate_error") and (result.get("cpu_state") or {}).get("intervals"))
+
+def save_power_features(results, test_type, iter_suffix=""):
+    # Measured power next to the counters of the same interval: training data
+    # for power_model.py.
+    features_file = OUTPUT_DIR / f"{test_type}_power_features{iter_suffix}_{TIMESTAMP}.csv"
+    log_message(f"Saving power model training data to {features_file}")
+    
+    with open(features_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Browser", "Time (s)", "Power (W)"] + list(POWER_FEATURE_COLUMNS.values()))
+        
+        for result in results:
+            if not has_training_features(result):
+                continue
+            intervals = result["cpu_state"]["intervals"]
+            columns = [intervals.get(name) for name in POWER_FEATURE_COLUMNS]
+            n = min([len(result["power_readings"])] + [len(column) for column in columns if column is not None])
+            for i in range(n):
+                writer.writerow(
+                    [result["browser"], f"{result['timestamps'][i]:g}", result["power_readings"][i]]
+                    + [f"{column[i]:.3f}" if column is not None and math.isfinite(column[i]) else "" for column in columns]
+                )
+    
+    return features_file
+
+def save_sensor_frame(result, test_type, iteration=None):
+    from sensor_merge import save_frame
+    
+    iter_suffix = f"_iter{iteration}" if iteration is not None else ""
+    frame_file = OUTPUT_DIR / f"{test_type}_{result['browser'].lower()}_sensors{iter_suffix}_{TIMESTAMP}.npz"
+    log_message(f"Saving merged sensor frame to {frame_file}")
+    return save_frame(result["sensors"], frame_file)
+
+def save_cgroup_accounting(results, test_type, iter_suffix=""):
+    cgroup_file = OUTPUT_DIR / f"{test_type}_cgroup{iter_suffix}_{TIMESTAMP}.csv"
+    log_message(f"Saving per-job cgroup accounting to {cgroup_file}")
+    
+    columns = [
+        ("cpu_seconds", "CPU Time (s)", "{:.2f}"),
+        ("avg_cpu_cores", "Avg CPU (cores)", "{:.3f}"),
+        ("peak_cpu_cores", "Peak CPU (cores)", "{:.3f}"),
+        ("avg_memory_mb", "Avg Memory (MB)", "{:.1f}"),
+        ("peak_memory_mb", "Peak Memory (MB)", "{:.1f}"),
+        ("io_read_mb", "IO Read (MB)", "{:.2f}"),
+        ("io_write_mb", "IO Write (MB)", "{:.2f}")
+    ]
+    
+    with open(cgroup_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Browser"] + [header for _, header, _ in columns])
+        
+        for result in results:
+            if not result or not result.get("cgroup"):
+                continue
+            accounting = result["cgroup"]
+            writer.writerow([result["browser"]] + [
+                fmt.format(accounting[key]) if key in accounting else "" for key, _, fmt in columns
+            ])
+    
+    return cgroup_file
+
+def save_navigations(results, test_type, iter_suffix=""):
+    navigation_file = OUTPUT_DIR / f"{test_type}_navigations{iter_suffix}_{TIMESTAMP}.csv"
+    log_message(f"Saving per-navigation energy to {navigation_file}")
+    
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else ""
+    
+    with open(navigation_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Browser", "Sequence", "URL", "Start (s)", "Load Time (ms)", "Visit (s)", "Energy (J)",
+                         "Avg Power (W)", "Load Energy (J)", "Complete"])
+        
+        for result in results:
+            if not result or not result.get("navigations"):
+                continue
+            for page in result["navigations"]:
+                writer.writerow([
+                    result["browser"],
+                    page["sequence"],
+                    page["url"],
+                    f"{page['start']:.3f}",
+                    fmt(page["load_time_ms"], ".0f"),
+                    f"{page['visit']:.3f}",
+                    f"{page['energy']:.3f}",
+                    fmt(page["avg_power"], ".2f"),
+                    fmt(page["load_energy"], ".3f"),
+                    "yes" if page["complete"] else "no"
+                ])
+    
+    return navigation_file
+
+def save_campaign_info(available_browsers, job_infos):
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    
+    info_file = OUTPUT_DIR / f"campaign_info_{TIMESTAMP}.csv"
+    log_message(f"Saving browser versions and host details to {info_file}")
+    
+    with open(info_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Browser", "Command", "Browser Version", "Kernel", "CPU Model", "Power Sensor", "Profile"])
+        
+        for browser_cmd, browser_name in available_browsers.items():
+            info = job_infos[browser_cmd]
+            writer.writerow([
+                browser_name,
+                browser_cmd,
+                info["browser_version"] or "",
+                info["kernel"],
+                info["cpu_model"],
+                info["power_sensor"],
+                info["profile_mode"]
+            ])
+    
+    return info_file
+
+def save_system_state(reference):
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    
+    state_file = OUTPUT_DIR / f"system_state_{TIMESTAMP}.csv"
+    log_message(f"Saving the campaign's reference system state to {state_file}")
+    
+    with open(state_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Setting", "Value"])
+        for setting, value in reference.items():
+            writer.writerow([setting, value])
+    
+    return state_file
+
+def save_startup_comparison(results):
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    
+    startup_file = OUTPUT_DIR / f"startup_energy_{TIMESTAMP}.csv"
+    log_message(f"Saving cold/warm startup energy to {startup_file}")
+    
+    with open(startup_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Browser", "Profile", "Runs", "Window (s)", "Startup Energy Mean (Wh)",
+                         "Startup Energy StdDev (Wh)", "Avg Startup Power (W)"])
+        
+        for result in results:
+            if not result:
+                continue
+            for mode, startup in result["modes"].items():
+                writer.writerow([
+                    result["browser"],
+                    mode,
+                    startup["runs"],
+                    result["window"],
+                    f"{startup['mean_energy']:.6f}",
+                    f"{startup['stdev_energy']:.6f}",
+                    f"{startup['avg_power']:.2f}"
+                ])
+    
+    return startup_file
+
+def save_tab_sweep_results(results):
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    
+    sweep_file = OUTPUT_DIR / f"tab_sweep_results_{TIMESTAMP}.csv"
+    log_message(f"Saving tab sweep results to {sweep_file}")
+    
+    with open(sweep_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Browser", "Tabs", "Settle Power (W)", "Steady Power (W)", "Memory (MB)",
+                         "Marginal Power (W/tab)", "Marginal Memory (MB/tab)"])
+        
+        for result in results:
+            if not result:
+                continue
+            for level in result["sweep"]:
+                writer.writerow([
+                    result["browser"],
+                    level["tabs"],
+                    f"{level['settle_power']:.2f}" if level["settle_power"] is not None else "",
+                    f"{level['steady_power']:.2f}",
+                    f"{level['memory_mb']:.1f}",
+                    f"{result['watts_per_tab']:.4f}",
+                    f"{result['mb_per_tab']:.2f}"
+                ])
+    
+    return sweep_file
+
 def save_aggregate_results(all_iterations, test_type):
     browsers = {}
     
@@ -59,46 +396,25 @@ def save_aggregate_results(all_iterations, test_type):
             if result:
                 browser_name = result["browser"]
                 if browser_name not in browsers:
-                    browsers[browser_name] = {
-                        "avg_power": [],
-                        "max_power": [],
-                        "min_power": [],
-                        "total_energy": []
-                    }
+                    browsers[browser_name] = {field: [] for field in AGGREGATE_FIELDS}
                 
-                browsers[browser_name]["avg_power"].append(result["avg_power"])
-                browsers[browser_name]["max_power"].append(result["max_power"])
-                browsers[browser_name]["min_power"].append(result["min_power"])
-                browsers[browser_name]["total_energy"].append(result["total_energy"])
+                for field in AGGREGATE_FIELDS:
+                    browsers[browser_name][field].append(result[field])
     
     aggregate_results = []
     for browser_name, data in browsers.items():
-        avg_power_mean = statistics.mean(data["avg_power"])
-        max_power_mean = statistics.mean(data["max_power"])
-        min_power_mean = statistics.mean(data["min_power"])
-        total_energy_mean = statistics.mean(data["total_energy"])
-        
-        if len(data["avg_power"]) > 1:
-            avg_power_stdev = statistics.stdev(data["avg_power"])
-            max_power_stdev = statistics.stdev(data["max_power"])
-            min_power_stdev = statistics.stdev(data["min_power"])
-            total_energy_stdev = statistics.stdev(data["total_energy"])
-        else:
-            avg_power_stdev = max_power_stdev = min_power_stdev = total_energy_stdev = 0
-        
-        aggregate_results.append({
-            "browser": browser_name,
-            "avg_power_mean": avg_power_mean,
-            "avg_power_stdev": avg_power_stdev,
-            "max_power_mean": max_power_mean,
-            "max_power_stdev": max_power_stdev,
-            "min_power_mean": min_power_mean,
-            "min_power_stdev": min_power_stdev,
-            "total_energy_mean": total_energy_mean,
-            "total_energy_stdev": total_energy_stdev
-        })
+        row = {"browser": browser_name}
+        for field in AGGREGATE_FIELDS:
+            row[f"{field}_mean"] = statistics.mean(data[field])
+            row[f"{field}_stdev"] = statistics.stdev(data[field]) if len(data[field]) > 1 else 0
+        aggregate_results.append(row)
+    
+    return write_aggregate_results(aggregate_results, test_type)
+
+def write_aggregate_results(aggregate_results, test_type, output_dir=OUTPUT_DIR):
+    output_dir.mkdir(parents=True, exist_ok=True)
     
-    aggregate_file = OUTPUT_DIR / f"{test_type}_aggregate_results_{TIMESTAMP}.csv"
+    aggregate_file = output_dir / f"{test_type}_aggregate_results_{TIMESTAMP}.csv"
     log_message(f"Saving aggregate results to {aggregate_file}")
     
     with open(aggregate_file, 'w', newline='') as f:
@@ -112,7 +428,11 @@ def save_aggregate_results(all_iterations, test_type):
             "Min Power Mean (W)", 
             "Min Power StdDev (W)",
             "Total Energy Mean (Wh)", 
-            "Total Energy StdDev (Wh)"
+            "Total Energy StdDev (Wh)",
+            "Median Power Mean (W)",
+            "Median Power StdDev (W)",
+            "P95 Power Mean (W)",
+            "P95 Power StdDev (W)"
         ])
         
         for result in aggregate_results:
@@ -125,7 +445,40 @@ def save_aggregate_results(all_iterations, test_type):
                 f"{result['min_power_mean']:.2f}",
                 f"{result['min_power_stdev']:.2f}",
                 f"{result['total_energy_mean']:.4f}",
-                f"{result['total_energy_stdev']:.4f}"
+                f"{result['total_energy_stdev']:.4f}",
+                f"{result['median_power_mean']:.2f}",
+                f"{result['median_power_stdev']:.2f}",
+                f"{result['p95_power_mean']:.2f}",
+                f"{result['p95_power_stdev']:.2f}"
             ])
     
-    return aggregate_file
\ No newline at end of file
+    return aggregate_file
+
+def save_anomaly_report(all_iterations):
+    rows = []
+    for test_type, iterations in all_iterations.items():
+        for iteration_results in iterations:
+            for result in iteration_results:
+                flags = (result.get("anomalies") or []) + (result.get("system_state_flags") or []) if result else []
+                if flags:
+                    rows.append([
+                        test_type,
+                        result["browser"],
+                        result.get("iteration", ""),
+                        f"{result['avg_power']:.2f}",
+                        ";".join(flags),
+                        result.get("system_state") or ""
+                    ])
+    
+    if not rows:
+        return None
+    
+    anomaly_file = OUTPUT_DIR / f"anomalies_{TIMESTAMP}.csv"
+    log_message(f"Saving {len(rows)} suspect runs to {anomaly_file}")
+    
+    with open(anomaly_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Test Type", "Browser", "Iteration", "Avg Power (W)", "Anomalies", "System State"])
+        writer.writerows(rows)
+    
+    return anomaly_file
\ No newline at end of file
@@ -1,144 +1,295 @@
 #!/usr/bin/env python3
-import time
 import datetime
 import shutil
 from pathlib import Path
 
 from config import (
-    OUTPUT_DIR, LOG_FILE, NUM_TEST_ITERATIONS, TEST_URL
+    OUTPUT_DIR, LOG_FILE, TIMESTAMP, ANOMALY_MAX_RETRIES, REQUEUE_OUTLIERS, ENABLE_RAPL, ENABLE_CPU_STATE, POWER_MODEL_FILE
 )
-from utils import setup_logging, log_message
+from utils import setup_logging, log_message, get_browser_version, get_host_info
 from power_measurement import check_battery_available, has_powertop
+from rapl import discover_rapl_domains
+from cgroups import discover_cgroup_mode
+from power_model import load_power_model
 from server import start_local_test_server
-from browser_test import get_available_browsers, run_browser_test
-from reporting import save_results_to_csv, save_aggregate_results
+from browser_test import (
+    get_available_browsers, run_browser_test, run_tab_sweep, prepare_profile_template, run_startup_comparison
+)
+from reporting import (
+    save_results_to_csv, save_aggregate_results, save_anomaly_report, save_tab_sweep_results, save_campaign_info,
+    save_startup_comparison, save_sensor_frame, save_system_state
+)
+from profiles import create_profile, discard_profile, cleanup_profiles
+from anomaly import check_run, find_outlier_iterations
+from scenarios import get_scenario
+from scheduler import load_cost_history, plan_campaign, record_job_costs
+from system_state import (
+    capture_reference_state, enforce_system_state, wait_for_system_state, compare_system_state,
+    read_system_state, describe_mismatches, describe_system_state
+)
+from campaign import RunConfig
+import clock
+
+def check_system_state(system_state, browser_name, test_type):
+    # Returns the settings that differ from the campaign's reference, or None
+    # when the policy refuses to run the job in that state.
+    if not system_state:
+        return {}
+    
+    reference, policy = system_state["reference"], system_state["policy"]
+    mismatches = (wait_for_system_state if policy == "refuse" else enforce_system_state)(reference)
+    if mismatches:
+        log_message(f"System state for {browser_name} {test_type} differs from the campaign's: "
+                    f"{describe_mismatches(reference, mismatches)}")
+        if policy == "refuse":
+            log_message(f"Skipping {test_type} test for {browser_name}")
+            return None
+    return mismatches
+
+def run_checked_test(browser_cmd, browser_name, test_type, url, power_file, iteration, duration, job_info=None,
+                     profile_template=None, system_state=None):
+    attempts = ANOMALY_MAX_RETRIES + 1 if power_file else 1
+    profile_mode = (job_info or {}).get("profile_mode", "default")
+    
+    for attempt in range(1, attempts + 1):
+        mismatches = check_system_state(system_state, browser_name, test_type)
+        if mismatches is None:
+            return None
+        
+        # Every attempt gets its own profile so a retry never inherits state.
+        profile_dir = None
+        if profile_mode != "default":
+            profile_dir = create_profile(browser_cmd, profile_template if profile_mode == "warm" else None)
+        try:
+            result = run_browser_test(browser_cmd, browser_name, test_type, url, power_file, duration, profile_dir)
+        finally:
+            if profile_dir:
+                discard_profile(profile_dir)
+        anomalies = check_run(result, duration)
+        
+        # Flagged jobs are kept and reported, not retried; under "refuse" a
+        # change during the run (charger plugged in, Wi-Fi toggled) is retried.
+        flags = []
+        if system_state:
+            mismatches.update(compare_system_state(system_state["reference"], read_system_state()))
+            if mismatches and system_state["policy"] == "refuse":
+                anomalies.append("system_state")
+            else:
+                flags = [f"system_state:{setting}" for setting in mismatches]
+        
+        if result:
+            result["iteration"] = iteration
+            result["attempts"] = attempt
+            result["anomalies"] = anomalies
+            # Kept apart from the anomalies, which decide retries.
+            result["system_state_flags"] = flags
+            if mismatches:
+                result["system_state"] = describe_mismatches(system_state["reference"], mismatches)
+            for key, value in (job_info or {}).items():
+                result[key] = value
+        
+        if not anomalies:
+            return result
+        
+        log_message(f"Suspect {test_type} run for {browser_name}: {', '.join(anomalies)}")
+        if attempt < attempts:
+            log_message(f"Re-queueing {test_type} test for {browser_name} (retry {attempt}/{ANOMALY_MAX_RETRIES})")
+            clock.sleep(5)
+    
+    return result
+
+def save_job_results(result, test_type, browser_name, iteration):
+    save_results_to_csv([result], f"{test_type}_{browser_name.lower()}", iteration)
+    if result.get("sensors"):
+        save_sensor_frame(result, test_type, iteration)
+        # Written out; the merged frame can be large for long, fast runs.
+        result["sensors"] = None
+
+def requeue_outlier_iterations(all_iterations, available_browsers, power_file, run_config, job_infos,
+                               profile_templates, system_state=None):
+    browser_cmds = {name: cmd for cmd, name in available_browsers.items()}
+    
+    for test_type, iterations in all_iterations.items():
+        for i, j in find_outlier_iterations(iterations):
+            suspect = iterations[i][j]
+            browser_name = suspect["browser"]
+            iteration = suspect.get("iteration", i + 1)
+            log_message(f"{browser_name} {test_type} iteration {iteration} is an outlier "
+                        f"({suspect['avg_power']:.2f}W); re-queueing")
+            
+            retry = run_checked_test(browser_cmds[browser_name], browser_name, test_type,
+                                     run_config.url, power_file, iteration, run_config.duration,
+                                     job_infos[browser_cmds[browser_name]],
+                                     profile_templates.get(browser_cmds[browser_name]), system_state)
+            
+            if retry and not retry["anomalies"]:
+                iterations[i][j] = retry
+                save_job_results(retry, test_type, browser_name, iteration)
+                save_results_to_csv(iterations[i], test_type, iteration)
+            else:
+                suspect.setdefault("anomalies", []).append("iteration_outlier")
+            
+            clock.sleep(5)
 
-def run_all_tests():
+def run_all_tests(run_config=None):
+    run_config = run_config or RunConfig()
+    iterations_count = run_config.iterations
+    
     log_file = setup_logging()
     log_message("Starting browser power efficiency tests")
-    log_message(f"Number of test iterations: {NUM_TEST_ITERATIONS}")
+    log_message(f"Number of test iterations: {iterations_count}")
+    log_message(f"Test types: {', '.join(run_config.test_types)}")
     
     power_file = check_battery_available()
     if power_file:
         log_message(f"Using power measurements from: {power_file}")
+    elif ENABLE_CPU_STATE and (model := load_power_model()):
+        log_message(f"No direct power readings available. Will estimate power with {POWER_MODEL_FILE} "
+                    f"(+/-{1.96 * model['run_rmse']:.2f}W on a run's average)")
     elif has_powertop():
         log_message("No direct power readings available. Will use powertop.")
     else:
         log_message("ERROR: No method available to measure power. Please install powertop or run on a laptop with battery.")
         return
     
-    available_browsers = get_available_browsers()
+    rapl_domains = discover_rapl_domains() if ENABLE_RAPL else []
+    if rapl_domains:
+        log_message(f"RAPL domains: {', '.join(d['name'] for d in rapl_domains)}")
+    
+    cgroup_mode = discover_cgroup_mode()
+    log_message(f"Job isolation: {f'cgroup v2 ({cgroup_mode})' if cgroup_mode else 'none (killall fallback)'}")
+    
+    for browser in run_config.unknown_browsers():
+        log_message(f"Unknown browser requested: {browser}")
+    
+    available_browsers = run_config.select_browsers(get_available_browsers())
     if not available_browsers:
         log_message("No browsers available for testing!")
         return
     
+    host_info = get_host_info(power_file)
+    if not power_file and ENABLE_CPU_STATE and load_power_model():
+        host_info["power_sensor"] = f"model:{POWER_MODEL_FILE.name}"
+    log_message(f"Host: kernel {host_info['kernel']}, {host_info['cpu_model']}, power from {host_info['power_sensor']}")
+    
+    job_infos = {}
+    for browser_cmd, browser_name in available_browsers.items():
+        version = get_browser_version(browser_cmd)
+        log_message(f"{browser_name} version: {version or 'unknown'}")
+        job_infos[browser_cmd] = {"browser_version": version, **host_info, "profile_mode": run_config.profile_mode}
+    campaign_info_file = save_campaign_info(available_browsers, job_infos)
+    
+    reference_state = capture_reference_state(run_config.backlight)
+    system_state = None
+    if reference_state:
+        log_message(f"System state: {describe_system_state(reference_state)}")
+        save_system_state(reference_state)
+        if run_config.state_policy != "ignore":
+            system_state = {"reference": reference_state, "policy": run_config.state_policy}
+    
     httpd = None
     temp_dir = None
     
     try:
-        httpd, temp_dir = start_local_test_server()
-        log_message("Local test server started")
-        
-        all_iterations = {
-            "video": [],
-            "animation": [],
-            "js_computation": [],
-            "webpage": [],
-            "multiple_tabs": []
-        }
+        profile_templates = {}
+        if run_config.profile_mode == "warm" or run_config.startup_comparison:
+            for browser_cmd, browser_name in available_browsers.items():
+                profile_templates[browser_cmd] = prepare_profile_template(browser_cmd, browser_name, run_config.url)
+        
+        plan, estimate = plan_campaign(available_browsers, run_config.test_types, run_config.duration,
+                                       iterations_count, load_cost_history(), run_config.time_budget)
+        iterations_count = estimate["iterations"]
+        # Less than the requested scenarios when the time budget dropped some.
+        test_types = estimate["test_types"]
+        log_message(f"Expected campaign time: {estimate['mean'] / 60:.0f} +/- {estimate['stdev'] / 60:.0f} min "
+                    f"({estimate['recorded_pairs']}/{estimate['pairs']} browser/scenario pairs from recorded timings)")
+        
+        if any(get_scenario(test_type).needs_server for test_type in test_types):
+            httpd, temp_dir = start_local_test_server(with_corpus="page_corpus" in test_types)
+            log_message("Local test server started")
         
-        for iteration in range(1, NUM_TEST_ITERATIONS + 1):
-            log_message(f"\n{'='*20} Starting test iteration {iteration}/{NUM_TEST_ITERATIONS} {'='*20}")
+        all_iterations = {test_type: [] for test_type in test_types}
+        
+        for iteration, jobs in enumerate(plan, 1):
+            log_message(f"\n{'='*20} Starting test iteration {iteration}/{iterations_count} {'='*20}")
             
-            iteration_results = {
-                "video": [],
-                "animation": [],
-                "js_computation": [],
-                "webpage": [],
-                "multiple_tabs": []
-            }
+            iteration_results = {test_type: {} for test_type in test_types}
+            job_costs = []
+            current_browser = None
             
-            for browser_cmd, browser_name in available_browsers.items():
-                log_message(f"\n{'='*20} Testing {browser_name} {'='*20}")
-                
-                if httpd:
-                    video_result = run_browser_test(
-                        browser_cmd, 
-                        browser_name, 
-                        "video", 
-                        "", 
-                        power_file
-                    )
-                    iteration_results["video"].append(video_result)
-                    
-                    if video_result:
-                        save_results_to_csv([video_result], f"video_{browser_name.lower()}", iteration)
-                    
-                    time.sleep(5)
-                    
-                    animation_result = run_browser_test(
-                        browser_cmd, 
-                        browser_name, 
-                        "animation", 
-                        "", 
-                        power_file
-                    )
-                    iteration_results["animation"].append(animation_result)
-                    
-                    if animation_result:
-                        save_results_to_csv([animation_result], f"animation_{browser_name.lower()}", iteration)
-                    
-                    time.sleep(5)
-                    
-                    js_result = run_browser_test(
-                        browser_cmd, 
-                        browser_name, 
-                        "js_computation", 
-                        "", 
-                        power_file
-                    )
-                    iteration_results["js_computation"].append(js_result)
-                    
-                    if js_result:
-                        save_results_to_csv([js_result], f"js_computation_{browser_name.lower()}", iteration)
-                    
-                    time.sleep(5)
-                
-                webpage_result = run_browser_test(
-                    browser_cmd, 
-                    browser_name, 
-                    "webpage", 
-                    TEST_URL, 
-                    power_file
-                )
-                iteration_results["webpage"].append(webpage_result)
-                
-                if webpage_result:
-                    save_results_to_csv([webpage_result], f"webpage_{browser_name.lower()}", iteration)
+            for browser_cmd, browser_name, test_type in jobs:
+                if browser_cmd != current_browser:
+                    log_message(f"\n{'='*20} Testing {browser_name} {'='*20}")
+                    current_browser = browser_cmd
                 
-                time.sleep(5)
+                if get_scenario(test_type).needs_server and not httpd:
+                    continue
                 
-                multiple_tabs_result = run_browser_test(
-                    browser_cmd, 
-                    browser_name, 
-                    "multiple_tabs", 
-                    TEST_URL, 
-                    power_file
+                job_start = clock.time()
+                result = run_checked_test(
+                    browser_cmd,
+                    browser_name,
+                    test_type,
+                    run_config.url,
+                    power_file,
+                    iteration,
+                    run_config.duration,
+                    job_infos[browser_cmd],
+                    profile_templates.get(browser_cmd),
+                    system_state
                 )
-                iteration_results["multiple_tabs"].append(multiple_tabs_result)
+                iteration_results[test_type][browser_cmd] = result
                 
-                if multiple_tabs_result:
-                    save_results_to_csv([multiple_tabs_result], f"multiple_tabs_{browser_name.lower()}", iteration)
+                if result:
+                    save_job_results(result, test_type, browser_name, iteration)
                 
-                time.sleep(5)
+                clock.sleep(5)
+                job_costs.append({
+                    "browser": browser_name,
+                    "test_type": test_type,
+                    "duration": run_config.duration,
+                    "wall_time": clock.time() - job_start,
+                    "attempts": result.get("attempts", "") if result else ""
+                })
             
-            for test_type, results in iteration_results.items():
+            record_job_costs(job_costs, TIMESTAMP)
+            
+            for test_type, by_browser in iteration_results.items():
+                # Files keep the configured browser order whatever order the jobs ran in.
+                results = [by_browser[cmd] for cmd in available_browsers if cmd in by_browser]
                 if results and any(results):
                     save_results_to_csv(results, test_type, iteration)
                     all_iterations[test_type].append(results)
         
+        if iterations_count > 2 and power_file and REQUEUE_OUTLIERS:
+            log_message("\nChecking iterations for outliers...")
+            requeue_outlier_iterations(all_iterations, available_browsers, power_file, run_config, job_infos,
+                                       profile_templates, system_state)
+        
+        anomaly_file = save_anomaly_report(all_iterations)
+        
+        sweep_file = None
+        if run_config.tab_sweep:
+            log_message(f"\n{'='*20} Tab scaling sweep {'='*20}")
+            sweep_results = []
+            for browser_cmd, browser_name in available_browsers.items():
+                sweep_results.append(run_tab_sweep(browser_cmd, browser_name, run_config.url, power_file))
+                clock.sleep(5)
+            if any(sweep_results):
+                sweep_file = save_tab_sweep_results(sweep_results)
+        
+        startup_file = None
+        if run_config.startup_comparison:
+            log_message(f"\n{'='*20} Cold/warm startup comparison {'='*20}")
+            startup_results = []
+            for browser_cmd, browser_name in available_browsers.items():
+                startup_results.append(run_startup_comparison(browser_cmd, browser_name, run_config.url,
+                                                              power_file, profile_templates.get(browser_cmd)))
+            if any(startup_results):
+                startup_file = save_startup_comparison(startup_results)
+        
         aggregate_files = []
-        if NUM_TEST_ITERATIONS > 1:
+        if iterations_count > 1:
             log_message("\nCalculating aggregate results across all iterations...")
             for test_type, iterations in all_iterations.items():
                 if iterations:
@@ -152,12 +303,31 @@ def run_all_tests():
             f.write(f"Browser Power Efficiency Test Results\n")
             f.write(f"=====================================\n")
             f.write(f"Test conducted on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"Number of test iterations: {NUM_TEST_ITERATIONS}\n\n")
+            f.write(f"Number of test iterations: {iterations_count}\n")
+            f.write(f"Test duration: {run_config.duration}s\n")
+            browsers = [f"{name} {job_infos[cmd]['browser_version'] or '(unknown version)'}"
+                        for cmd, name in available_browsers.items()]
+            f.write(f"Browsers: {', '.join(browsers)}\n")
+            f.write(f"Host: kernel {host_info['kernel']}, {host_info['cpu_model']}\n")
+            f.write(f"Power sensor: {host_info['power_sensor']}\n")
+            f.write(f"Browser profile: {run_config.profile_mode}\n")
+            f.write(f"System state ({run_config.state_policy}): {describe_system_state(reference_state)}\n")
+            f.write(f"Test types: {', '.join(test_types)}\n\n")
             
             f.write(f"Test Results Directory: {OUTPUT_DIR}\n")
             f.write(f"Log File: {LOG_FILE}\n\n")
+            f.write(f"Browser versions and host: {campaign_info_file.name}\n\n")
+            
+            if sweep_file:
+                f.write(f"Tab sweep results: {sweep_file.name}\n\n")
+            
+            if startup_file:
+                f.write(f"Cold/warm startup energy: {startup_file.name}\n\n")
             
-            if NUM_TEST_ITERATIONS > 1:
+            if anomaly_file:
+                f.write(f"Suspect runs recorded in: {anomaly_file.name}\n\n")
+            
+            if iterations_count > 1:
                 f.write(f"Aggregate Result Files:\n")
                 for agg_file in aggregate_files:
                     f.write(f"- {agg_file.name}\n")
@@ -168,7 +338,8 @@ def run_all_tests():
         return {
             "log_file": log_file,
             "report_file": report_file,
-            "output_dir": OUTPUT_DIR
+            "output_dir": OUTPUT_DIR,
+            "results": all_iterations
         }
     
     finally:
@@ -178,4 +349,6 @@ def run_all_tests():
         
         if temp_dir:
             log_message("Cleaning up temporary files")
-            shutil.rmtree(temp_dir, ignore_errors=True)
\ No newline at end of file
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        
+        cleanup_profiles()
\ No newline at end of file
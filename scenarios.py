@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# The test scenarios, declared in one place. run_browser_test builds the
+# launch command from these entries and run_all_tests schedules them, so a new
+# scenario only needs a register_scenario call here (and its page in server.py
+# if it is served locally). Kept free of config imports: config derives
+# TEST_TYPES and ALL_TEST_TYPES from this registry.
+
+BROWSER_FAMILIES = {
+    "firefox": "firefox",
+    "google-chrome": "chromium",
+    "chromium-browser": "chromium",
+    "brave-browser": "chromium",
+    "microsoft-edge": "chromium",
+    "opera": "opera",
+    "vivaldi": "opera"
+}
+
+def browser_family(browser_cmd):
+    return BROWSER_FAMILIES.get(browser_cmd, "other")
+
+class Scenario:
+    # page: file served by the local test server, or None.
+    # uses_url: launch on the run's URL (--url) instead of a local page.
+    # flags: extra launch flags per browser family; "default" covers the rest.
+    # ready: steps run after launch, before measuring (see browser_test.READY_STEPS).
+    # kill_after: the scenario leaves extra instances behind that terminating
+    #   the launched process does not reach.
+    # overhead: prior guess, in seconds, of a job's wall-clock beyond the
+    #   measured duration; the cost model replaces it with recorded timings.
+    # work_unit: what the page's work counter counts (it reports it to the
+    #   test server, see html_templates.WORK_BEACON_JS), or None.
+    # navigations: the page walks other pages and reports each navigation's
+    #   start and load (html_templates.NAVIGATION_BEACON_JS), so the run's
+    #   energy is attributed per page.
+    # opt_in: left out of default campaigns; runs only when named in --test-types.
+    __slots__ = ("name", "page", "uses_url", "flags", "ready", "kill_after", "overhead", "work_unit", "navigations",
+                 "opt_in")
+
+    def __init__(self, name, page=None, uses_url=False, flags=None, ready=(), kill_after=False, overhead=15.0,
+                 work_unit=None, navigations=False, opt_in=False):
+        self.name = name
+        self.page = page
+        self.uses_url = uses_url
+        self.flags = flags or {}
+        self.ready = tuple(ready)
+        self.kill_after = kill_after
+        self.overhead = overhead
+        self.work_unit = work_unit
+        self.navigations = navigations
+        self.opt_in = opt_in
+
+    @property
+    def needs_server(self):
+        return self.page is not None
+
+    def launch_flags(self, browser_cmd):
+        family = browser_family(browser_cmd)
+        return list(self.flags.get(family, self.flags.get("default", [])))
+
+    def launch_target(self, url, server_port):
+        if self.page:
+            return f"http://localhost:{server_port}/{self.page}"
+        return url if self.uses_url else None
+
+    def __repr__(self):
+        return f"Scenario({self.name!r})"
+
+SCENARIOS = {}
+
+def register_scenario(scenario):
+    if scenario.name in SCENARIOS:
+        raise ValueError(f"Scenario already registered: {scenario.name}")
+    SCENARIOS[scenario.name] = scenario
+    return scenario
+
+def get_scenario(name):
+    try:
+        return SCENARIOS[name]
+    except KeyError:
+        raise ValueError(f"Unknown test type: {name}") from None
+
+AUTOPLAY = "--autoplay-policy=no-user-gesture-required"
+
+register_scenario(Scenario(
+    "video",
+    page="video.html",
+    flags={
+        "firefox": ["--kiosk", AUTOPLAY],
+        "chromium": [AUTOPLAY, "--start-maximized"],
+        "opera": [AUTOPLAY]
+    },
+    ready=("autoplay",),
+    overhead=17.0,
+    work_unit="frames"
+))
+
+register_scenario(Scenario(
+    "animation",
+    page="animation.html",
+    flags={"chromium": ["--start-maximized"]},
+    work_unit="frames"
+))
+
+register_scenario(Scenario(
+    "js_computation",
+    page="jscomputation.html",
+    flags={"chromium": ["--start-maximized"]},
+    work_unit="iterations"
+))
+
+register_scenario(Scenario(
+    "webpage",
+    uses_url=True
+))
+
+register_scenario(Scenario(
+    "multiple_tabs",
+    ready=("open_tabs",),
+    kill_after=True,
+    overhead=25.0
+))
+
+register_scenario(Scenario(
+    "page_corpus",
+    page="corpus.html",
+    flags={"chromium": ["--start-maximized"]},
+    work_unit="pages",
+    navigations=True,
+    opt_in=True
+))
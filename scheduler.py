@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+import csv
+import statistics
+
+from config import OUTPUT_DIR, SCENARIO_COST_FILE, SCENARIO_COST_HISTORY
+from scenarios import get_scenario
+from utils import log_message
+
+COST_FIELDS = ["Timestamp", "Browser", "Test Type", "Duration (s)", "Wall Time (s)", "Attempts"]
+
+def cost_file():
+    return OUTPUT_DIR / SCENARIO_COST_FILE
+
+def load_cost_history(path=None, limit=SCENARIO_COST_HISTORY):
+    # Overhead = wall-clock minus the measured duration, so timings recorded
+    # at one --duration still predict jobs run at another.
+    path = path or cost_file()
+    history = {}
+    if not path.exists():
+        return history
+
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            try:
+                overhead = float(row["Wall Time (s)"]) - float(row["Duration (s)"])
+            except (KeyError, ValueError):
+                continue
+            history.setdefault((row["Browser"], row["Test Type"]), []).append(overhead)
+
+    return {key: overheads[-limit:] for key, overheads in history.items()}
+
+def record_job_costs(jobs, timestamp, path=None):
+    path = path or cost_file()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    new_file = not path.exists()
+
+    with open(path, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(COST_FIELDS)
+        for job in jobs:
+            writer.writerow([timestamp, job["browser"], job["test_type"], job["duration"],
+                             f"{job['wall_time']:.2f}", job["attempts"]])
+
+def expected_cost(browser_name, test_type, duration, history):
+    # Mean and variance of one job's wall-clock. Until a browser/scenario pair
+    # has two recorded timings, the scenario's declared overhead stands in,
+    # with a generous spread.
+    overheads = history.get((browser_name, test_type), [])
+    if len(overheads) >= 2:
+        return duration + statistics.mean(overheads), statistics.variance(overheads)
+    prior = get_scenario(test_type).overhead
+    return duration + prior, (0.5 * prior) ** 2
+
+def fitting_iterations(iteration_mean, iteration_var, iterations, time_budget):
+    # Whole iterations that fit, keeping a one-sigma margin so the budget
+    # holds on a slow day too.
+    fitting = 0
+    while fitting < iterations and (
+            (fitting + 1) * iteration_mean + ((fitting + 1) * iteration_var) ** 0.5 <= time_budget):
+        fitting += 1
+    return fitting
+
+def plan_campaign(available_browsers, test_types, duration, iterations, history, time_budget=None):
+    # Jobs run one at a time: a second browser would share the power sensor,
+    # so no order or packing of the jobs shortens the campaign. Each iteration
+    # still runs every job, with the browser order rotated so no browser
+    # always runs first after the idle start (or last, on the hottest
+    # machine). The cost model gives the campaign estimate and fits a time
+    # budget: first by running fewer whole iterations, then, when not even one
+    # fits, by dropping whole scenarios, the most expensive first.
+    browsers = list(available_browsers.items())
+    scenario_costs = {}
+    for test_type in test_types:
+        job_costs = [expected_cost(browser_name, test_type, duration, history) for _, browser_name in browsers]
+        scenario_costs[test_type] = (sum(mean for mean, _ in job_costs), sum(var for _, var in job_costs))
+    iteration_mean = sum(mean for mean, _ in scenario_costs.values())
+    iteration_var = sum(var for _, var in scenario_costs.values())
+
+    if time_budget:
+        fitting = fitting_iterations(iteration_mean, iteration_var, iterations, time_budget)
+        dropped = []
+        kept = list(test_types)
+        while not fitting and len(kept) > 1:
+            costliest = max(kept, key=lambda test_type: scenario_costs[test_type][0])
+            kept.remove(costliest)
+            dropped.append(costliest)
+            iteration_mean -= scenario_costs[costliest][0]
+            iteration_var -= scenario_costs[costliest][1]
+            fitting = fitting_iterations(iteration_mean, iteration_var, iterations, time_budget)
+        if dropped:
+            log_message(f"Time budget of {time_budget}s does not fit one iteration of every scenario; "
+                        f"dropping {', '.join(dropped)}")
+            test_types = [test_type for test_type in test_types if test_type in kept]
+        if fitting < iterations:
+            log_message(f"Time budget of {time_budget}s fits {max(fitting, 1)} of {iterations} iterations")
+        iterations = max(fitting, 1)
+
+    plan = []
+    for iteration in range(iterations):
+        shift = iteration % len(browsers) if browsers else 0
+        order = browsers[shift:] + browsers[:shift]
+        plan.append([
+            (browser_cmd, browser_name, test_type)
+            for browser_cmd, browser_name in order
+            for test_type in test_types
+        ])
+
+    estimate = {
+        "iterations": iterations,
+        "test_types": list(test_types),
+        "mean": iterations * iteration_mean,
+        "stdev": (iterations * iteration_var) ** 0.5,
+        "recorded_pairs": sum(1 for _, browser_name in browsers for test_type in test_types
+                              if len(history.get((browser_name, test_type), [])) >= 2),
+        "pairs": len(browsers) * len(test_types)
+    }
+    return plan, estimate
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+import csv
+import re
+from collections import defaultdict
+
+import numpy as np
+
+from config import (
+    SAMPLE_INTERVAL, ALL_TEST_TYPES, PHASE_MIN_SEGMENT, PHASE_PENALTY, PHASE_SPIKE_THRESHOLD, PHASE_SETTLE_SEGMENTS
+)
+
+def robust_noise_variance(power):
+    if len(power) < 3:
+        return float(np.var(power)) or 1.0
+    diffs = np.diff(power)
+    sigma = 1.4826 * np.median(np.abs(diffs - np.median(diffs))) / np.sqrt(2)
+    return float(sigma ** 2) or float(np.var(power)) or 1.0
+
+def pelt_breakpoints(power, penalty=None, min_size=PHASE_MIN_SEGMENT):
+    # PELT over the Gaussian mean-shift cost; the candidate set is evaluated
+    # as one vector per step so pruning keeps it close to linear time.
+    x = np.asarray(power, dtype=np.float64)
+    n = len(x)
+    if n < 2 * min_size:
+        return [n]
+
+    if penalty is None:
+        penalty = PHASE_PENALTY * np.log(n) * robust_noise_variance(x)
+
+    cs = np.concatenate(([0.0], np.cumsum(x)))
+    cs2 = np.concatenate(([0.0], np.cumsum(x * x)))
+
+    def cost(starts, t):
+        length = t - starts
+        seg_sum = cs[t] - cs[starts]
+        return (cs2[t] - cs2[starts]) - seg_sum * seg_sum / np.maximum(length, 1)
+
+    best = np.full(n + 1, np.inf)
+    best[0] = -penalty
+    last = np.zeros(n + 1, dtype=np.int64)
+    candidates = np.array([0], dtype=np.int64)
+
+    for t in range(1, n + 1):
+        admissible = candidates[t - candidates >= min_size]
+        if len(admissible):
+            totals = best[admissible] + cost(admissible, t)
+            i = int(np.argmin(totals))
+            best[t] = totals[i] + penalty
+            last[t] = admissible[i]
+
+            keep = (t - candidates < min_size) | (
+                best[candidates] + cost(candidates, t) <= best[t]
+            )
+            candidates = candidates[keep]
+        candidates = np.append(candidates, t)
+
+    breakpoints = []
+    t = n
+    while t > 0:
+        breakpoints.append(t)
+        t = int(last[t])
+    return breakpoints[::-1]
+
+def segment_trace(power, penalty=None, min_size=PHASE_MIN_SEGMENT):
+    x = np.asarray(power, dtype=np.float64)
+    segments = []
+    start = 0
+    for end in pelt_breakpoints(x, penalty, min_size):
+        segments.append({"start": start, "end": end, "mean": float(x[start:end].mean())})
+        start = end
+    return segments
+
+def count_spikes(power, baseline, sigma, threshold=PHASE_SPIKE_THRESHOLD):
+    x = np.asarray(power, dtype=np.float64)
+    if len(x) == 0 or sigma == 0:
+        return 0, np.zeros(len(x), dtype=bool)
+    above = x > baseline + threshold * sigma
+    starts = np.diff(np.concatenate(([0], above.astype(np.int8)))) == 1
+    return int(np.count_nonzero(starts)), above
+
+def summarize_phases(power, penalty=None, min_size=PHASE_MIN_SEGMENT):
+    x = np.asarray(power, dtype=np.float64)
+    x = x[~np.isnan(x)]
+    if len(x) == 0:
+        return None
+
+    segments = segment_trace(x, penalty, min_size)
+    sigma = np.sqrt(robust_noise_variance(x))
+
+    lengths = [seg["end"] - seg["start"] for seg in segments]
+    longest_index = int(np.argmax(lengths))
+    longest = segments[longest_index]
+    level = float(np.median(x[longest["start"]:longest["end"]]))
+
+    # Warm-up lasts until the level has settled: PHASE_SETTLE_SEGMENTS
+    # phases in a row (or up to the longest) near the steady level. One
+    # close phase is not enough; the first step of a ramp can be close too.
+    # The steady phase runs from there to the end of the trace.
+    settled = [abs(seg["mean"] - level) <= PHASE_SPIKE_THRESHOLD * sigma for seg in segments]
+    warmup_samples = 0
+    for i, seg in enumerate(segments):
+        if i == longest_index or all(settled[i:min(i + PHASE_SETTLE_SEGMENTS, longest_index + 1)]):
+            break
+        warmup_samples = seg["end"]
+
+    steady = x[warmup_samples:]
+    spike_count, spikes = count_spikes(steady, level, sigma)
+    steady_power = float(np.median(steady[~spikes])) if (~spikes).any() else level
+
+    return {
+        "segments": segments,
+        "num_phases": len(segments),
+        "steady_power": steady_power,
+        "warmup_samples": warmup_samples,
+        "warmup_duration": warmup_samples * SAMPLE_INTERVAL,
+        "warmup_energy": float(x[:warmup_samples].sum()) * SAMPLE_INTERVAL / 3600,
+        "steady_energy": float(steady.sum()) * SAMPLE_INTERVAL / 3600,
+        "spike_energy": float((steady[spikes] - steady_power).sum()) * SAMPLE_INTERVAL / 3600,
+        "spike_count": spike_count
+    }
+
+def load_detail_traces(detail_file):
+    from streaming import iter_detail_chunks
+
+    traces = defaultdict(list)
+    for chunk in iter_detail_chunks(detail_file):
+        traces[chunk["browser"]].append(chunk["power_readings"])
+    return {browser: np.concatenate(parts) for browser, parts in traces.items()}
+
+def segment_campaign(results_dir, output_file, test_types=ALL_TEST_TYPES):
+    from streaming import find_detail_files
+
+    rows = []
+    for test_type in test_types:
+        for detail_file in find_detail_files(test_type, results_dir):
+            iter_match = re.search(r'_iter(\d+)_', detail_file)
+            iteration = int(iter_match.group(1)) if iter_match else None
+
+            for browser, power in load_detail_traces(detail_file).items():
+                phases = summarize_phases(power)
+                if phases:
+                    rows.append((test_type, browser, iteration, phases))
+
+    if not rows:
+        print("No detail traces found for phase segmentation")
+        return None
+
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([
+            "Test Type",
+            "Browser",
+            "Iteration",
+            "Phases",
+            "Steady Power (W)",
+            "Warm-up Duration (s)",
+            "Warm-up Energy (Wh)",
+            "Steady Energy (Wh)",
+            "Spike Count",
+            "Spike Excess Energy (Wh)"
+        ])
+        for test_type, browser, iteration, phases in rows:
+            writer.writerow([
+                test_type,
+                browser,
+                iteration,
+                phases["num_phases"],
+                f"{phases['steady_power']:.2f}",
+                f"{phases['warmup_duration']:.1f}",
+                f"{phases['warmup_energy']:.4f}",
+                f"{phases['steady_energy']:.4f}",
+                phases["spike_count"],
+                f"{phases['spike_energy']:.4f}"
+            ])
+
+    print(f"Saved phase segmentation for {len(rows)} traces to {output_file}")
+    return output_file
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+import numpy as np
+
+# How a stream's samples relate to time:
+#   "instant"  - a reading at its timestamp; interpolated linearly between samples.
+#   "interval" - an average over the interval ending at its timestamp (counter
+#                deltas); every grid point inside that interval gets the value.
+#   "step"     - a state that holds until the next sample (as-of join backwards).
+STREAM_KINDS = ("instant", "interval", "step")
+
+class SensorStream:
+    # times are absolute seconds on one clock shared by every stream of a job.
+    # latency is how long after the fact the sensor reports (a fuel gauge's
+    # averaging window, a counter read late in the loop); it is subtracted
+    # from times before alignment. start is the beginning of the first
+    # interval for "interval" streams.
+    __slots__ = ("name", "times", "columns", "kind", "latency", "start")
+
+    def __init__(self, name, times, columns, kind="instant", latency=0.0, start=None):
+        if kind not in STREAM_KINDS:
+            raise ValueError(f"Unknown stream kind: {kind}")
+        self.name = name
+        self.times = np.asarray(times, dtype=np.float64)
+        self.columns = {column: np.asarray(values, dtype=np.float64) for column, values in columns.items()}
+        self.kind = kind
+        self.latency = latency
+        self.start = start
+
+        for column, values in self.columns.items():
+            if len(values) != len(self.times):
+                raise ValueError(f"{name}.{column} has {len(values)} values for {len(self.times)} timestamps")
+
+    def __len__(self):
+        return len(self.times)
+
+    def __repr__(self):
+        return f"SensorStream({self.name!r}, {len(self)} samples, {list(self.columns)})"
+
+def _sorted_stream(stream):
+    t = stream.times - stream.latency
+    values = np.column_stack(list(stream.columns.values())) if stream.columns else np.empty((len(t), 0))
+    if len(t) > 1 and np.any(np.diff(t) < 0):
+        order = np.argsort(t, kind="stable")
+        t, values = t[order], values[order]
+    return t, values
+
+def align_stream(stream, grid, tolerance):
+    # Returns a (len(grid), columns) array; grid points with no sample close
+    # enough (gaps longer than tolerance, or beyond the stream's ends) are NaN.
+    t, values = _sorted_stream(stream)
+    out = np.full((len(grid), values.shape[1]), np.nan)
+    if not len(t):
+        return out
+
+    if stream.kind == "instant":
+        if len(t) == 1:
+            hit = np.abs(grid - t[0]) <= tolerance
+            out[hit] = values[0]
+            return out
+        right = np.clip(np.searchsorted(t, grid, side="right"), 1, len(t) - 1)
+        t0, t1 = t[right - 1], t[right]
+        span = t1 - t0
+        weight = np.where(span > 0, (grid - t0) / np.where(span > 0, span, 1.0), 0.0)
+        valid = (grid >= t[0]) & (grid <= t[-1]) & (span <= tolerance)
+        blended = values[right - 1] * (1 - weight)[:, None] + values[right] * weight[:, None]
+        out[valid] = blended[valid]
+        # Just outside the stream, hold the edge sample rather than leave a gap.
+        out[(grid < t[0]) & (t[0] - grid <= tolerance)] = values[0]
+        out[(grid > t[-1]) & (grid - t[-1] <= tolerance)] = values[-1]
+
+    elif stream.kind == "step":
+        index = np.searchsorted(t, grid, side="right") - 1
+        valid = index >= 0
+        valid[valid] &= grid[valid] - t[index[valid]] <= tolerance
+        out[valid] = values[index[valid]]
+
+    else:
+        index = np.searchsorted(t, grid, side="left")
+        valid = index < len(t)
+        start = (stream.start - stream.latency) if stream.start is not None else t[0] - tolerance
+        starts = np.concatenate([[start], t[:-1]])
+        valid[valid] &= grid[valid] > starts[index[valid]]
+        out[valid] = values[index[valid]]
+
+    return out
+
+def merge_streams(streams, interval, start=None, end=None, tolerance=None):
+    # One grid at `interval` spacing from start to end (default: the span any
+    # stream covers), every stream joined onto it. The result is a
+    # columnar frame: "time" (seconds from start) plus "<stream>.<column>".
+    if interval <= 0:
+        raise ValueError(f"Grid interval must be positive, got {interval}")
+    streams = [stream for stream in streams if len(stream)]
+    if not streams:
+        return {"time": np.empty(0)}
+
+    tolerance = tolerance if tolerance is not None else 3 * interval
+    if start is None:
+        start = min(stream.times.min() - stream.latency for stream in streams)
+    if end is None:
+        end = max(stream.times.max() - stream.latency for stream in streams)
+
+    grid = start + np.arange(int(np.floor((end - start) / interval)) + 1) * interval
+    frame = {"time": grid - start}
+    for stream in streams:
+        aligned = align_stream(stream, grid, tolerance)
+        for k, column in enumerate(stream.columns):
+            frame[f"{stream.name}.{column}"] = aligned[:, k]
+    return frame
+
+def save_frame(frame, path):
+    # float32 keeps ~7 significant digits, plenty for watts, MHz and percentages,
+    # at half the size; the time axis stays float64.
+    columns = {name: (values if name == "time" else values.astype(np.float32)) for name, values in frame.items()}
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, **columns)
+    return path
+
+def load_frame(path):
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
@@ -1,15 +1,103 @@
 #!/usr/bin/env python3
 import os
+import json
 import http.server
 import socketserver
 import threading
 import tempfile
+import urllib.parse
 from pathlib import Path
 import html_templates
-from config import VIDEO_SERVER_PORT, VIDEO_FILES
+from config import VIDEO_SERVER_PORT, VIDEO_FILES, CORPUS_DWELL, CORPUS_LOAD_TIMEOUT
+from page_corpus import prepare_corpus
 from utils import log_message
 
-def start_local_test_server():
+# Latest cumulative work each test page reported, keyed by test type; one
+# page runs at a time.
+_work_counters = {}
+_work_lock = threading.Lock()
+
+def reset_work_counter(test_type):
+    with _work_lock:
+        _work_counters.pop(test_type, None)
+
+def read_work_counter(test_type):
+    with _work_lock:
+        return _work_counters.get(test_type)
+
+# Navigations the corpus pages reported, keyed by test type, and the page that
+# follows each corpus page (URL path to URL path).
+_navigations = {}
+_corpus_next = {}
+
+def reset_navigations(test_type):
+    with _work_lock:
+        _navigations.pop(test_type, None)
+
+def read_navigations(test_type):
+    with _work_lock:
+        return list(_navigations.get(test_type, []))
+
+class TestPageHandler(http.server.SimpleHTTPRequestHandler):
+    def do_GET(self):
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        next_page = _corpus_next.get(urllib.parse.quote(path))
+        if next_page is None:
+            super().do_GET()
+            return
+        
+        # Corpus pages get the navigation beacon on the way out; the archive
+        # itself is left untouched.
+        try:
+            with open(self.translate_path(self.path), 'rb') as f:
+                html = f.read().decode('utf-8', errors='surrogateescape')
+        except OSError:
+            self.send_error(404)
+            return
+        
+        body = html_templates.with_navigation_beacon(
+            html, "page_corpus", next_page, CORPUS_DWELL, CORPUS_LOAD_TIMEOUT
+        ).encode('utf-8', errors='surrogateescape')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_POST(self):
+        if self.path not in ("/work", "/navigation"):
+            self.send_error(404)
+            return
+        
+        try:
+            report = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            page = str(report["page"])
+            with _work_lock:
+                if self.path == "/work":
+                    _work_counters[page] = float(report["units"])
+                else:
+                    load = None if report["load"] is None else float(report["load"])
+                    _navigations.setdefault(page, []).append({
+                        "url": str(report["url"]),
+                        "start": float(report["start"]),
+                        "load": load
+                    })
+                    # A corpus page's work is a page loaded.
+                    if load is not None:
+                        _work_counters[page] = _work_counters.get(page, 0) + 1
+        except (ValueError, KeyError, TypeError):
+            self.send_error(400)
+            return
+        
+        self.send_response(204)
+        self.end_headers()
+    
+    def log_message(self, format, *args):
+        # Beacons arrive every second; only page requests are worth a line.
+        if self.command != "POST":
+            super().log_message(format, *args)
+
+def start_local_test_server(with_corpus=False):
     temp_dir = tempfile.mkdtemp()
     
     for video_format, video_path in VIDEO_FILES.items():
@@ -19,7 +107,7 @@ def start_local_test_server():
         else:
             log_message(f"Warning: Video file not found: {video_path}")
     
-    video_html = html_templates.get_video_html()
+    video_html = html_templates.with_work_beacon(html_templates.get_video_html())
     
     video_source_html = ""
     for video_format, video_path in VIDEO_FILES.items():
@@ -32,10 +120,18 @@ def start_local_test_server():
         f.write(video_html)
     
     with open(Path(temp_dir) / "animation.html", "w") as f:
-        f.write(html_templates.ANIMATION_HTML)
+        f.write(html_templates.with_work_beacon(html_templates.ANIMATION_HTML))
     
     with open(Path(temp_dir) / "jscomputation.html", "w") as f:
-        f.write(html_templates.JS_COMPUTATION_HTML)
+        f.write(html_templates.with_work_beacon(html_templates.JS_COMPUTATION_HTML))
+    
+    # Generating or linking the corpus is only worth it when page_corpus runs.
+    _corpus_next.clear()
+    if with_corpus:
+        corpus_pages = prepare_corpus(temp_dir)
+        _corpus_next.update(zip(corpus_pages, corpus_pages[1:] + corpus_pages[:1]))
+        with open(Path(temp_dir) / "corpus.html", "w") as f:
+            f.write(html_templates.CORPUS_START_HTML.format(first_url=json.dumps(corpus_pages[0] if corpus_pages else "/")))
     
     with open(Path(temp_dir) / "index.html", "w") as f:
         f.write("""
@@ -53,7 +149,7 @@ def start_local_test_server():
     
     os.chdir(temp_dir)
     
-    handler = http.server.SimpleHTTPRequestHandler
+    handler = TestPageHandler
     httpd = socketserver.TCPServer(("", VIDEO_SERVER_PORT), handler)
     
     log_message(f"Starting HTTP server at port {VIDEO_SERVER_PORT}")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import argparse
+import contextlib
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent
+DEFAULT_SOURCE_DIR = REPO_DIR / "browser_power_tests"
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Replay a recorded campaign through the full test and analysis pipeline')
+    parser.add_argument('--source-dir', type=Path, default=DEFAULT_SOURCE_DIR,
+                      help='Directory holding the recorded detail CSVs (default: browser_power_tests)')
+    parser.add_argument('--output-dir', type=Path, default=Path("simulation_output"),
+                      help='Where the simulated results and analysis are written (default: simulation_output)')
+    parser.add_argument('--speedup', type=float, default=1000,
+                      help='Simulated seconds per real second; 0 skips waiting altogether (default: 1000)')
+    parser.add_argument('--duration', type=int,
+                      help='Duration of each test in seconds (default: WATCH_DURATION)')
+    parser.add_argument('--iterations', type=int,
+                      help='Number of iterations (default: as many as were recorded)')
+    parser.add_argument('--browsers', type=str, nargs='+',
+                      help='Browsers to replay, by command or name (default: all recorded)')
+    parser.add_argument('--test-types', type=str, nargs='+',
+                      help='Test types to replay (default: all)')
+    parser.add_argument('--summary-only', action='store_true',
+                      help='Print rankings instead of generating charts')
+    parser.add_argument('--quiet', action='store_true',
+                      help='Keep per-sample harness output in the log file only')
+
+    return parser.parse_args()
+
+def install_stub_commands(bin_dir, commands):
+    # Browsers only need to be found by `which`; killall and xdotool must never
+    # reach the host's real browsers or pointer.
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    for command in commands:
+        stub = bin_dir / command
+        stub.write_text("#!/bin/sh\nexit 0\n")
+        stub.chmod(0o755)
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+
+def main():
+    args = parse_arguments()
+    output_dir = args.output_dir.resolve()
+    results_dir = output_dir / "results"
+    sim_dir = output_dir / "sim"
+    sim_dir.mkdir(parents=True, exist_ok=True)
+    power_file = sim_dir / "power_now"
+
+    os.environ["BROWSER_POWER_OUTPUT_DIR"] = str(results_dir)
+    os.environ["BROWSER_POWER_ANALYSIS_DIR"] = str(output_dir / "analysis")
+    os.environ["BROWSER_POWER_NOW_FILE"] = str(power_file)
+    os.environ["BROWSER_POWER_HOST_COUNTERS"] = "0"
+    os.environ["BROWSER_POWER_REQUEUE_OUTLIERS"] = "0"
+    os.environ.setdefault("MPLBACKEND", "Agg")
+
+    from config import BROWSERS, TEST_TYPES, WATCH_DURATION
+    from replay import load_campaign_traces, SteppedPowerSource, ReplayLauncher
+    from clock import SimulatedClock, use_clock
+    from campaign import Campaign, RunConfig
+    import browser_test
+    import anaylze_data
+
+    test_types = args.test_types or TEST_TYPES
+    traces = load_campaign_traces(args.source_dir.resolve(), test_types)
+    if not traces:
+        print(f"No recorded detail files found in {args.source_dir}")
+        sys.exit(1)
+
+    recorded = {browser for browser, _ in traces}
+    # Scenarios the source campaign never ran have nothing to replay.
+    test_types = [test_type for test_type in test_types if any(t == test_type for _, t in traces)]
+    install_stub_commands(
+        sim_dir / "bin",
+        [cmd for cmd, name in BROWSERS.items() if name in recorded] + ["killall", "xdotool"]
+    )
+
+    source = SteppedPowerSource(power_file)
+    launcher = ReplayLauncher(traces, source)
+    browser_test.launch_browser = launcher
+    browser_test.read_power_file = source.read_power
+
+    sim_clock = SimulatedClock(speedup=args.speedup or None)
+    use_clock(sim_clock)
+
+    run_config = RunConfig(
+        duration=args.duration or WATCH_DURATION,
+        iterations=args.iterations or max(len(runs) for runs in traces.values()),
+        browsers=args.browsers,
+        test_types=test_types
+    )
+
+    print(f"Replaying {len(traces)} recorded scenarios from {args.source_dir} at "
+          f"{f'{args.speedup:g}x' if args.speedup else 'full'} speed...")
+
+    cwd = os.getcwd()
+    virtual_start = sim_clock.time()
+    real_start = time.perf_counter()
+    try:
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(devnull) if args.quiet else contextlib.nullcontext():
+            outcome = Campaign(run_config).run()
+    finally:
+        launcher.close()
+        os.chdir(cwd)
+
+    if not outcome:
+        print("Simulated campaign failed. Check log for details.")
+        sys.exit(1)
+
+    print(f"\nSimulated {sim_clock.time() - virtual_start:.0f}s of testing in "
+          f"{time.perf_counter() - real_start:.1f}s")
+    print(f"Results directory: {results_dir}\n")
+
+    analysis_args = ["--results-dir", str(results_dir)]
+    if args.summary_only:
+        analysis_args.append("--summary-only")
+    anaylze_data.main(analysis_args)
+
+if __name__ == "__main__":
+    main()
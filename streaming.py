@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+import csv
+import glob
+import math
+import re
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+
+from config import RESULTS_DIR, SAMPLE_INTERVAL, DETAIL_CHUNK_ROWS, TRACE_SUFFIX
+from utils import log_message
+
+TIME_COLUMN = "Time (s)"
+LONG_BROWSER_COLUMN = "Browser"
+LONG_POWER_COLUMN = "Power (W)"
+
+def _to_float_array(values):
+    out = np.full(len(values), np.nan, dtype=np.float64)
+    for i, value in enumerate(values):
+        if value != "":
+            out[i] = float(value)
+    return out
+
+def iter_detail_chunks(path, chunk_rows=DETAIL_CHUNK_ROWS):
+    # Yields {"browser", "timestamps", "power_readings"} dicts with float64
+    # arrays, never holding more than chunk_rows rows of the file at once.
+    if str(path).endswith(TRACE_SUFFIX):
+        from trace_format import iter_trace_chunks
+        yield from iter_trace_chunks(path, chunk_rows)
+        return
+
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return
+
+        long_layout = LONG_BROWSER_COLUMN in header
+        if long_layout:
+            time_idx = header.index(TIME_COLUMN)
+            browser_idx = header.index(LONG_BROWSER_COLUMN)
+            power_idx = header.index(LONG_POWER_COLUMN)
+
+        while True:
+            rows = list(islice(reader, chunk_rows))
+            if not rows:
+                break
+
+            if long_layout:
+                browsers = np.array([row[browser_idx] for row in rows])
+                times = _to_float_array([row[time_idx] for row in rows])
+                power = _to_float_array([row[power_idx] for row in rows])
+
+                for browser in dict.fromkeys(browsers.tolist()):
+                    valid = (browsers == browser) & ~np.isnan(power)
+                    if valid.any():
+                        yield {
+                            "browser": browser,
+                            "timestamps": times[valid],
+                            "power_readings": power[valid]
+                        }
+            else:
+                columns = list(zip(*rows))
+                times = _to_float_array(columns[0])
+
+                for col, browser in enumerate(header[1:], start=1):
+                    power = _to_float_array(columns[col]) if col < len(columns) else np.array([])
+                    valid = ~np.isnan(power)
+                    if valid.any():
+                        yield {
+                            "browser": browser,
+                            "timestamps": times[valid],
+                            "power_readings": power[valid]
+                        }
+
+class P2Quantile:
+    # Jain & Chlamtac P-squared estimator: five markers, O(1) memory.
+    def __init__(self, q):
+        self.q = q
+        self.initial = []
+        self.heights = None
+        self.positions = None
+        self.desired = None
+        self.increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def update(self, x):
+        if self.heights is None:
+            self.initial.append(x)
+            if len(self.initial) == 5:
+                self.heights = sorted(self.initial)
+                self.positions = [1, 2, 3, 4, 5]
+                q = self.q
+                self.desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+            return
+
+        h = self.heights
+        n = self.positions
+
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        elif x >= h[4]:
+            h[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= h[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = self._parabolic(i, d)
+                if not h[i - 1] < candidate < h[i + 1]:
+                    candidate = h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+                h[i] = candidate
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        h = self.heights
+        n = self.positions
+        return h[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def extend(self, values):
+        for x in values.tolist():
+            self.update(x)
+
+    def value(self):
+        if self.heights is not None:
+            return self.heights[2]
+        if not self.initial:
+            return math.nan
+        ordered = sorted(self.initial)
+        return ordered[min(len(ordered) - 1, int(round(self.q * (len(ordered) - 1))))]
+
+class OnlineTraceStats:
+    # Welford/Chan mean and variance merged chunk by chunk; median and 95th
+    # percentile by P-squared.
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.power_sum = 0.0
+        self.median = P2Quantile(0.5)
+        self.p95 = P2Quantile(0.95)
+
+    def add_chunk(self, power):
+        n = len(power)
+        if n == 0:
+            return
+        chunk_mean = float(power.mean())
+        chunk_m2 = float(((power - chunk_mean) ** 2).sum())
+
+        total = self.count + n
+        delta = chunk_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += chunk_m2 + delta * delta * self.count * n / total
+        self.count = total
+
+        self.min = min(self.min, float(power.min()))
+        self.max = max(self.max, float(power.max()))
+        self.power_sum += float(power.sum())
+
+        self.median.extend(power)
+        self.p95.extend(power)
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def total_energy(self):
+        return self.power_sum * SAMPLE_INTERVAL / 3600
+
+    def result(self, browser, test_type):
+        return {
+            "browser": browser,
+            "test_type": test_type,
+            "avg_power": self.mean,
+            "max_power": self.max,
+            "min_power": self.min,
+            "median_power": self.median.value(),
+            "p95_power": self.p95.value(),
+            "total_energy": self.total_energy(),
+            "power_stdev": math.sqrt(self.variance()),
+            "samples": self.count
+        }
+
+class OnlineAggregate:
+    # Across-iteration Welford for the scalars save_aggregate_results reports.
+    FIELDS = ["avg_power", "max_power", "min_power", "median_power", "p95_power", "total_energy"]
+
+    def __init__(self):
+        self.count = 0
+        self.mean = dict.fromkeys(self.FIELDS, 0.0)
+        self.m2 = dict.fromkeys(self.FIELDS, 0.0)
+
+    def add(self, result):
+        self.count += 1
+        for field in self.FIELDS:
+            delta = result[field] - self.mean[field]
+            self.mean[field] += delta / self.count
+            self.m2[field] += delta * (result[field] - self.mean[field])
+
+    def result(self, browser):
+        row = {"browser": browser}
+        for field in self.FIELDS:
+            row[f"{field}_mean"] = self.mean[field]
+            if self.count > 1:
+                row[f"{field}_stdev"] = math.sqrt(self.m2[field] / (self.count - 1))
+            else:
+                row[f"{field}_stdev"] = 0
+        return row
+
+def summarize_detail_file(path, test_type, chunk_rows=DETAIL_CHUNK_ROWS):
+    traces = {}
+    for chunk in iter_detail_chunks(path, chunk_rows):
+        stats = traces.setdefault(chunk["browser"], OnlineTraceStats())
+        stats.add_chunk(chunk["power_readings"])
+    return [stats.result(browser, test_type) for browser, stats in traces.items()]
+
+def stream_aggregate_results(detail_files, test_type, chunk_rows=DETAIL_CHUNK_ROWS):
+    browsers = {}
+    for path in detail_files:
+        for result in summarize_detail_file(path, test_type, chunk_rows):
+            browsers.setdefault(result["browser"], OnlineAggregate()).add(result)
+    return [aggregate.result(browser) for browser, aggregate in browsers.items()]
+
+def find_detail_files(test_type, results_dir=RESULTS_DIR):
+    # A trace converted from a CSV sits next to it; read the trace, not both.
+    pattern = Path(results_dir) / f"{test_type}_power_details_iter*"
+    campaigns = {}
+    for file in glob.glob(str(pattern)):
+        match = re.search(r'_iter(\d+)_(\d{8}_\d{6})(\.csv|' + re.escape(TRACE_SUFFIX) + ')$', file)
+        if match:
+            iterations = campaigns.setdefault(match.group(2), {})
+            if match.group(3) == TRACE_SUFFIX or int(match.group(1)) not in iterations:
+                iterations[int(match.group(1))] = file
+
+    if not campaigns:
+        return []
+    latest = campaigns[max(campaigns)]
+    return [latest[iteration] for iteration in sorted(latest)]
+
+def find_summary_files(test_type, results_dir=RESULTS_DIR):
+    # The latest campaign's per-iteration summaries, in iteration order.
+    campaigns = {}
+    for file in glob.glob(str(Path(results_dir) / f"{test_type}_power_summary_iter*.csv")):
+        match = re.search(r'_iter(\d+)_(\d{8}_\d{6})\.csv$', file)
+        if match:
+            campaigns.setdefault(match.group(2), {})[int(match.group(1))] = file
+
+    if not campaigns:
+        return []
+    latest = campaigns[max(campaigns)]
+    return [latest[iteration] for iteration in sorted(latest)]
+
+def rebuild_aggregate_results(test_type, results_dir=RESULTS_DIR):
+    from reporting import write_aggregate_results
+
+    detail_files = find_detail_files(test_type, results_dir)
+    if not detail_files:
+        return None
+
+    log_message(f"Streaming {len(detail_files)} {test_type} detail files")
+    aggregate_results = stream_aggregate_results(detail_files, test_type)
+    # Next to the detail files it was rebuilt from, not in the live OUTPUT_DIR.
+    return write_aggregate_results(aggregate_results, test_type, Path(results_dir))
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import argparse
+import contextlib
+import multiprocessing
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+REPO_DIR = Path(__file__).resolve().parent
+DEFAULT_SOURCE_DIR = REPO_DIR / "browser_power_tests"
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Generate a synthetic campaign fitted to recorded traces')
+    parser.add_argument('--source-dir', type=Path, default=DEFAULT_SOURCE_DIR,
+                      help='Directory holding the recorded detail CSVs (default: browser_power_tests)')
+    parser.add_argument('--output-dir', type=Path, default=Path("synthetic_campaign"),
+                      help='Where the synthetic results are written (default: synthetic_campaign)')
+    parser.add_argument('--builds', type=int,
+                      help='Number of browser builds (default: one per recorded browser)')
+    parser.add_argument('--scenarios', type=int,
+                      help='Number of scenarios (default: one per recorded test type)')
+    parser.add_argument('--iterations', type=int, default=5,
+                      help='Iterations per build and scenario (default: 5)')
+    parser.add_argument('--duration', type=float, default=60,
+                      help='Seconds per trace (default: 60)')
+    parser.add_argument('--rate', type=float, default=1,
+                      help='Samples per second (default: 1)')
+    parser.add_argument('--build-spread', type=float, default=0.05,
+                      help='Log-normal sigma of the power offset between builds of one browser (default: 0.05)')
+    parser.add_argument('--scenario-spread', type=float, default=0.05,
+                      help='Log-normal sigma of the power offset between variants of one test type (default: 0.05)')
+    parser.add_argument('--seed', type=int, default=0,
+                      help='Random seed; the same seed gives the same campaign (default: 0)')
+    parser.add_argument('--jobs', type=int, default=1,
+                      help='Worker processes, one iteration at a time each (default: 1)')
+    parser.add_argument('--combined-only', action='store_true',
+                      help='Skip the per-browser detail/summary files run_tests also writes')
+
+    return parser.parse_args()
+
+def normal_cdf(z):
+    # Abramowitz & Stegun 7.1.26 (|error| < 1.5e-7); numpy has no erf.
+    x = np.abs(z) / np.sqrt(2)
+    t = 1 / (1 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1 - poly * np.exp(-x * x)
+    return 0.5 * (1 + np.sign(z) * erf)
+
+def fit_trace(power, interval):
+    from segmentation import summarize_phases
+
+    x = power[~np.isnan(power)]
+    phases = summarize_phases(x)
+    if not phases:
+        return None
+
+    warmup = phases["warmup_samples"]
+    steady = x[warmup:]
+    level = float(steady.mean())
+    if level <= 0:
+        return None
+
+    phi = 0.0
+    if len(steady) > 2 and steady.std() > 0:
+        phi = float(np.clip(np.corrcoef(steady[:-1], steady[1:])[0, 1], 0.0, 0.99))
+
+    # Variance of this run's mean from sample noise alone (AR(1) effective n).
+    mean_variance = steady.var() / len(steady) * (1 + phi) / (1 - phi)
+
+    return {
+        "level": level,
+        "mean_variance": mean_variance,
+        "warmup_ratio": x[:warmup] / level,
+        "steady": steady,
+        "phi": phi
+    }
+
+def fit_models(source_dir):
+    # One model per (browser, test type), pooled over the recorded iterations:
+    # mean steady level and its run-to-run spread, warm-up shape and the
+    # steady-state distribution relative to the level, and lag-1
+    # autocorrelation.
+    from config import TEST_TYPES
+    from streaming import find_detail_files, iter_detail_chunks
+
+    fits = {}
+    for test_type in TEST_TYPES:
+        for detail_file in find_detail_files(test_type, source_dir):
+            traces = {}
+            for chunk in iter_detail_chunks(detail_file):
+                trace = traces.setdefault(chunk["browser"], {"timestamps": [], "power": []})
+                trace["timestamps"].append(chunk["timestamps"])
+                trace["power"].append(chunk["power_readings"])
+
+            for browser, trace in traces.items():
+                timestamps = np.concatenate(trace["timestamps"])
+                interval = float(np.median(np.diff(timestamps))) if len(timestamps) > 1 else 1.0
+                fit = fit_trace(np.concatenate(trace["power"]), interval)
+                if fit:
+                    fit["interval"] = interval
+                    fits.setdefault((browser, test_type), []).append(fit)
+
+    models = {}
+    for key, runs in fits.items():
+        levels = np.array([run["level"] for run in runs])
+        # Only the run-to-run spread beyond what sample noise already produces.
+        between = levels.var(ddof=1) if len(levels) > 1 else 0.0
+        extra = max(0.0, between - np.mean([run["mean_variance"] for run in runs]))
+        warmups = sorted(runs, key=lambda run: len(run["warmup_ratio"]))
+        typical_warmup = warmups[len(warmups) // 2]
+        models[key] = {
+            "level": float(levels.mean()),
+            "level_cv": float(np.sqrt(extra) / levels.mean()),
+            "warmup_ratio": typical_warmup["warmup_ratio"],
+            "warmup_interval": typical_warmup["interval"],
+            "steady_ratio": np.sort(np.concatenate([run["steady"] for run in runs])) / levels.mean(),
+            "phi": float(np.median([run["phi"] for run in runs])),
+            "phi_interval": float(np.median([run["interval"] for run in runs]))
+        }
+    return models
+
+def variant_names(bases, count):
+    # The first pass keeps the recorded names; later ones become "Firefox-2",
+    # "video-2"... (a hyphen, so file globs like "video_*" never pick them up).
+    names = []
+    for k in range(count):
+        base = bases[k % len(bases)]
+        names.append(base if k < len(bases) else f"{base}-{k // len(bases) + 1}")
+    return names
+
+def plan_campaign(models, num_builds, num_scenarios, build_spread, scenario_spread, seed):
+    from config import TEST_TYPES
+
+    base_browsers = list(dict.fromkeys(browser for browser, _ in models))
+    base_types = [t for t in TEST_TYPES if any(test_type == t for _, test_type in models)]
+    num_builds = num_builds or len(base_browsers)
+    num_scenarios = num_scenarios or len(base_types)
+
+    rng = np.random.default_rng([seed])
+    build_factors = np.exp(rng.normal(0, build_spread, num_builds))
+    build_factors[:len(base_browsers)] = 1.0
+    scenario_factors = np.exp(rng.normal(0, scenario_spread, num_scenarios))
+    scenario_factors[:len(base_types)] = 1.0
+
+    builds = [
+        {"name": name, "base": base_browsers[k % len(base_browsers)], "factor": float(build_factors[k])}
+        for k, name in enumerate(variant_names(base_browsers, num_builds))
+    ]
+    scenarios = [
+        {"name": name, "base": base_types[k % len(base_types)], "factor": float(scenario_factors[k])}
+        for k, name in enumerate(variant_names(base_types, num_scenarios))
+    ]
+    return builds, scenarios
+
+def generate_traces(models, builds, scenario, num_samples, interval, rng):
+    # Gaussian AR(1) gives the sample-to-sample correlation; mapping it through
+    # the normal CDF onto the recorded steady-state quantiles gives the
+    # recorded distribution (spikes, skew, hard limits) instead of a normal one.
+    # All builds advance together, so the recursion is one loop over time.
+    keyed = [(build, models.get((build["base"], scenario["base"]))) for build in builds]
+    keyed = [(build, model) for build, model in keyed if model]
+    if not keyed:
+        return [], None
+
+    phi = np.array([model["phi"] ** (interval / model["phi_interval"]) for _, model in keyed])
+    innovations = rng.standard_normal((len(keyed), num_samples)) * np.sqrt(1 - phi ** 2)[:, None]
+    latent = np.empty((len(keyed), num_samples))
+    latent[:, 0] = rng.standard_normal(len(keyed))
+    for i in range(1, num_samples):
+        latent[:, i] = phi * latent[:, i - 1] + innovations[:, i]
+    quantiles = normal_cdf(latent)
+
+    t = np.arange(num_samples) * interval
+    power = np.empty((len(keyed), num_samples))
+    for row, (build, model) in enumerate(keyed):
+        level = model["level"] * build["factor"] * scenario["factor"] * (1 + model["level_cv"] * rng.standard_normal())
+        steady = model["steady_ratio"]
+        power[row] = level * np.interp(quantiles[row], (np.arange(len(steady)) + 0.5) / len(steady), steady)
+
+        warmup = model["warmup_ratio"]
+        if len(warmup):
+            in_warmup = t < len(warmup) * model["warmup_interval"]
+            power[row, in_warmup] = level * np.interp(t[in_warmup], np.arange(len(warmup)) * model["warmup_interval"], warmup)
+
+    return [build for build, _ in keyed], np.round(np.clip(power, 0.0, None), 3)
+
+def generate_iteration(iteration, models, builds, scenarios, num_samples, interval, seed, per_browser):
+    from campaign import RunResult
+    from reporting import save_results_to_csv
+    from streaming import OnlineAggregate
+
+    summaries = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for index, scenario in enumerate(scenarios):
+            rng = np.random.default_rng([seed, iteration, index])
+            scenario_builds, power = generate_traces(models, builds, scenario, num_samples, interval, rng)
+            if not scenario_builds:
+                continue
+
+            timestamps = np.arange(num_samples) * interval
+            results = [
+                RunResult(build["name"], scenario["name"], timestamps, trace, iteration=iteration)
+                for build, trace in zip(scenario_builds, power)
+            ]
+            if per_browser:
+                for result in results:
+                    save_results_to_csv([result], f"{scenario['name']}_{result.browser.lower()}", iteration)
+            save_results_to_csv(results, scenario["name"], iteration)
+
+            summaries += [
+                (scenario["name"], {key: result[key] for key in ("browser", *OnlineAggregate.FIELDS)})
+                for result in results
+            ]
+    return iteration, summaries
+
+def main():
+    args = parse_arguments()
+    output_dir = args.output_dir.resolve()
+
+    os.environ["BROWSER_POWER_OUTPUT_DIR"] = str(output_dir)
+    if args.rate != 1:
+        os.environ["BROWSER_POWER_SAMPLE_INTERVAL"] = repr(1.0 / args.rate)
+
+    from config import SAMPLE_INTERVAL
+    from utils import setup_logging
+    from streaming import OnlineAggregate
+    from reporting import write_aggregate_results
+
+    models = fit_models(args.source_dir.resolve())
+    if not models:
+        print(f"No recorded detail files found in {args.source_dir}")
+        sys.exit(1)
+
+    builds, scenarios = plan_campaign(models, args.builds, args.scenarios,
+                                      args.build_spread, args.scenario_spread, args.seed)
+    num_samples = int(round(args.duration * args.rate))
+
+    setup_logging()
+    print(f"Fitted {len(models)} browser/scenario models from {args.source_dir}")
+    print(f"Generating {len(builds)} builds x {len(scenarios)} scenarios x {args.iterations} iterations, "
+          f"{num_samples} samples each, into {output_dir}")
+
+    worker = partial(
+        generate_iteration,
+        models=models,
+        builds=builds,
+        scenarios=scenarios,
+        num_samples=num_samples,
+        interval=SAMPLE_INTERVAL,
+        seed=args.seed,
+        per_browser=not args.combined_only
+    )
+
+    aggregates = {}
+    start = time.perf_counter()
+    iterations = range(1, args.iterations + 1)
+
+    # fork keeps the parent's config (output dir, timestamp) in every worker.
+    pool = multiprocessing.get_context("fork").Pool(args.jobs) if args.jobs > 1 else None
+    try:
+        for iteration, summaries in (pool.imap_unordered(worker, iterations) if pool else map(worker, iterations)):
+            for scenario, summary in summaries:
+                aggregates.setdefault(scenario, {}).setdefault(summary["browser"], OnlineAggregate()).add(summary)
+            print(f"Iteration {iteration}/{args.iterations} written ({time.perf_counter() - start:.1f}s)")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    if args.iterations > 1:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for scenario in scenarios:
+                browsers = aggregates.get(scenario["name"], {})
+                # Keep build order rather than completion order.
+                rows = [browsers[build["name"]].result(build["name"]) for build in builds if build["name"] in browsers]
+                if rows:
+                    write_aggregate_results(rows, scenario["name"])
+
+    print(f"\nSynthetic campaign written to {output_dir} in {time.perf_counter() - start:.1f}s")
+    print(f"Analyze it with: python anaylze_data.py --results-dir {output_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+from pathlib import Path
+
+from config import (
+    ENABLE_SYSTEM_STATE, BACKLIGHT_ROOT, POWER_SUPPLY_ROOT, RFKILL_ROOT, PLATFORM_PROFILE_FILE,
+    CPU_SYSFS_ROOT, SYSTEM_STATE_WAIT
+)
+from utils import log_message
+import clock
+
+_unwritable = set()
+
+def _read(path):
+    try:
+        return Path(path).read_text().strip()
+    except OSError:
+        return None
+
+def _uniform(values):
+    # One value when every CPU agrees, otherwise all of them ("powersave/performance").
+    values = sorted({value for value in values if value is not None})
+    return "/".join(values) if values else None
+
+def read_system_state():
+    # Everything that moves whole-system watts regardless of the browser, as
+    # flat {setting: value} strings so states compare and log as they are.
+    state = {}
+
+    for device in sorted(BACKLIGHT_ROOT.glob("*")):
+        brightness = _read(device / "brightness")
+        if brightness is not None:
+            state[f"backlight:{device.name}"] = brightness
+
+    cpus = sorted(CPU_SYSFS_ROOT.glob("cpu[0-9]*/cpufreq"))
+    governor = _uniform(_read(cpu / "scaling_governor") for cpu in cpus)
+    if governor:
+        state["governor"] = governor
+    epp = _uniform(_read(cpu / "energy_performance_preference") for cpu in cpus)
+    if epp:
+        state["epp"] = epp
+
+    profile = _read(PLATFORM_PROFILE_FILE)
+    if profile:
+        state["platform_profile"] = profile
+
+    mains = [supply for supply in POWER_SUPPLY_ROOT.glob("*") if _read(supply / "type") == "Mains"]
+    if mains:
+        state["ac"] = "online" if any(_read(supply / "online") == "1" for supply in mains) else "battery"
+
+    for device in sorted(RFKILL_ROOT.glob("rfkill*")):
+        kind = _read(device / "type")
+        if kind is None:
+            continue
+        if _read(device / "hard") == "1":
+            status = "hard-blocked"
+        elif _read(device / "soft") == "1":
+            status = "soft-blocked"
+        else:
+            status = "on"
+        state[f"rfkill:{kind}:{_read(device / 'name') or device.name}"] = status
+
+    return state
+
+def set_backlight(device, brightness):
+    try:
+        (BACKLIGHT_ROOT / device / "brightness").write_text(str(brightness))
+        return True
+    except OSError as e:
+        if device not in _unwritable:
+            _unwritable.add(device)
+            log_message(f"Could not set {device} brightness (needs write access to {BACKLIGHT_ROOT / device}): {e}")
+        return False
+
+def capture_reference_state(backlight_level=None):
+    # The campaign's reference state. With a backlight level (percent), every
+    # backlight is set to it first; otherwise the current brightness is kept
+    # and held there for the rest of the campaign.
+    if not ENABLE_SYSTEM_STATE:
+        return None
+
+    if backlight_level is not None:
+        for device in sorted(BACKLIGHT_ROOT.glob("*")):
+            max_brightness = _read(device / "max_brightness")
+            if max_brightness and max_brightness.isdigit():
+                set_backlight(device.name, round(int(max_brightness) * backlight_level / 100))
+
+    return read_system_state()
+
+def compare_system_state(reference, state):
+    # {setting: current value} for every setting that left the reference.
+    return {
+        setting: state.get(setting, "missing")
+        for setting, value in reference.items()
+        if state.get(setting) != value
+    }
+
+def describe_mismatches(reference, mismatches):
+    return "; ".join(f"{setting} {value} (campaign: {reference[setting]})" for setting, value in mismatches.items())
+
+def enforce_system_state(reference):
+    # Puts back what the harness controls (brightness drifts with auto-dimming
+    # and ambient light sensors) and reports what it only observes.
+    state = read_system_state()
+    for setting, value in reference.items():
+        if setting.startswith("backlight:") and state.get(setting) != value:
+            if set_backlight(setting.split(":", 1)[1], value):
+                state[setting] = _read(BACKLIGHT_ROOT / setting.split(":", 1)[1] / "brightness")
+    return compare_system_state(reference, state)
+
+def wait_for_system_state(reference, timeout=SYSTEM_STATE_WAIT):
+    mismatches = enforce_system_state(reference)
+    deadline = clock.time() + timeout
+    while mismatches and clock.time() < deadline:
+        clock.sleep(5)
+        mismatches = enforce_system_state(reference)
+    return mismatches
+
+def describe_system_state(state):
+    return ", ".join(f"{setting}={value}" for setting, value in state.items()) if state else "not recorded"
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+import sys
+import struct
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from config import SAMPLE_INTERVAL, TRACE_CHUNK_SAMPLES, TRACE_SUFFIX, DETAIL_CHUNK_ROWS
+
+# Layout (little-endian):
+#   magic, then HEADER: version, sample interval (s), channel count, chunk count
+#   per channel: name length (u16), UTF-8 name, sample count (u64)
+#   chunk index: one INDEX_DTYPE record per chunk
+#   chunk data: zigzag varints of the sample-to-sample deltas
+# Values are fixed-point microwatts. A chunk covers consecutive samples of
+# one channel; its first value sits in the index, so any chunk decodes
+# without reading the ones before it, and the index alone answers which
+# chunks a time range needs.
+MAGIC = b"PWTRACE\x00"
+VERSION = 1
+HEADER = struct.Struct("<HdII")
+CHANNEL = struct.Struct("<H")
+SAMPLE_COUNT = struct.Struct("<Q")
+INDEX_DTYPE = np.dtype([
+    ("channel", "<u4"),
+    ("first_sample", "<u8"),
+    ("count", "<u4"),
+    ("first_value", "<i8"),
+    ("offset", "<u8"),
+    ("length", "<u4")
+])
+SCALE = 1_000_000
+
+def _zigzag(deltas):
+    return ((deltas << 1) ^ (deltas >> 63)).view(np.uint64)
+
+def _unzigzag(encoded):
+    return (encoded >> np.uint64(1)).view(np.int64) ^ -(encoded & np.uint64(1)).view(np.int64)
+
+def encode_varints(values):
+    # All values at once: a (n, 10) matrix of 7-bit groups, masked down to
+    # each value's own byte count and flattened in row order.
+    values = np.asarray(values, dtype=np.uint64)
+    if not len(values):
+        return b""
+    shifts = np.arange(10, dtype=np.uint64) * np.uint64(7)
+    groups = ((values[:, None] >> shifts) & np.uint64(0x7f)).astype(np.uint8)
+    lengths = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        lengths += values >= (np.uint64(1) << np.uint64(7 * k))
+    used = np.arange(10) < lengths[:, None]
+    groups[np.arange(10) < (lengths - 1)[:, None]] |= 0x80
+    return groups[used].tobytes()
+
+def decode_varints(data):
+    data = np.frombuffer(data, dtype=np.uint8)
+    if not len(data):
+        return np.empty(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    position = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    parts = (data & 0x7f).astype(np.uint64) << (position.astype(np.uint64) * np.uint64(7))
+    return np.bitwise_or.reduceat(parts, starts)
+
+def _encode_chunk(fixed):
+    return encode_varints(_zigzag(np.diff(fixed)))
+
+def _decode_chunk(record, data):
+    deltas = _unzigzag(decode_varints(data))
+    fixed = np.empty(int(record["count"]), dtype=np.int64)
+    fixed[0] = record["first_value"]
+    np.cumsum(deltas, out=fixed[1:])
+    fixed[1:] += record["first_value"]
+    return fixed / SCALE
+
+def write_trace(path, channels, interval=SAMPLE_INTERVAL, chunk_samples=TRACE_CHUNK_SAMPLES):
+    # channels: {name: (sample_indices, values)} or {name: values} for a
+    # trace starting at sample 0. Gaps in the sample indices start a new
+    # chunk, so missing samples cost nothing and decode as absent.
+    records = []
+    blobs = []
+    offset = 0
+    names = []
+    counts = []
+
+    for channel, (name, series) in enumerate(channels.items()):
+        if isinstance(series, tuple):
+            samples, values = (np.asarray(part) for part in series)
+        else:
+            values = np.asarray(series)
+            samples = np.arange(len(values))
+        values = np.asarray(values, dtype=np.float64)
+        keep = np.isfinite(values)
+        samples, values = samples[keep].astype(np.int64), values[keep]
+
+        fixed = np.round(values * SCALE).astype(np.int64)
+        breaks = np.flatnonzero(np.diff(samples) != 1) + 1
+        for run_start, run_end in zip(np.concatenate([[0], breaks]), np.concatenate([breaks, [len(samples)]])):
+            for start in range(int(run_start), int(run_end), chunk_samples):
+                end = min(start + chunk_samples, int(run_end))
+                blob = _encode_chunk(fixed[start:end])
+                records.append((channel, samples[start], end - start, fixed[start], offset, len(blob)))
+                blobs.append(blob)
+                offset += len(blob)
+
+        names.append(name.encode())
+        counts.append(len(values))
+
+    index = np.array(records, dtype=INDEX_DTYPE)
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(VERSION, interval, len(names), len(index)))
+        for name, count in zip(names, counts):
+            f.write(CHANNEL.pack(len(name)) + name + SAMPLE_COUNT.pack(count))
+        f.write(index.tobytes())
+        for blob in blobs:
+            f.write(blob)
+    return path
+
+class TraceFile:
+    # Memory-maps a trace; only the header and index are parsed up front,
+    # chunks are decoded when a read needs them.
+    def __init__(self, path):
+        self.path = Path(path)
+        self._data = np.memmap(self.path, dtype=np.uint8, mode='r')
+        if bytes(self._data[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{self.path} is not a power trace")
+
+        pos = len(MAGIC)
+        version, self.interval, channel_count, chunk_count = HEADER.unpack_from(self._data, pos)
+        if version != VERSION:
+            raise ValueError(f"{self.path}: unsupported trace version {version}")
+        pos += HEADER.size
+
+        self.channels = []
+        self.sample_counts = {}
+        for _ in range(channel_count):
+            (length,) = CHANNEL.unpack_from(self._data, pos)
+            pos += CHANNEL.size
+            name = bytes(self._data[pos:pos + length]).decode()
+            pos += length
+            (self.sample_counts[name],) = SAMPLE_COUNT.unpack_from(self._data, pos)
+            pos += SAMPLE_COUNT.size
+            self.channels.append(name)
+
+        index_size = chunk_count * INDEX_DTYPE.itemsize
+        self.index = np.frombuffer(self._data[pos:pos + index_size].tobytes(), dtype=INDEX_DTYPE)
+        self._data_start = pos + index_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        mmap = getattr(self._data, "_mmap", None)
+        self._data = None
+        if mmap is not None:
+            mmap.close()
+
+    def chunks(self, channel, start=None, end=None):
+        # Index records of one channel that overlap [start, end) seconds.
+        records = self.index[self.index["channel"] == self.channels.index(channel)]
+        first = records["first_sample"].astype(np.float64) * self.interval
+        last = (records["first_sample"] + records["count"]).astype(np.float64) * self.interval
+        keep = np.ones(len(records), dtype=bool)
+        if start is not None:
+            keep &= last > start
+        if end is not None:
+            keep &= first < end
+        return records[keep]
+
+    def decode(self, record):
+        begin = self._data_start + int(record["offset"])
+        values = _decode_chunk(record, self._data[begin:begin + int(record["length"])])
+        times = (int(record["first_sample"]) + np.arange(len(values))) * self.interval
+        return times, values
+
+    def read(self, channel, start=None, end=None):
+        # (times, watts) for one channel, trimmed to [start, end) seconds.
+        parts = [self.decode(record) for record in self.chunks(channel, start, end)]
+        if not parts:
+            return np.empty(0), np.empty(0)
+        times = np.concatenate([t for t, _ in parts])
+        values = np.concatenate([v for _, v in parts])
+        keep = np.ones(len(times), dtype=bool)
+        if start is not None:
+            keep &= times >= start
+        if end is not None:
+            keep &= times < end
+        return times[keep], values[keep]
+
+def is_trace_file(path):
+    return str(path).endswith(TRACE_SUFFIX)
+
+def iter_trace_chunks(path, chunk_rows=DETAIL_CHUNK_ROWS):
+    # Same dicts as streaming.iter_detail_chunks, so every reader of detail
+    # CSVs takes a trace unchanged.
+    with TraceFile(path) as trace:
+        for browser in trace.channels:
+            for record in trace.chunks(browser):
+                times, power = trace.decode(record)
+                for i in range(0, len(power), chunk_rows):
+                    yield {
+                        "browser": browser,
+                        "timestamps": times[i:i + chunk_rows],
+                        "power_readings": power[i:i + chunk_rows]
+                    }
+
+def csv_to_trace(csv_file, trace_file=None, interval=None, chunk_samples=TRACE_CHUNK_SAMPLES):
+    from streaming import iter_detail_chunks
+
+    traces = {}
+    for chunk in iter_detail_chunks(csv_file):
+        traces.setdefault(chunk["browser"], []).append((chunk["timestamps"], chunk["power_readings"]))
+
+    if interval is None:
+        # The detail CSVs carry time, not the rate; read it off the data.
+        steps = np.concatenate([np.diff(times) for parts in traces.values() for times, _ in parts])
+        steps = steps[steps > 0]
+        interval = float(np.median(steps)) if len(steps) else SAMPLE_INTERVAL
+
+    channels = {}
+    for browser, parts in traces.items():
+        times = np.concatenate([t for t, _ in parts])
+        power = np.concatenate([p for _, p in parts])
+        channels[browser] = (np.round(times / interval).astype(np.int64), power)
+
+    trace_file = Path(trace_file) if trace_file else Path(csv_file).with_suffix(TRACE_SUFFIX)
+    return write_trace(trace_file, channels, interval, chunk_samples)
+
+def trace_to_csv(trace_file, csv_file=None):
+    # Back to the wide detail layout written by save_results_to_csv.
+    import csv
+
+    csv_file = Path(csv_file) if csv_file else Path(trace_file).with_suffix(".csv")
+    with TraceFile(trace_file) as trace:
+        columns = {browser: trace.read(browser) for browser in trace.channels}
+        interval = trace.interval
+
+    length = max((int(np.round(times[-1] / interval)) + 1 for times, _ in columns.values() if len(times)), default=0)
+    grid = np.full((length, len(columns)), np.nan)
+    for k, (times, power) in enumerate(columns.values()):
+        grid[np.round(times / interval).astype(np.int64), k] = power
+
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Time (s)"] + list(columns))
+        for i, row in enumerate(grid):
+            writer.writerow([round(i * interval, 6)] + [round(float(value), 6) if np.isfinite(value) else "" for value in row])
+    return csv_file
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Convert power detail files between CSV and the binary trace format')
+    parser.add_argument('files', type=Path, nargs='+',
+                      help=f'Detail CSVs to encode, or {TRACE_SUFFIX} files to decode back to CSV')
+    parser.add_argument('--interval', type=float, default=None,
+                      help='Sample interval of the CSVs in seconds (default: inferred from the time column)')
+    parser.add_argument('--output-dir', type=Path, default=None,
+                      help='Write converted files here instead of next to the inputs')
+
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+
+    if args.output_dir:
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+
+    for path in args.files:
+        if is_trace_file(path):
+            target = (args.output_dir or path.parent) / path.with_suffix(".csv").name
+            trace_to_csv(path, target)
+        else:
+            target = (args.output_dir or path.parent) / path.with_suffix(TRACE_SUFFIX).name
+            try:
+                csv_to_trace(path, target, args.interval)
+            except ValueError as e:
+                print(f"Cannot convert {path}: {e}")
+                sys.exit(1)
+        print(f"{path} ({path.stat().st_size} bytes) -> {target} ({target.stat().st_size} bytes)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+import csv
+import re
+import warnings
+
+import numpy as np
+
+from config import SAMPLE_INTERVAL, ALL_TEST_TYPES, TRACE_ALIGNMENT, TRACE_MAX_SHIFT
+
+# Two-sided 95% Student t critical values (t at 0.975), interpolated by df.
+T_DF = np.array(list(range(1, 31)) + [40, 60, 120, 1000], dtype=np.float64)
+T_CRIT = np.array([12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+                   2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+                   2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+                   2.021, 2.000, 1.980, 1.962])
+
+def stack_traces(traces):
+    # Iterations as rows, NaN-padded to the longest one.
+    matrix = np.full((len(traces), max(len(trace) for trace in traces)), np.nan)
+    for i, trace in enumerate(traces):
+        matrix[i, :len(trace)] = trace
+    return matrix
+
+def shift_rows(matrix, offsets):
+    # Row i moved earlier by offsets[i] samples (later if negative), NaN-filled.
+    n = matrix.shape[1]
+    shifted = np.full_like(matrix, np.nan)
+    for i, lag in enumerate(offsets):
+        if lag >= 0:
+            shifted[i, :n - lag] = matrix[i, lag:]
+        else:
+            shifted[i, -lag:] = matrix[i, :n + lag]
+    return shifted
+
+def xcorr_offsets(matrix, max_shift, max_rounds=10):
+    # Lag (in samples) that best lines each iteration up with a common
+    # reference, limited to +/-max_shift so a periodic workload cannot slip a
+    # whole period. The first reference is the medoid iteration (the one
+    # that correlates best with all others); a mean of unaligned iterations
+    # would be smeared and pull every lag towards 0. The reference is then
+    # the mean of the aligned iterations, until the lags stop changing.
+    n = matrix.shape[1]
+    filled = np.where(np.isnan(matrix), np.nanmean(matrix, axis=1, keepdims=True), matrix)
+    centered = filled - filled.mean(axis=1, keepdims=True)
+
+    size = 1 << int(np.ceil(np.log2(2 * n)))
+    spectra = np.fft.rfft(centered, size, axis=1)
+    lags = np.concatenate([np.arange(0, max_shift + 1), np.arange(-max_shift, 0)])
+
+    def correlate(reference_spectrum):
+        correlation = np.fft.irfft(spectra * np.conj(reference_spectrum), size, axis=1)
+        return correlation[:, lags % size]
+
+    scores = np.array([correlate(spectrum).max(axis=1).sum() for spectrum in spectra])
+    offsets = lags[np.argmax(correlate(spectra[int(np.argmax(scores))]), axis=1)]
+
+    for _ in range(max_rounds):
+        reference = np.nan_to_num(np.nanmean(shift_rows(centered, offsets), axis=0))
+        updated = lags[np.argmax(correlate(np.fft.rfft(reference, size)), axis=1)]
+        if np.array_equal(updated, offsets):
+            break
+        offsets = updated
+    return offsets
+
+def align_traces(traces, mode=TRACE_ALIGNMENT, max_shift=TRACE_MAX_SHIFT, interval=SAMPLE_INTERVAL):
+    # mode "start" keeps every trace on its own start time; "xcorr" shifts each
+    # one by its cross-correlation lag to take out startup jitter.
+    matrix = stack_traces(traces)
+    offsets = np.zeros(len(traces), dtype=np.int64)
+    max_lag = int(round(max_shift / interval))
+    if mode == "xcorr" and len(traces) > 1 and max_lag > 0 and matrix.shape[1] > 2:
+        offsets = xcorr_offsets(matrix, min(max_lag, matrix.shape[1] // 2))
+    return shift_rows(matrix, offsets), offsets
+
+def trace_profile(aligned, interval=SAMPLE_INTERVAL):
+    # Pointwise mean and 95% confidence band over iterations, all at once.
+    count = np.sum(~np.isnan(aligned), axis=0)
+    with warnings.catch_warnings():
+        # Columns with fewer than two iterations are masked just below.
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nanmean(aligned, axis=0)
+        std = np.nanstd(aligned, axis=0, ddof=1)
+    half_width = np.interp(np.maximum(count - 1, 1), T_DF, T_CRIT) * std / np.sqrt(np.maximum(count, 1))
+    half_width = np.where(count > 1, half_width, np.nan)
+    return {
+        "time": np.arange(aligned.shape[1]) * interval,
+        "mean": mean,
+        "lower": mean - half_width,
+        "upper": mean + half_width,
+        "count": count
+    }
+
+def load_iteration_traces(detail_file):
+    # {browser: power} and the file's own sample interval, read off its time
+    # column (as csv_to_trace does): campaigns recorded at another rate than
+    # the current SAMPLE_INTERVAL keep their time scale.
+    from streaming import iter_detail_chunks
+
+    traces = {}
+    steps = []
+    for chunk in iter_detail_chunks(detail_file):
+        traces.setdefault(chunk["browser"], []).append(chunk["power_readings"])
+        steps.append(np.diff(chunk["timestamps"]))
+    steps = np.concatenate(steps) if steps else np.empty(0)
+    steps = steps[steps > 0]
+    interval = float(np.median(steps)) if len(steps) else SAMPLE_INTERVAL
+    return {browser: np.concatenate(parts) for browser, parts in traces.items()}, interval
+
+def profile_campaign(results_dir, output_file, test_types=ALL_TEST_TYPES, mode=TRACE_ALIGNMENT):
+    from streaming import find_detail_files
+
+    profiles = {}
+    for test_type in test_types:
+        traces = {}
+        intervals = {}
+        for detail_file in find_detail_files(test_type, results_dir):
+            if not re.search(r'_iter(\d+)_', detail_file):
+                continue
+            file_traces, interval = load_iteration_traces(detail_file)
+            for browser, power in file_traces.items():
+                traces.setdefault(browser, []).append(power)
+                intervals.setdefault(browser, []).append(interval)
+
+        for browser, runs in traces.items():
+            interval = float(np.median(intervals[browser]))
+            aligned, offsets = align_traces(runs, mode, interval=interval)
+            profile = trace_profile(aligned, interval)
+            profile["offsets"] = offsets * interval
+            profiles.setdefault(test_type, {})[browser] = profile
+
+    if not profiles:
+        print("No detail traces found for iteration profiles")
+        return None
+
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Test Type", "Browser", "Time (s)", "Iterations", "Mean Power (W)",
+                         "CI Low (W)", "CI High (W)"])
+        for test_type, browsers in profiles.items():
+            for browser, profile in browsers.items():
+                for t, n, mean, lower, upper in zip(profile["time"], profile["count"], profile["mean"],
+                                                    profile["lower"], profile["upper"]):
+                    if n:
+                        writer.writerow([test_type, browser, f"{t:g}", n, f"{mean:.3f}",
+                                         f"{lower:.3f}" if n > 1 else "", f"{upper:.3f}" if n > 1 else ""])
+
+    shifted = [abs(offset) for browsers in profiles.values() for profile in browsers.values()
+               for offset in profile["offsets"]]
+    print(f"Saved iteration profiles for {sum(len(b) for b in profiles.values())} browser/test pairs to {output_file}"
+          + (f" (largest alignment shift {max(shifted):g}s)" if mode == "xcorr" and shifted else ""))
+    return profiles
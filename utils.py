@@ -1,5 +1,9 @@
 #!/usr/bin/env python3
+import os
+import re
 import datetime
+import platform
+import subprocess
 from pathlib import Path
 from config import OUTPUT_DIR, LOG_FILE
 
@@ -15,4 +19,63 @@ def setup_logging():
 def log_message(message):
     print(message)
     with open(LOG_FILE, 'a') as f:
-        f.write(f"{datetime.datetime.now().strftime('%H:%M:%S')} - {message}\n")
\ No newline at end of file
+        f.write(f"{datetime.datetime.now().strftime('%H:%M:%S')} - {message}\n")
+
+def get_process_tree(root_pid):
+    children = {}
+    for stat_file in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            stat = stat_file.read_text()
+        except OSError:
+            continue
+        # comm may contain spaces or parens; the fields after the last ')' are fixed.
+        fields = stat[stat.rfind(")") + 2:].split()
+        children.setdefault(int(fields[1]), []).append(int(stat_file.parent.name))
+    
+    tree = []
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        tree.append(pid)
+        pending.extend(children.get(pid, []))
+    return tree
+
+def get_tree_memory_mb(root_pid):
+    total_kb = 0
+    for pid in get_process_tree(root_pid):
+        try:
+            rollup = Path(f"/proc/{pid}/smaps_rollup").read_text()
+            total_kb += next(int(line.split()[1]) for line in rollup.splitlines() if line.startswith("Pss:"))
+        except (OSError, StopIteration, ValueError):
+            try:
+                pages = int(Path(f"/proc/{pid}/statm").read_text().split()[1])
+                total_kb += pages * os.sysconf("SC_PAGE_SIZE") // 1024
+            except (OSError, ValueError, IndexError):
+                continue
+    return total_kb / 1024.0
+
+def get_browser_version(browser_cmd):
+    try:
+        output = subprocess.run([browser_cmd, "--version"], capture_output=True, text=True, timeout=30).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    # "Mozilla Firefox 123.0", "Google Chrome 122.0.6261.94", "Opera 107.0.5045.36"...
+    match = re.search(r"\d+(?:\.\d+)+", output)
+    return match.group(0) if match else (output.strip() or None)
+
+def get_host_info(power_file=None):
+    cpu_model = None
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    cpu_model = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    
+    return {
+        "kernel": platform.release(),
+        "cpu_model": cpu_model or platform.processor() or platform.machine(),
+        "power_sensor": power_file or "powertop"
+    }
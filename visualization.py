@@ -4,12 +4,17 @@ import seaborn as sns
 import numpy as np
 import pandas as pd
 import datetime
-from config import ANALYSIS_OUTPUT_DIR, TEST_TYPES, BROWSER_COLORS
+from config import ANALYSIS_OUTPUT_DIR, ALL_TEST_TYPES, BROWSER_COLORS
 
 plt.rcParams['figure.figsize'] = (12, 8)
 plt.rcParams['font.size'] = 12
 plt.style.use('ggplot')
 
+def chart_test_types(aggregate_data):
+    # Only the scenarios the campaign ran, known ones in their usual order;
+    # synthetic campaigns add more after them.
+    return [t for t in ALL_TEST_TYPES if t in aggregate_data] + [t for t in aggregate_data if t not in ALL_TEST_TYPES]
+
 def create_average_power_comparison(aggregate_data):
     if not aggregate_data:
         print("No aggregate data available for average power comparison")
@@ -144,11 +149,12 @@ def create_browser_ranking_heatmap(aggregate_data):
         energy_rankings[test_type] = energy_ranks
     
     all_browsers = sorted(set(sum([list(ranks.keys()) for ranks in power_rankings.values()], [])))
+    test_types = chart_test_types(aggregate_data)
     
-    power_matrix = pd.DataFrame(index=TEST_TYPES, columns=all_browsers)
-    energy_matrix = pd.DataFrame(index=TEST_TYPES, columns=all_browsers)
+    power_matrix = pd.DataFrame(index=test_types, columns=all_browsers)
+    energy_matrix = pd.DataFrame(index=test_types, columns=all_browsers)
     
-    for test_type in TEST_TYPES:
+    for test_type in test_types:
         if test_type in power_rankings:
             for browser in all_browsers:
                 power_matrix.at[test_type, browser] = power_rankings[test_type].get(browser, np.nan)
@@ -198,11 +204,12 @@ def create_radar_chart(aggregate_data):
         return
     
     radar_data = {}
+    test_types = chart_test_types(aggregate_data)
     
     for browser in common_browsers:
         browser_data = []
         
-        for test_type in TEST_TYPES:
+        for test_type in test_types:
             if test_type in aggregate_data:
                 df = aggregate_data[test_type]
                 browser_row = df[df['Browser'].str.lower() == browser]
@@ -219,7 +226,7 @@ def create_radar_chart(aggregate_data):
     
     normalized_data = {}
     
-    for i, test_type in enumerate(TEST_TYPES):
+    for i, test_type in enumerate(test_types):
         if test_type in aggregate_data:
             values = [data[i] for data in radar_data.values() if not np.isnan(data[i])]
             
@@ -231,17 +238,17 @@ def create_radar_chart(aggregate_data):
                     if i < len(radar_data[browser]) and not np.isnan(radar_data[browser][i]):
                         if min_val == max_val:
                             if browser not in normalized_data:
-                                normalized_data[browser] = [0] * len(TEST_TYPES)
+                                normalized_data[browser] = [0] * len(test_types)
                             normalized_data[browser][i] = 1
                         else:
                             val = radar_data[browser][i]
                             norm_val = (max_val - val) / (max_val - min_val)
                             
                             if browser not in normalized_data:
-                                normalized_data[browser] = [0] * len(TEST_TYPES)
+                                normalized_data[browser] = [0] * len(test_types)
                             normalized_data[browser][i] = norm_val
     
-    test_labels = [test_type.replace("_", " ").title() for test_type in TEST_TYPES]
+    test_labels = [test_type.replace("_", " ").title() for test_type in test_types]
     
     N = len(test_labels)
     
@@ -311,7 +318,7 @@ def create_browser_efficiency_index(aggregate_data):
             avg_score = data['total_score'] / data['test_count']
             
             test_scores = {}
-            for test_type in TEST_TYPES:
+            for test_type in chart_test_types(aggregate_data):
                 test_scores[test_type] = data['scores'].get(test_type, np.nan)
             
             browser_scores.append({
@@ -350,4 +357,33 @@ def create_browser_efficiency_index(aggregate_data):
     output_file = ANALYSIS_OUTPUT_DIR / "browser_efficiency_index.png"
     plt.savefig(output_file, dpi=300, bbox_inches='tight')
     print(f"Saved browser efficiency index to {output_file}")
-    plt.close()
\ No newline at end of file
+    plt.close()
+
+def create_trace_profile_charts(profiles):
+    if not profiles:
+        print("No iteration profiles available for overlay charts")
+        return
+    
+    for test_type, browsers in profiles.items():
+        plt.figure(figsize=(14, 8))
+        
+        for browser, profile in browsers.items():
+            color = BROWSER_COLORS.get(browser.lower(), '#333333')
+            shown = profile["count"] > 0
+            plt.plot(profile["time"][shown], profile["mean"][shown], linewidth=1.5, color=color,
+                     label=f"{browser} (n={int(profile['count'].max())})")
+            # Power is never negative, whatever a few noisy iterations say.
+            plt.fill_between(profile["time"], np.clip(profile["lower"], 0, None), profile["upper"],
+                             color=color, alpha=0.15, linewidth=0)
+        
+        plt.title(f"Power Profile Across Iterations: {test_type.replace('_', ' ').title()}\n"
+                  f"(mean with 95% confidence band)", fontsize=16)
+        plt.xlabel('Time (s)', fontsize=14)
+        plt.ylabel('Power (W)', fontsize=14)
+        plt.legend(loc='upper right')
+        plt.grid(linestyle='--', alpha=0.7)
+        
+        output_file = ANALYSIS_OUTPUT_DIR / f"trace_profile_{test_type}.png"
+        plt.savefig(output_file, dpi=300, bbox_inches='tight')
+        print(f"Saved iteration profile chart to {output_file}")
+        plt.close()